@@ -1,22 +1,69 @@
 # app.py
 
+import time
+_import_started = time.perf_counter()
+
 import os
-import json
-import asyncio
+import atexit
+import importlib
 from flask import Flask, render_template, request, jsonify, Response, stream_with_context, send_file
-from presentation_generator import PresentationAgent
-from presentation_exporter import StaticImageExporter # <-- 1. IMPORT THE NEW STATIC EXPORTER
+from presentation_generator import PresentationAgent, get_model
+from browser_pool import BrowserPool, VIEWPORT_WIDTH_PX, VIEWPORT_HEIGHT_PX
+from render_cache import RenderCache
+from asset_store import get_asset_store
+from offline_assets import get_offline_bundle
+from session_store import SessionStore, track_slide_event, slide_digest, resolve_slide_hashes
+from export_jobs import ExportJobQueue, ExportQueueFull
+from export_profiles import EXPORT_PROFILES, DEFAULT_EXPORT_PROFILE
+from metrics import get_metrics, TIMING_EVENTS
+from sse import format_sse, delta_event
 import io
 
+# --- Startup ---
+PREWARM = os.getenv("PREWARM", "0") == "1"                  # Warm up before serving (`python app.py`, asgi.py)
+PREWARM_BROWSER = os.getenv("PREWARM_BROWSER", "1") == "1"  # Whether warming up launches the export browser
+# Loaded on first use rather than at import; prewarm_imports() loads them ahead of traffic.
+HEAVY_MODULES = ("google.generativeai", "presentation_exporter", "pptx", "bs4", "playwright.async_api")
+startup_timings = {}  # Seconds spent in each startup phase, reported by /api/metrics
+
 app = Flask(__name__)
 
-agent_sessions = {}
+# Conversations live in a bounded in-memory tier backed by SQLite, so they
+# survive restarts and any worker process can serve them.
+# Saving a session also marks the images its slides use, so they are not evicted.
+session_store = SessionStore(agent_factory=PresentationAgent, asset_store=get_asset_store())
+
+# One long-lived headless browser shared by every export; launched on first use.
+browser_pool = BrowserPool(viewport={"width": VIEWPORT_WIDTH_PX, "height": VIEWPORT_HEIGHT_PX})
+atexit.register(browser_pool.shutdown)
+# Screenshots of unchanged slides are reused across exports.
+render_cache = RenderCache()
+# Slide images downloaded once per deck and served locally.
+asset_store = get_asset_store()
+# Tailwind and Google Fonts served from a local bundle (see offline_assets.py).
+offline_bundle = get_offline_bundle()
 
 @app.route('/')
 def index():
     """Serves the main HTML page."""
     return render_template('index.html')
 
+@app.route('/assets/<name>')
+def serve_asset(name):
+    """Serves a locally stored slide image. Names are content hashes, so they never change."""
+    path = asset_store.path_for(name)
+    if path is None:
+        return jsonify({"error": "Asset not found"}), 404
+    return send_file(path, max_age=365 * 24 * 3600)
+
+@app.route('/offline/<path:path>')
+def serve_offline(path):
+    """Serves the bundled Tailwind stylesheet/shim, Google Fonts CSS and font files."""
+    body, content_type = offline_bundle.serve(path, request.url)
+    if body is None:
+        return jsonify({"error": "Not in the offline bundle"}), 404
+    return Response(body, mimetype=content_type, headers={"Cache-Control": "public, max-age=86400"})
+
 @app.route('/api/chat', methods=['POST'])
 def chat():
     """
@@ -26,36 +73,52 @@ def chat():
     data = request.get_json()
     conv_id = data.get('conversation_id')
     history = data.get('history', [])
+    # A per-turn `timing` event can be requested even when TIMING_EVENTS is off.
+    emit_timing = bool(data.get('timing', TIMING_EVENTS))
+    # Clients that keep the last HTML sent for each slide can take `slide_update` as a diff.
+    use_delta = bool(data.get('delta', False))
 
     if not conv_id or not history:
         return jsonify({"error": "conversation_id and history are required"}), 400
 
-    if conv_id not in agent_sessions:
-        agent_sessions[conv_id] = {
-            "agent": PresentationAgent(),
-            "slides_html": {} 
-        }
-    
-    session = agent_sessions[conv_id]
+    session = session_store.get(conv_id)
     agent = session["agent"]
 
     def generate():
         """Streams the agent's response turn by turn."""
         try:
-            for update_str in agent.run_conversation_turn(history):
-                # The generator now yields the raw string, so we pass it directly
-                update = json.loads(update_str.replace("data: ", ""))
-                if update['type'] in ['new_slide', 'slide_update']:
-                    slide_num = update['data']['slide_number']
-                    session['slides_html'][slide_num] = update['data']['html']
-                yield update_str
+            for event in agent.run_conversation_turn(history, emit_timing=emit_timing):
+                wire_event = event
+                if use_delta and event['type'] == 'slide_update':
+                    wire_event = delta_event(event, session['slides_html'].get(event['data']['slide_number']))
+                track_slide_event(session, event)
+                if wire_event is not event:
+                    # Saved before the delta goes out, so /api/chat/slide on any worker has its result.
+                    session_store.save(session)
+                yield format_sse(wire_event)
         except Exception as e:
             print(f"Error during agent execution for {conv_id}: {e}")
-            error_event = f"data: {json.dumps({'type': 'error', 'data': {'message': str(e)}})}\n\n"
-            yield error_event
+            yield format_sse({'type': 'error', 'data': {'message': str(e)}})
+        finally:
+            session_store.save(session)
 
     return Response(stream_with_context(generate()), mimetype='text/event-stream')
 
+@app.route('/api/chat/slide', methods=['GET'])
+def chat_slide():
+    """
+    Returns the full HTML the server last sent for a slide, for a client whose
+    copy no longer matches the base of a `slide_update` delta.
+    """
+    conv_id = request.args.get('conversation_id')
+    slide_number = request.args.get('slide_number', type=int)
+    if not conv_id or slide_number is None:
+        return jsonify({"error": "conversation_id and slide_number are required"}), 400
+    html = session_store.get(conv_id)['slides_html'].get(slide_number)
+    if html is None:
+        return jsonify({"error": "Slide not found"}), 404
+    return jsonify({"slide_number": slide_number, "html": html})
+
 # --- NEW: Endpoint for searching images ---
 @app.route('/api/tools/search_images', methods=['POST'])
 def search_images():
@@ -66,54 +129,24 @@ def search_images():
     if not query or not conv_id:
         return jsonify({"error": "query and conversation_id are required"}), 400
 
-    if conv_id not in agent_sessions:
-        # Initialize a session if it doesn't exist, as the agent is needed
-        agent_sessions[conv_id] = {"agent": PresentationAgent(), "slides_html": {}}
-    
-    agent = agent_sessions[conv_id]["agent"]
-    
-    # We can reuse the agent's internal search method.
-    # The original method returns one URL, let's adapt it to return multiple.
-    # For now, we'll call it multiple times for simplicity, but a real implementation would optimize this.
-    # Let's modify the agent's search to return a list.
-    
-    # NOTE: This is a conceptual change. To make this work, we'd ideally refactor
-    # _search_for_image to return a list. For now, we'll simulate finding a few images.
-    # A simple way is to just call it once as the logic is complex.
-    # Let's assume _search_for_image is modified to return a list of URLs.
-    # For this implementation, I will simulate this by creating a wrapper here.
-    
-    def find_multiple_images(q, num_images=10):
-        # This is a mock-up of what a real multi-image search would do.
-        # The current agent._search_for_image is designed to find ONE good image.
-        # A real implementation would change the SearXNG parsing logic.
-        # For now, we'll just return the first one found in a list.
-        urls = []
-        # In a real scenario, you would modify _search_for_image to return more results.
-        # For now, we'll just call it and return what we get.
-        url = agent._search_for_image(q)
-        if url:
-            urls.append(url)
-        # Let's try a few variations to get more results
-        url2 = agent._search_for_image(f"{q} photo")
-        if url2 and url2 not in urls: urls.append(url2)
-        url3 = agent._search_for_image(f"{q} illustration")
-        if url3 and url3 not in urls: urls.append(url3)
-        return urls if urls else []
-
+    agent = session_store.get(conv_id)["agent"]
 
     try:
-        # A better approach would be to modify _search_for_image to return multiple results.
-        # For now, we'll just call it once.
-        image_url = agent._search_for_image(query)
-        # Let's pretend we got more for the UI
-        image_urls = [image_url] if image_url else []
-        if image_url:
-             # Add a few more dummy URLs for UI testing purposes
-             image_urls.extend([image_url, image_url, image_url])
+        limit = min(max(int(data.get('limit', 12)), 1), 50)
+        page = max(int(data.get('page', 1)), 1)
+    except (TypeError, ValueError):
+        return jsonify({"error": "page and limit must be integers"}), 400
+    use_cache = not data.get('refresh', False)
 
-
-        return jsonify({"image_urls": image_urls})
+    try:
+        images, has_more = agent._search_for_images(query, limit=limit, offset=(page - 1) * limit, use_cache=use_cache)
+        return jsonify({
+            "images": images,
+            "image_urls": [image['url'] for image in images],
+            "page": page,
+            "limit": limit,
+            "has_more": has_more
+        })
     except Exception as e:
         print(f"Error during image search for {conv_id}: {e}")
         return jsonify({"error": f"Image search failed: {str(e)}"}), 500
@@ -125,18 +158,17 @@ def create_chart():
     data_query = data.get('data_query')
     chart_type = data.get('chart_type')
     conv_id = data.get('conversation_id')
+    # Lets the user force fresh search results instead of cached ones
+    use_cache = not data.get('refresh', False)
 
     if not all([data_query, chart_type, conv_id]):
         return jsonify({"error": "data_query, chart_type, and conversation_id are required"}), 400
 
-    if conv_id not in agent_sessions:
-        agent_sessions[conv_id] = {"agent": PresentationAgent(), "slides_html": {}}
-    
-    agent = agent_sessions[conv_id]["agent"]
+    agent = session_store.get(conv_id)["agent"]
 
     try:
         # The agent method is a generator that yields status updates. We only want the final result.
-        chart_data_generator = agent._get_chart_data_from_search(data_query, chart_type)
+        chart_data_generator = agent._get_chart_data_from_search(data_query, chart_type, use_cache=use_cache)
         structured_data = None
         for event in chart_data_generator:
             # We can ignore the status updates here as the frontend will show its own.
@@ -157,39 +189,195 @@ def create_chart():
         return jsonify({"error": f"Chart creation failed: {str(e)}"}), 500
 
 
+EXPORT_FORMATS = ('image', 'native')
+PPTX_MIMETYPE = 'application/vnd.openxmlformats-officedocument.presentationml.presentation'
+
+def build_exporter(slides_html, export_format, progress=None, profile=DEFAULT_EXPORT_PROFILE):
+    """Returns the exporter for an export format, or None if the format is unknown."""
+    # Imported on first export: python-pptx, BeautifulSoup and Playwright are not needed to chat.
+    from presentation_exporter import StaticImageExporter, NativePptxExporter
+    if export_format == 'native':
+        # Maps the annotated layers to native shapes; the browser is only used
+        # for layers that cannot be mapped.
+        return NativePptxExporter(slides_html, browser_pool=browser_pool, asset_store=asset_store, offline_bundle=offline_bundle, progress=progress)
+    if export_format == 'image':
+        # Slides are captured in parallel on pages borrowed from the shared browser
+        # pool, and only slides missing from the render cache are captured at all.
+        return StaticImageExporter(slides_html, browser_pool=browser_pool, render_cache=render_cache, asset_store=asset_store, offline_bundle=offline_bundle, progress=progress,
+                                   profile=profile)
+    return None
+
+# Exports run in the background on a bounded set of workers (see export_jobs.py).
+export_jobs = ExportJobQueue(build_exporter=build_exporter, run=browser_pool.run)
+atexit.register(export_jobs.shutdown)
+
+def parse_export_request(data, store=session_store):
+    """
+    Validates an export request; returns (slides_html, options, error), where
+    options are ExportJobQueue.submit's keyword arguments and the error is a
+    (body, status) pair either front end can return.
+
+    Slides are sent either in full as `slides_html`, or as `slide_hashes` (see
+    session_store.slide_digest) with `slides` mapping slide index -> HTML for
+    only the ones the server does not hold yet. Unknown hashes are answered
+    with 409 and the `missing` indices, which the client then uploads.
+    """
+    # "image" renders every slide to a screenshot; "native" writes editable shapes.
+    export_format = data.get('format', 'image')
+    conv_id = data.get('conversation_id')
+    if not conv_id:
+        return None, None, ({"error": "Invalid conversation_id"}, 400)
+    if export_format not in EXPORT_FORMATS:
+        return None, None, ({"error": f"Unknown export format '{export_format}'."}, 400)
+    # Profiles set the resolution and image encoding of "image" exports (see export_profiles.py).
+    profile = data.get('profile', DEFAULT_EXPORT_PROFILE) if export_format == 'image' else DEFAULT_EXPORT_PROFILE
+    if not isinstance(profile, str) or profile not in EXPORT_PROFILES:
+        return None, None, ({"error": f"Unknown export profile '{profile}'."}, 400)
+    options = {"export_format": export_format, "profile": profile}
+
+    slide_hashes = data.get('slide_hashes')
+    if slide_hashes is None:
+        slides_html = data.get('slides_html')
+        if not slides_html or not isinstance(slides_html, list) or not all(isinstance(html, str) for html in slides_html):
+            return None, None, ({"error": "No presentation slides provided for export."}, 400)
+        return slides_html, options, None
+
+    if not slide_hashes or not isinstance(slide_hashes, list) or not all(isinstance(digest, str) for digest in slide_hashes):
+        return None, None, ({"error": "No presentation slides provided for export."}, 400)
+    slides = data.get('slides') or {}
+    if not isinstance(slides, dict):
+        return None, None, ({"error": "slides must map slide indices to HTML."}, 400)
+    uploads = {}
+    for index, html in slides.items():
+        i = int(index) if str(index).isdigit() else -1
+        if not 0 <= i < len(slide_hashes) or not isinstance(html, str) or slide_digest(html) != slide_hashes[i]:
+            return None, None, ({"error": f"Uploaded slide '{index}' does not match its hash."}, 400)
+        uploads[i] = html
+
+    session = store.get(conv_id)
+    previous_uploads = session['export_slides']
+    slides_html, missing = resolve_slide_hashes(session, slide_hashes, uploads)
+    if missing:
+        return None, None, ({"error": "Some slides are not held by the server; upload them.", "missing": missing}, 409)
+    if session['export_slides'] != previous_uploads:
+        store.save(session)
+    return slides_html, options, None
+
+@app.route('/api/export/jobs', methods=['POST'])
+def create_export_job():
+    """Queues an export and returns its job ID; identical in-flight exports share one job."""
+    slides_html, options, error = parse_export_request(request.get_json())
+    if error:
+        return error
+    try:
+        job = export_jobs.submit(slides_html, **options)
+    except ExportQueueFull as e:
+        return jsonify({"error": str(e)}), 503
+    return jsonify(job.describe()), 202
+
+@app.route('/api/export/jobs/<job_id>', methods=['GET'])
+def export_job_status(job_id):
+    job = export_jobs.get(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown or expired export job"}), 404
+    return jsonify(job.describe())
+
+@app.route('/api/export/jobs/<job_id>/events', methods=['GET'])
+def export_job_events(job_id):
+    """Streams a job's status and per-slide progress as server-sent events."""
+    job = export_jobs.get(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown or expired export job"}), 404
+    return Response(stream_with_context(export_jobs.stream(job)), mimetype='text/event-stream')
+
+@app.route('/api/export/jobs/<job_id>/result', methods=['GET'])
+def export_job_result(job_id):
+    """Downloads a finished export. Results expire a while after the job finishes."""
+    job = export_jobs.get(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown or expired export job"}), 404
+    if job.status == 'failed':
+        return jsonify({"error": f"Failed to export presentation: {job.error}"}), 500
+    if job.status != 'done':
+        return jsonify(job.describe()), 409
+    return send_file(io.BytesIO(job.result), as_attachment=True, download_name='presentation.pptx', mimetype=PPTX_MIMETYPE)
+
 @app.route('/api/export', methods=['POST'])
 def export_presentation():
-    """Exports the current presentation state to a PPTX file."""
+    """
+    Exports the posted slides to a PPTX file within the request. Kept for
+    existing clients; the export still goes through the job queue, so it is
+    bounded by the same workers and shares identical in-flight jobs.
+    """
     data = request.get_json()
-    conv_id = data.get('conversation_id')
-    # --- NEW: Get edited HTML directly from the client request ---
-    slides_html = data.get('slides_html')
+    slides_html, options, error = parse_export_request(data)
+    if error:
+        return error
+    try:
+        job = export_jobs.submit(slides_html, **options)
+    except ExportQueueFull as e:
+        return jsonify({"error": str(e)}), 503
+    job.wait()
+    if job.status == 'failed':
+        print(f"Error during export for {data.get('conversation_id')}: {job.error}")
+        return jsonify({"error": f"Failed to export presentation: {job.error}"}), 500
+    return send_file(io.BytesIO(job.result), as_attachment=True, download_name='presentation.pptx', mimetype=PPTX_MIMETYPE)
 
-    if not conv_id:
-        return jsonify({"error": "Invalid conversation_id"}), 400
-    
-    # --- NEW: Check for the new payload ---
-    if not slides_html or not isinstance(slides_html, list):
-        return jsonify({"error": "No presentation slides provided for export."}), 400
-
-    # --- 2. USE THE NEW STATIC IMAGE EXPORTER ---
-    async def run_export():
-        # The exporter already accepts a list of HTML strings.
-        exporter = StaticImageExporter(slides_html)
-        return await exporter.export()
+def metrics_gauges(store=session_store):
+    """Point-in-time figures sampled on each scrape, alongside the timing histograms."""
+    job_counts = export_jobs.stats()['jobs']
+    return {
+        'sessions_in_memory': store.stats()['memory_sessions'],
+        'export_jobs_queued': job_counts.get('queued', 0),
+        'export_jobs_running': job_counts.get('running', 0),
+        'render_cache_hits': render_cache.hits,
+        'render_cache_misses': render_cache.misses,
+        **{f"startup_{phase}": round(seconds, 4) for phase, seconds in startup_timings.items()},
+    }
 
-    try:
-        pptx_data = asyncio.run(run_export())
-        return send_file(
-            io.BytesIO(pptx_data),
-            as_attachment=True,
-            download_name='presentation.pptx',
-            mimetype='application/vnd.openxmlformats-officedocument.presentationml.presentation'
-        )
-    except Exception as e:
-        print(f"Error during export for {conv_id}: {e}")
-        return jsonify({"error": f"Failed to export presentation: {str(e)}"}), 500
+@app.route('/api/metrics', methods=['GET'])
+def metrics():
+    """Stage timings and service figures in the Prometheus text format."""
+    return Response(get_metrics().render(metrics_gauges()), mimetype='text/plain; version=0.0.4')
+
+def prewarm_imports():
+    """
+    Imports the modules that the first chat or export would otherwise load.
+    Safe to call before a pre-fork server forks: nothing here starts threads
+    or opens connections, and the loaded modules are shared copy-on-write.
+    """
+    start = time.perf_counter()
+    for name in HEAVY_MODULES:
+        try:
+            importlib.import_module(name)
+        except ImportError as e:
+            print(f"Prewarm: Could not import {name}: {e}")
+    startup_timings['prewarm_imports_seconds'] = time.perf_counter() - start
+
+def prewarm(launch_browser=PREWARM_BROWSER):
+    """
+    Gets a process ready for traffic: heavy imports, the shared model client
+    and (optionally) the export browser. Under a pre-fork server, call it in
+    each worker after the fork (see gunicorn.conf.py).
+    """
+    start = time.perf_counter()
+    prewarm_imports()
+    get_model()
+    if launch_browser:
+        browser_start = time.perf_counter()
+        try:
+            browser_pool.warm_up()
+            startup_timings['prewarm_browser_seconds'] = time.perf_counter() - browser_start
+        except Exception as e:
+            print(f"Prewarm: Could not launch the export browser: {e}")
+    startup_timings['prewarm_seconds'] = time.perf_counter() - start
+    print(f"Prewarm: Ready in {startup_timings['prewarm_seconds']:.2f} s "
+          f"(imports {startup_timings['prewarm_imports_seconds']:.2f} s).")
 
+startup_timings['import_seconds'] = time.perf_counter() - _import_started
+print(f"Startup: app imported in {startup_timings['import_seconds']:.2f} s.")
 
 if __name__ == '__main__':
+    if PREWARM:
+        prewarm()
     app.run(debug=True, port=int(os.getenv('PORT', 5000)))
\ No newline at end of file
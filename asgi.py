@@ -0,0 +1,220 @@
+# asgi.py
+#
+# ASGI entry point: the same API as app.py, served from an event loop so open
+# SSE streams do not each hold a worker thread.
+#
+#   hypercorn asgi:app --bind 0.0.0.0:8000
+
+import os
+import asyncio
+import mimetypes
+from quart import Quart, render_template, request, jsonify, Response
+from async_agent import AsyncPresentationAgent
+from session_store import SessionStore, track_slide_event
+# The browser pool, render cache, asset store, offline bundle and export job
+# queue are shared with the WSGI app, as is export request validation.
+from app import asset_store, offline_bundle, export_jobs, parse_export_request, PPTX_MIMETYPE, metrics_gauges, prewarm, PREWARM
+from metrics import get_metrics, TIMING_EVENTS
+from export_jobs import ExportQueueFull
+from sse import format_sse, delta_event
+
+app = Quart(__name__)
+
+# Same SQLite file as the WSGI app, so either front end can continue a conversation.
+session_store = SessionStore(agent_factory=AsyncPresentationAgent, asset_store=asset_store)
+
+@app.before_serving
+async def warm_up():
+    """With PREWARM=1, loads heavy modules, the model client and the export browser before serving."""
+    if PREWARM:
+        await asyncio.to_thread(prewarm)
+
+@app.route('/')
+async def index():
+    """Serves the main HTML page."""
+    return await render_template('index.html')
+
+@app.route('/assets/<name>')
+async def serve_asset(name):
+    """Serves a locally stored slide image. Names are content hashes, so they never change."""
+    data = await asyncio.to_thread(asset_store.read, name)
+    if data is None:
+        return jsonify({"error": "Asset not found"}), 404
+    mimetype = mimetypes.guess_type(name)[0] or 'application/octet-stream'
+    return Response(data, mimetype=mimetype, headers={"Cache-Control": f"public, max-age={365 * 24 * 3600}"})
+
+@app.route('/offline/<path:path>')
+async def serve_offline(path):
+    """Serves the bundled Tailwind stylesheet/shim, Google Fonts CSS and font files."""
+    body, content_type = await asyncio.to_thread(offline_bundle.serve, path, request.url)
+    if body is None:
+        return jsonify({"error": "Not in the offline bundle"}), 404
+    return Response(body, mimetype=content_type, headers={"Cache-Control": "public, max-age=86400"})
+
+@app.route('/api/chat', methods=['POST'])
+async def chat():
+    """Streams the agent's response to a conversation turn as server-sent events."""
+    data = await request.get_json()
+    conv_id = data.get('conversation_id')
+    history = data.get('history', [])
+    emit_timing = bool(data.get('timing', TIMING_EVENTS))
+    use_delta = bool(data.get('delta', False))
+
+    if not conv_id or not history:
+        return jsonify({"error": "conversation_id and history are required"}), 400
+
+    session = await asyncio.to_thread(session_store.get, conv_id)
+    agent = session["agent"]
+
+    async def generate():
+        try:
+            async for event in agent.run_conversation_turn_async(history, emit_timing=emit_timing):
+                wire_event = event
+                if use_delta and event['type'] == 'slide_update':
+                    wire_event = delta_event(event, session['slides_html'].get(event['data']['slide_number']))
+                track_slide_event(session, event)
+                if wire_event is not event:
+                    # Saved before the delta goes out, so /api/chat/slide on any worker has its result.
+                    await asyncio.to_thread(session_store.save, session)
+                yield format_sse(wire_event)
+        except Exception as e:
+            print(f"Error during agent execution for {conv_id}: {e}")
+            yield format_sse({'type': 'error', 'data': {'message': str(e)}})
+        finally:
+            await asyncio.to_thread(session_store.save, session)
+
+    return Response(generate(), mimetype='text/event-stream')
+
+@app.route('/api/chat/slide', methods=['GET'])
+async def chat_slide():
+    """Returns the full HTML last sent for a slide, for a client whose delta base is stale."""
+    conv_id = request.args.get('conversation_id')
+    slide_number = request.args.get('slide_number', type=int)
+    if not conv_id or slide_number is None:
+        return jsonify({"error": "conversation_id and slide_number are required"}), 400
+    session = await asyncio.to_thread(session_store.get, conv_id)
+    html = session['slides_html'].get(slide_number)
+    if html is None:
+        return jsonify({"error": "Slide not found"}), 404
+    return jsonify({"slide_number": slide_number, "html": html})
+
+@app.route('/api/tools/search_images', methods=['POST'])
+async def search_images():
+    data = await request.get_json()
+    query = data.get('query')
+    conv_id = data.get('conversation_id')
+
+    if not query or not conv_id:
+        return jsonify({"error": "query and conversation_id are required"}), 400
+
+    agent = (await asyncio.to_thread(session_store.get, conv_id))["agent"]
+
+    try:
+        limit = min(max(int(data.get('limit', 12)), 1), 50)
+        page = max(int(data.get('page', 1)), 1)
+    except (TypeError, ValueError):
+        return jsonify({"error": "page and limit must be integers"}), 400
+    use_cache = not data.get('refresh', False)
+
+    try:
+        images, has_more = await agent._search_for_images_async(query, limit=limit, offset=(page - 1) * limit, use_cache=use_cache)
+        return jsonify({
+            "images": images,
+            "image_urls": [image['url'] for image in images],
+            "page": page,
+            "limit": limit,
+            "has_more": has_more
+        })
+    except Exception as e:
+        print(f"Error during image search for {conv_id}: {e}")
+        return jsonify({"error": f"Image search failed: {str(e)}"}), 500
+
+@app.route('/api/tools/create_chart', methods=['POST'])
+async def create_chart():
+    data = await request.get_json()
+    data_query = data.get('data_query')
+    chart_type = data.get('chart_type')
+    conv_id = data.get('conversation_id')
+    use_cache = not data.get('refresh', False)
+
+    if not all([data_query, chart_type, conv_id]):
+        return jsonify({"error": "data_query, chart_type, and conversation_id are required"}), 400
+
+    agent = (await asyncio.to_thread(session_store.get, conv_id))["agent"]
+
+    try:
+        structured_data = await agent._get_chart_data_async(data_query, chart_type, use_cache=use_cache)
+        if structured_data:
+            return jsonify(structured_data)
+        return jsonify({"error": "Could not generate structured data for the chart."}), 500
+    except Exception as e:
+        print(f"Error during chart creation for {conv_id}: {e}")
+        return jsonify({"error": f"Chart creation failed: {str(e)}"}), 500
+
+@app.route('/api/export/jobs', methods=['POST'])
+async def create_export_job():
+    """Queues an export and returns its job ID; identical in-flight exports share one job."""
+    slides_html, options, error = await asyncio.to_thread(parse_export_request, await request.get_json(), session_store)
+    if error:
+        return error
+    try:
+        job = export_jobs.submit(slides_html, **options)
+    except ExportQueueFull as e:
+        return jsonify({"error": str(e)}), 503
+    return jsonify(job.describe()), 202
+
+@app.route('/api/export/jobs/<job_id>', methods=['GET'])
+async def export_job_status(job_id):
+    job = export_jobs.get(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown or expired export job"}), 404
+    return jsonify(job.describe())
+
+@app.route('/api/export/jobs/<job_id>/events', methods=['GET'])
+async def export_job_events(job_id):
+    """Streams a job's status and per-slide progress as server-sent events."""
+    job = export_jobs.get(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown or expired export job"}), 404
+
+    return Response(export_jobs.stream_async(job), mimetype='text/event-stream')
+
+@app.route('/api/export/jobs/<job_id>/result', methods=['GET'])
+async def export_job_result(job_id):
+    """Downloads a finished export. Results expire a while after the job finishes."""
+    job = export_jobs.get(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown or expired export job"}), 404
+    if job.status == 'failed':
+        return jsonify({"error": f"Failed to export presentation: {job.error}"}), 500
+    if job.status != 'done':
+        return jsonify(job.describe()), 409
+    return pptx_response(job.result)
+
+@app.route('/api/export', methods=['POST'])
+async def export_presentation():
+    """Exports the posted slides to a PPTX file within the request, through the shared job queue."""
+    data = await request.get_json()
+    slides_html, options, error = await asyncio.to_thread(parse_export_request, data, session_store)
+    if error:
+        return error
+    try:
+        job = export_jobs.submit(slides_html, **options)
+    except ExportQueueFull as e:
+        return jsonify({"error": str(e)}), 503
+    await asyncio.to_thread(job.wait)
+    if job.status == 'failed':
+        print(f"Error during export for {data.get('conversation_id')}: {job.error}")
+        return jsonify({"error": f"Failed to export presentation: {job.error}"}), 500
+    return pptx_response(job.result)
+
+@app.route('/api/metrics', methods=['GET'])
+async def metrics():
+    """Stage timings and service figures in the Prometheus text format."""
+    return Response(get_metrics().render(metrics_gauges(session_store)), mimetype='text/plain; version=0.0.4')
+
+def pptx_response(pptx_data):
+    return Response(pptx_data, mimetype=PPTX_MIMETYPE, headers={"Content-Disposition": "attachment; filename=presentation.pptx"})
+
+if __name__ == '__main__':
+    app.run(debug=True, port=int(os.getenv('PORT', 5000)))
@@ -0,0 +1,266 @@
+# asset_store.py
+
+import os
+import re
+import html
+import time
+import sqlite3
+import hashlib
+import mimetypes
+import threading
+import requests
+from contextlib import contextmanager, asynccontextmanager
+from urllib.parse import urlparse
+
+# --- Constants ---
+ASSET_STORE_DIR = os.getenv("ASSET_STORE_DIR", os.path.join(".cache", "assets"))
+ASSET_STORE_MAX_BYTES = int(os.getenv("ASSET_STORE_MAX_BYTES", 1024 * 1024 * 1024))
+# Assets used (fetched, or referenced by a saved session) this recently are
+# never evicted, even when that leaves the store over its budget.
+ASSET_STORE_PROTECT_S = int(os.getenv("ASSET_STORE_PROTECT_S", 24 * 3600))
+MAX_ASSET_BYTES = 25 * 1024 * 1024  # Refuse single downloads larger than this
+DOWNLOAD_TIMEOUT = 15
+ASSET_ROUTE = "/assets"
+# Origin under which exporter pages load local assets; requests to it are
+# answered from disk through Playwright request routing, never the network.
+EXPORT_ASSET_ORIGIN = "http://assets.localhost"
+HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/125.0.0.0 Safari/537.36"
+}
+CONTENT_TYPE_EXTENSIONS = {
+    'image/jpeg': '.jpg', 'image/png': '.png', 'image/webp': '.webp', 'image/gif': '.gif',
+    'image/svg+xml': '.svg', 'image/avif': '.avif', 'image/bmp': '.bmp',
+}
+ASSET_NAME_PATTERN = re.compile(r'^[0-9a-f]{64}\.[a-z0-9]{2,5}$')
+LOCAL_ASSET_REFERENCE = re.compile(r'(?<=["\'(\s])' + re.escape(ASSET_ROUTE) + r'/')
+REFERENCED_ASSET_NAME = re.compile(re.escape(ASSET_ROUTE) + r'/([0-9a-f]{64}\.[a-z0-9]{2,5})')
+
+class AssetStore:
+    """
+    Downloads each slide image once and keeps it on disk under the SHA-256 of its
+    content, so the palette extractor, every client preview and every export read
+    the same local copy instead of going back to third-party hosts.
+
+    A SQLite index maps source URLs to stored files and records each file's
+    size and last use, with the running total alongside, so cache hits cost one
+    lookup and nothing walks the directory. When a download takes the store past
+    `max_bytes`, the least recently used files are evicted, except those used
+    within the last `protect_s` seconds: sessions mark the assets their slides
+    reference each time they are saved (see `touch`).
+    """
+    def __init__(self, directory=ASSET_STORE_DIR, max_bytes=ASSET_STORE_MAX_BYTES, protect_s=ASSET_STORE_PROTECT_S):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.protect_s = protect_s
+        self._url_locks = {}
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS assets (url TEXT PRIMARY KEY, name TEXT NOT NULL)")
+            conn.execute("CREATE TABLE IF NOT EXISTS files (name TEXT PRIMARY KEY, size INTEGER NOT NULL, used_at REAL NOT NULL)")
+            conn.execute("CREATE INDEX IF NOT EXISTS files_used_at ON files (used_at)")
+            conn.execute("CREATE TABLE IF NOT EXISTS usage (id INTEGER PRIMARY KEY CHECK (id = 0), total_bytes INTEGER NOT NULL)")
+            if conn.execute("INSERT OR IGNORE INTO usage (id, total_bytes) VALUES (0, 0)").rowcount:
+                self._index_existing_files(conn)
+
+    def _index_existing_files(self, conn):
+        """Records the files of a store created before sizes were indexed; runs once."""
+        rows = []
+        for root, _, files in os.walk(self.directory):
+            for file_name in files:
+                if ASSET_NAME_PATTERN.match(file_name):
+                    stat = os.stat(os.path.join(root, file_name))
+                    rows.append((file_name, stat.st_size, stat.st_mtime))
+        conn.executemany("INSERT OR IGNORE INTO files (name, size, used_at) VALUES (?, ?, ?)", rows)
+        conn.execute("UPDATE usage SET total_bytes = (SELECT COALESCE(SUM(size), 0) FROM files)")
+
+    @contextmanager
+    def _connect(self):
+        """Yields a short-lived connection that commits on success and is always closed."""
+        conn = sqlite3.connect(os.path.join(self.directory, "index.sqlite3"), timeout=5)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def path_for(self, name):
+        """Returns the file path of a stored asset, or None if the name is invalid or missing."""
+        if not ASSET_NAME_PATTERN.match(name or ''):
+            return None
+        path = os.path.join(self.directory, name[:2], name)
+        return path if os.path.exists(path) else None
+
+    def read(self, name):
+        path = self.path_for(name)
+        if path is None:
+            return None
+        with open(path, 'rb') as f:
+            return f.read()
+
+    def local_url(self, name):
+        return f"{ASSET_ROUTE}/{name}"
+
+    def _lookup(self, url):
+        with self._connect() as conn:
+            row = conn.execute("SELECT name FROM assets WHERE url = ?", (url,)).fetchone()
+            if row and self.path_for(row[0]):
+                conn.execute("UPDATE files SET used_at = ? WHERE name = ?", (time.time(), row[0]))
+                return row[0]
+        return None
+
+    def touch(self, html_pages):
+        """Marks every asset referenced by the given HTML as just used, shielding it from eviction."""
+        names = {name for page in html_pages for name in REFERENCED_ASSET_NAME.findall(page or '')}
+        if not names:
+            return
+        now = time.time()
+        try:
+            with self._connect() as conn:
+                conn.executemany("UPDATE files SET used_at = ? WHERE name = ?", [(now, name) for name in names])
+        except sqlite3.Error as e:
+            print(f"AssetStore: Could not update the index: {e}")
+
+    def _url_lock(self, url):
+        with self._lock:
+            return self._url_locks.setdefault(url, threading.Lock())
+
+    def fetch(self, url):
+        """
+        Returns the stored asset name for a URL, downloading it on first use.
+        Returns None if the image cannot be downloaded.
+        """
+        if not url or not url.startswith(('http://', 'https://')):
+            return None
+        with self._url_lock(url):
+            try:
+                name = self._lookup(url)
+                if name:
+                    return name
+                name, size = self._download(url)
+                total = self._record(url, name, size)
+            except Exception as e:
+                print(f"AssetStore: Could not store {url}: {e}")
+                return None
+            finally:
+                with self._lock:
+                    self._url_locks.pop(url, None)
+        if total is not None and total > self.max_bytes:
+            self._evict(keep=name)
+        return name
+
+    def _record(self, url, name, size):
+        """Indexes a download. Returns the store's new total size if it added a file, else None."""
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute("INSERT OR REPLACE INTO assets (url, name) VALUES (?, ?)", (url, name))
+            if not conn.execute("INSERT OR IGNORE INTO files (name, size, used_at) VALUES (?, ?, ?)", (name, size, now)).rowcount:
+                conn.execute("UPDATE files SET used_at = ? WHERE name = ?", (now, name))
+                return None  # Same content as a stored file, e.g. from another URL
+            conn.execute("UPDATE usage SET total_bytes = total_bytes + ?", (size,))
+            return conn.execute("SELECT total_bytes FROM usage").fetchone()[0]
+
+    def _download(self, url):
+        print(f"AssetStore: Downloading {url}")
+        with requests.get(url, timeout=DOWNLOAD_TIMEOUT, headers=HEADERS, stream=True) as response:
+            response.raise_for_status()
+            chunks, size = [], 0
+            for chunk in response.iter_content(64 * 1024):
+                size += len(chunk)
+                if size > MAX_ASSET_BYTES:
+                    raise ValueError(f"asset is larger than {MAX_ASSET_BYTES} bytes")
+                chunks.append(chunk)
+            content_type = response.headers.get('Content-Type', '').split(';')[0].strip().lower()
+        data = b''.join(chunks)
+
+        extension = CONTENT_TYPE_EXTENSIONS.get(content_type)
+        if extension is None:
+            guessed = mimetypes.guess_type(urlparse(url).path)[0]
+            extension = CONTENT_TYPE_EXTENSIONS.get(guessed, '.img')
+        name = hashlib.sha256(data).hexdigest() + extension
+
+        path = os.path.join(self.directory, name[:2], name)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{threading.get_ident()}.tmp"
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        return name, len(data)
+
+    def _evict(self, keep=None):
+        """Deletes least recently used assets (and their index rows), except `keep` and protected ones, until under `max_bytes`."""
+        cutoff = time.time() - self.protect_s
+        evicted = 0
+        with self._connect() as conn:
+            total = conn.execute("SELECT total_bytes FROM usage").fetchone()[0]
+            candidates = conn.execute(
+                "SELECT name, size FROM files WHERE used_at < ? AND name != ? ORDER BY used_at", (cutoff, keep or '')
+            ).fetchall()
+            for file_name, size in candidates:
+                if total <= self.max_bytes:
+                    break
+                # Another worker may be evicting at the same time; whoever deletes the row removes the file.
+                if not conn.execute("DELETE FROM files WHERE name = ?", (file_name,)).rowcount:
+                    continue
+                try:
+                    os.remove(os.path.join(self.directory, file_name[:2], file_name))
+                except FileNotFoundError:
+                    pass
+                conn.execute("DELETE FROM assets WHERE name = ?", (file_name,))
+                conn.execute("UPDATE usage SET total_bytes = total_bytes - ?", (size,))
+                total -= size
+                evicted += 1
+        if evicted:
+            print(f"AssetStore: Evicted {evicted} asset(s) to stay under {self.max_bytes} bytes.")
+        if total > self.max_bytes:
+            print(f"AssetStore: Still {total} bytes; the rest were used in the last {self.protect_s} s.")
+
+    # --- HTML rewriting ---
+    def rewrite_html(self, html_content, image_urls):
+        """Points every reference to the given source URLs at the stored local copies."""
+        for url in image_urls:
+            name = self.fetch(url)
+            if not name:
+                continue
+            local = self.local_url(name)
+            html_content = html_content.replace(url, local)
+            escaped = html.escape(url, quote=True)
+            if escaped != url:
+                html_content = html_content.replace(escaped, local)
+        return html_content
+
+    def localize_for_export(self, html_content):
+        """Makes `/assets/...` references absolute under EXPORT_ASSET_ORIGIN for pages loaded with set_content."""
+        return LOCAL_ASSET_REFERENCE.sub(EXPORT_ASSET_ORIGIN + ASSET_ROUTE + '/', html_content)
+
+    @asynccontextmanager
+    async def serve_to_page(self, page):
+        """Answers EXPORT_ASSET_ORIGIN requests on a Playwright page from disk for the duration of the block."""
+        pattern = f"{EXPORT_ASSET_ORIGIN}/**"
+
+        async def handle(route):
+            name = urlparse(route.request.url).path.rsplit('/', 1)[-1]
+            path = self.path_for(name)
+            if path is None:
+                await route.fulfill(status=404)
+                return
+            content_type = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+            await route.fulfill(path=path, content_type=content_type)
+
+        await page.route(pattern, handle)
+        try:
+            yield
+        finally:
+            await page.unroute(pattern, handle)
+
+_shared_store = None
+_shared_store_lock = threading.Lock()
+
+def get_asset_store():
+    """Returns the process-wide asset store, creating it on first use."""
+    global _shared_store
+    with _shared_store_lock:
+        if _shared_store is None:
+            _shared_store = AssetStore()
+        return _shared_store
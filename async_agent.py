@@ -0,0 +1,397 @@
+# async_agent.py
+
+import json
+import asyncio
+from presentation_generator import (
+    PresentationAgent, IncrementalPlanParser, MarkdownFenceStripper, MODEL_ID, GENERATION_CONFIG,
+    IMAGE_SEARCH_RETRIES, IMAGE_QUERY_VARIANT_SUFFIXES, STREAM_SLIDE_HTML, PIPELINE_PLAN, IMAGE_PERCEPTUAL_DEDUPE,
+    _is_json_response, _is_html_response,
+)
+from search_client import SearchUnavailableError
+from llm_cache import CachedResponse
+from metrics import span, collect_turn, TIMING_EVENTS
+
+_TASK_DONE = object()
+
+class AsyncEventStream:
+    """
+    asyncio counterpart of ConcurrentEventStream: runs async event generators as
+    tasks, at most `max_concurrency` at a time, and hands their events back as
+    they are produced.
+    """
+    def __init__(self, max_concurrency):
+        self._events = asyncio.Queue()
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._tasks = []
+        self._pending = 0
+
+    async def _drain_generator(self, generator_factory):
+        try:
+            async with self._semaphore:
+                async for event in generator_factory():
+                    self._events.put_nowait(event)
+        finally:
+            self._events.put_nowait(_TASK_DONE)
+
+    def submit(self, generator_factory):
+        """Schedules a zero-argument callable that returns an async event generator."""
+        self._tasks.append(asyncio.create_task(self._drain_generator(generator_factory)))
+        self._pending += 1
+
+    def ready_events(self):
+        """Yields the events that are already available without waiting."""
+        while self._pending:
+            try:
+                event = self._events.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            if event is _TASK_DONE:
+                self._pending -= 1
+                continue
+            yield event
+
+    async def drain(self):
+        """Yields events until every submitted generator has finished, then re-raises the first task error."""
+        while self._pending:
+            event = await self._events.get()
+            if event is _TASK_DONE:
+                self._pending -= 1
+                continue
+            yield event
+        for task in self._tasks:
+            task.result()
+
+    def close(self):
+        for task in self._tasks:
+            task.cancel()
+
+class AsyncPresentationAgent(PresentationAgent):
+    """
+    The presentation agent for the ASGI app. Model calls use Gemini's async API
+    and SearXNG searches use the client's async HTTP path, so a generation waits
+    on the event loop instead of holding a thread. Prompts, parsers, plan
+    patching and session state are shared with PresentationAgent; only the
+    workflow is re-expressed as async generators.
+
+    Palette extraction (CPU-bound) and asset downloads run in the default
+    thread pool for the short time they take.
+    """
+
+    # --- Model ---
+    async def _call_llm_async(self, prompt, cache=True, purpose='other', validate=None):
+        with span('llm', purpose=purpose) as labels:
+            if self.llm_cache is None or not cache:
+                return await self.model.generate_content_async(prompt, generation_config=GENERATION_CONFIG)
+
+            key = self.llm_cache.make_key(MODEL_ID, GENERATION_CONFIG, prompt)
+            # The cache is SQLite; keep its reads and writes off the event loop.
+            text = await asyncio.to_thread(self.llm_cache.get, key)
+            if text is not None:
+                labels['cached'] = 'true'
+                return CachedResponse(text)
+            response = await self.model.generate_content_async(prompt, generation_config=GENERATION_CONFIG)
+            try:
+                text = response.text
+            except ValueError:
+                return response  # Blocked or empty responses are never cached
+            await asyncio.to_thread(self._store_response, key, text, validate)
+            return response
+
+    async def _stream_llm_async(self, prompt, cache=True, purpose='other', validate=None):
+        with span('llm', purpose=purpose) as labels:
+            key = None
+            if self.llm_cache is not None and cache:
+                key = self.llm_cache.make_key(MODEL_ID, GENERATION_CONFIG, prompt)
+                text = await asyncio.to_thread(self.llm_cache.get, key)
+                if text is not None:
+                    labels['cached'] = 'true'
+                    yield text
+                    return
+
+            parts = []
+            response = await self.model.generate_content_async(prompt, generation_config=GENERATION_CONFIG, stream=True)
+            async for chunk in response:
+                try:
+                    text = chunk.text
+                except ValueError:
+                    continue
+                if text:
+                    parts.append(text)
+                    yield text
+            if key is not None:
+                await asyncio.to_thread(self._store_response, key, ''.join(parts), validate)
+
+    async def _regenerate_image_search_query_async(self, topic, slide_title, original_query):
+        try:
+            response = await self._call_llm_async(self._regenerate_query_prompt(topic, slide_title, original_query), cache=False, purpose='image_query_retry')
+            return response.text.strip().replace('"', '')
+        except Exception:
+            return f"{topic} abstract"
+
+    # --- Search ---
+    async def _search_image_results_async(self, query, use_cache):
+        try:
+            return (await self.search_client.search_async(query, category='images', use_cache=use_cache)).get('results', [])
+        except SearchUnavailableError as e:
+            print(f"Image search unavailable for '{query}': {e}")
+        except Exception as e:
+            print(f"SearXNG image search failed for '{query}': {e}")
+        return []
+
+    async def _search_for_images_async(self, query, limit=10, offset=0, use_cache=True, expand=True):
+        """Async counterpart of _search_for_images; query variants are searched concurrently."""
+        print(f"Searching for images via SearXNG: {query}")
+        candidates, seen_keys = [], set()
+        self._collect_image_candidates(await self._search_image_results_async(query, use_cache), candidates, seen_keys)
+
+        needed = offset + limit + 1
+        if expand and len(candidates) < needed:
+            variants = [f"{query} {suffix}" for suffix in IMAGE_QUERY_VARIANT_SUFFIXES]
+            variant_results = await asyncio.gather(*(self._search_image_results_async(q, use_cache) for q in variants))
+            for results in variant_results:
+                self._collect_image_candidates(results, candidates, seen_keys)
+
+        if expand and IMAGE_PERCEPTUAL_DEDUPE:
+            with span('image_dedupe'):
+                hashes = await asyncio.gather(*(asyncio.to_thread(self._thumbnail_hash, c) for c in candidates[:needed]))
+            candidates = self._drop_similar_images(candidates[:needed], hashes) + candidates[needed:]
+
+        return candidates[offset:offset + limit], len(candidates) > offset + limit
+
+    async def _search_for_image_async(self, query, use_cache=True):
+        candidates, _ = await self._search_for_images_async(query, limit=1, use_cache=use_cache, expand=False)
+        if not candidates:
+            print(f"SearXNG returned no images for query '{query}'.")
+            return None
+        print(f"Found image URL: {candidates[0]['url']}")
+        return candidates[0]['url']
+
+    async def _search_for_data_async(self, query, use_cache=True):
+        print(f"Searching for data with query: '{query}'")
+        try:
+            results = await self.search_client.search_async(query, category='general', use_cache=use_cache)
+        except SearchUnavailableError as e:
+            print(f"Data search unavailable for '{query}': {e}")
+            return None
+        except Exception as e:
+            print(f"Data search failed for '{query}': {e}")
+            return None
+        return self._format_data_snippets(query, results)
+
+    async def _structure_chart_data_async(self, search_results, chart_type):
+        try:
+            response = await self._call_llm_async(self._chart_data_prompt(search_results, chart_type), purpose='chart_data', validate=self._parse_chart_data)
+            return self._parse_chart_data(response.text)
+        except Exception as e:
+            print(f"Failed to structure chart data with LLM: {e}")
+            return None
+
+    async def _get_chart_data_async(self, data_query, chart_type, use_cache=True):
+        """Searches for data and structures it for a chart; returns the chart data or None."""
+        search_results = await self._search_for_data_async(data_query, use_cache=use_cache)
+        if not search_results:
+            return None
+        return await self._structure_chart_data_async(search_results, chart_type)
+
+    # --- Conversation workflow ---
+    async def run_conversation_turn_async(self, conversation_history, emit_timing=TIMING_EVENTS):
+        """Async counterpart of run_conversation_turn."""
+        with collect_turn() as timings:
+            if self.presentation_plan is None:
+                with span('turn', kind='create'):
+                    async for event in self._create_new_presentation_async(conversation_history[-1]['content']):
+                        yield event
+            else:
+                with span('turn', kind='edit'):
+                    async for event in self._edit_presentation_async(conversation_history):
+                        yield event
+            if emit_timing:
+                yield self._yield_event('timing', timings.summary())
+
+    async def _create_new_presentation_async(self, user_prompt):
+        yield self._yield_event('status_update', {'message': "Understood. I will begin by creating a concept for your presentation."})
+
+        topic_style_response = await self._call_llm_async(self._topic_style_prompt(user_prompt), purpose='topic_style', validate=_is_json_response)
+        topic, theme_hint = self._parse_topic_style(topic_style_response.text, user_prompt)
+        style = theme_hint or topic
+
+        yield self._yield_event('status_update', {'message': f"Acting as a creative director for a presentation on '{topic}' with a '{style}' theme. I will now devise a unique visual identity and a comprehensive slide outline."})
+
+        plan_prompt = self._plan_prompt(topic, theme_hint)
+        if PIPELINE_PLAN and self.max_concurrency > 1:
+            async for event in self._stream_plan_and_slides_async(plan_prompt):
+                yield event
+            return
+
+        plan_response = await self._call_llm_async(plan_prompt, purpose='plan', validate=self._parse_plan)
+        try:
+            self.presentation_plan = self._parse_plan(plan_response.text)
+        except (json.JSONDecodeError, KeyError) as e:
+            print(f"Error parsing or validating presentation plan: {e}")
+            yield self._yield_event('status_update', {'message': "I'm sorry, I had trouble creating a valid presentation plan. Could you please try rephrasing your request?"})
+            return
+
+        yield self._yield_event('status_update', {'message': "Creative plan complete. I will now source visuals and design the slides."})
+        async for event in self._process_and_generate_slides_async(range(len(self.presentation_plan['slides']))):
+            yield event
+        yield self._yield_event('status_update', {'message': "I've completed the presentation! How does it look?"})
+
+    async def _stream_plan_and_slides_async(self, plan_prompt):
+        """Async counterpart of _stream_plan_and_slides."""
+        plan = {'slides': []}
+        self.presentation_plan = plan
+        parser = IncrementalPlanParser()
+        waiting_for_theme = []
+        response_parts = []
+        stream = AsyncEventStream(self.max_concurrency)
+
+        def dispatch(slide_data):
+            plan['slides'].append(slide_data)
+            i = len(plan['slides']) - 1
+            stream.submit(lambda: self._generate_single_slide_async(i, False, 0))
+
+        try:
+            async for text in self._stream_llm_async(plan_prompt, purpose='plan', validate=self._parse_plan):
+                response_parts.append(text)
+                for kind, value in parser.feed(text):
+                    if kind == 'theme' and 'theme' not in plan:
+                        plan['theme'] = value
+                        yield self._yield_event('status_update', {'message': "Visual identity ready. I'm designing the slides as the outline comes together."})
+                        for slide_data in waiting_for_theme:
+                            dispatch(slide_data)
+                        waiting_for_theme = []
+                    elif kind == 'slide':
+                        if 'theme' in plan:
+                            dispatch(value)
+                        else:
+                            waiting_for_theme.append(value)
+                for event in stream.ready_events():
+                    yield event
+
+            remaining_slides = self._complete_streamed_plan(plan, ''.join(response_parts), waiting_for_theme)
+            if remaining_slides is None:
+                self.presentation_plan = None
+                yield self._yield_event('status_update', {'message': "I'm sorry, I had trouble creating a valid presentation plan. Could you please try rephrasing your request?"})
+                return
+            for slide_data in remaining_slides:
+                dispatch(slide_data)
+
+            yield self._yield_event('status_update', {'message': f"Creative plan complete with {len(plan['slides'])} slides. Finishing the remaining designs."})
+            async for event in stream.drain():
+                yield event
+        finally:
+            stream.close()
+        yield self._yield_event('status_update', {'message': "I've completed the presentation! How does it look?"})
+
+    async def _request_plan_patch_async(self, conversation_history, feedback=None):
+        response = await self._call_llm_async(self._edit_patch_prompt(conversation_history, feedback), cache=feedback is None, purpose='edit_patch',
+                                              validate=self._is_patch_response)
+        try:
+            return self._parse_patch(response.text)
+        except ValueError:
+            return None
+
+    async def _edit_presentation_async(self, conversation_history):
+        yield self._yield_event('status_update', {'message': "Got it. I will revise the presentation based on your feedback."})
+
+        operations = await self._request_plan_patch_async(conversation_history)
+        if operations is None:
+            yield self._yield_event('status_update', {'message': "I'm sorry, I had trouble applying those changes. Could you try rephrasing?"})
+            return
+
+        patch_result, feedback = self._try_patch(operations)
+        if feedback:
+            yield self._yield_event('status_update', {'message': "It seems my first attempt didn't work. Let me try that again more directly..."})
+            patch_result, feedback = self._try_patch(await self._request_plan_patch_async(conversation_history, feedback=feedback))
+            if feedback:
+                yield self._yield_event('status_update', {'message': "I'm still having trouble with that request. Could you try a different wording?"})
+                return
+
+        events, changed_indices = self._adopt_plan_edit(*patch_result)
+        for event in events:
+            yield event
+        if changed_indices:
+            yield self._yield_event('status_update', {'message': f"Revising slide(s): {', '.join(str(i+1) for i in changed_indices)}..."})
+            async for event in self._process_and_generate_slides_async(changed_indices, is_update=True):
+                yield event
+
+        yield self._yield_event('status_update', {'message': "Revisions complete. What's next?"})
+
+    async def _process_and_generate_slides_async(self, indices_to_process, is_update=False):
+        total_slides_before_update = len(self.presentation_plan['slides'])
+        indices = [i for i in indices_to_process if i < total_slides_before_update]
+
+        if self.max_concurrency <= 1 or len(indices) <= 1:
+            for i in indices:
+                async for event in self._generate_single_slide_async(i, is_update, total_slides_before_update):
+                    yield event
+            return
+
+        stream = AsyncEventStream(min(self.max_concurrency, len(indices)))
+        try:
+            for i in indices:
+                stream.submit(lambda i=i: self._generate_single_slide_async(i, is_update, total_slides_before_update))
+            async for event in stream.drain():
+                yield event
+        finally:
+            stream.close()
+
+    async def _generate_single_slide_async(self, i, is_update, total_slides_before_update):
+        """Async counterpart of _generate_single_slide; the steps and events are shared with it."""
+        topic, style, theme, slide_data = self._slide_context(i)
+
+        # --- Charts ---
+        chart_info = self._pending_chart(slide_data)
+        if chart_info:
+            yield self._chart_search_event(chart_info["data_query"])
+            search_results = await self._search_for_data_async(chart_info["data_query"])
+            structured_data = None
+            if search_results:
+                yield self._chart_found_event()
+                structured_data = await self._structure_chart_data_async(search_results, chart_info["type"])
+            else:
+                yield self._chart_missing_event(chart_info["data_query"])
+            self._resolve_chart(chart_info, structured_data)
+
+        # --- Images ---
+        if "image_search_queries" in slide_data:
+            slide_data["image_urls"] = []
+            for query in slide_data["image_search_queries"]:
+                yield self._sourcing_image_event(i, query)
+                image_url = None
+                current_query = query
+                for attempt in range(IMAGE_SEARCH_RETRIES):
+                    image_url = await self._search_for_image_async(current_query)
+                    if image_url:
+                        break
+                    yield self._image_retry_event(i, current_query)
+                    current_query = await self._regenerate_image_search_query_async(topic, slide_data.get('title', ''), current_query)
+                if image_url:
+                    slide_data["image_urls"].append(image_url)
+            del slide_data["image_search_queries"]
+
+        palette = []
+        if slide_data.get("image_urls"):
+            palette = await asyncio.to_thread(self._get_palette_from_image_url, slide_data["image_urls"][0])
+
+        # --- HTML ---
+        yield self._designing_event(i, slide_data)
+        prompt = self._slide_html_prompt(slide_data, theme, style, palette)
+        with span('slide_design'):
+            if STREAM_SLIDE_HTML:
+                stripper = MarkdownFenceStripper()
+                parts = []
+                async for text in self._stream_llm_async(prompt, purpose='slide_html', validate=_is_html_response):
+                    parts.append(text)
+                    for event in self._slide_chunk_events(stripper.feed(text), i + 1):
+                        yield event
+                for event in self._slide_chunk_events(stripper.finish(), i + 1):
+                    yield event
+                response_text = ''.join(parts)
+            else:
+                response_text = (await self._call_llm_async(prompt, purpose='slide_html', validate=_is_html_response)).text
+            html_content = self._clean_slide_html(response_text)
+
+            # Asset downloads for the local store are blocking I/O.
+            html_content = await asyncio.to_thread(self._finish_slide_html, i, html_content, slide_data, theme)
+        yield self._slide_event(i, is_update, total_slides_before_update, html_content, slide_data, theme)
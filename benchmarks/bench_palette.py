@@ -0,0 +1,89 @@
+# benchmarks/bench_palette.py
+#
+# Compares the vectorized palette engine against the original colorgram path.
+#
+#   python benchmarks/bench_palette.py                 # synthetic photos
+#   python benchmarks/bench_palette.py a.jpg https://... --runs 5
+
+import os
+import sys
+import io
+import time
+import argparse
+import statistics
+import numpy as np
+import requests
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from palette import extract_palette
+
+SYNTHETIC_SIZES = [(1600, 1200), (4000, 3000)]
+
+def synthetic_photo(width, height, seed=0):
+    """A photo-like JPEG: smooth gradients, a few colored blobs, and sensor noise."""
+    rng = np.random.default_rng(seed)
+    y, x = np.mgrid[0:height, 0:width].astype(np.float32)
+    img = np.stack([x / width * 200, y / height * 180, (1 - x / width) * 220], axis=2)
+    for _ in range(6):
+        cx, cy, r = rng.uniform(0, width), rng.uniform(0, height), rng.uniform(0.1, 0.3) * width
+        mask = ((x - cx) ** 2 + (y - cy) ** 2) < r ** 2
+        img[mask] = rng.uniform(0, 255, 3)
+    img += rng.normal(0, 8, img.shape)
+    buffer = io.BytesIO()
+    Image.fromarray(np.clip(img, 0, 255).astype(np.uint8)).save(buffer, format='JPEG', quality=90)
+    return buffer.getvalue()
+
+def load_source(source):
+    if source.startswith(('http://', 'https://')):
+        response = requests.get(source, timeout=30)
+        response.raise_for_status()
+        return response.content
+    with open(source, 'rb') as f:
+        return f.read()
+
+def colorgram_palette(image_bytes, num_colors):
+    import colorgram
+    colors = colorgram.extract(io.BytesIO(image_bytes), num_colors)
+    return [f"#{c.rgb.r:02x}{c.rgb.g:02x}{c.rgb.b:02x}" for c in colors]
+
+def time_it(fn, runs):
+    timings, result = [], None
+    for _ in range(runs):
+        start = time.perf_counter()
+        result = fn()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings), result
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark palette extraction: colorgram vs the vectorized engine.")
+    parser.add_argument("sources", nargs="*", help="Image files or URLs (default: synthetic photos).")
+    parser.add_argument("--runs", type=int, default=3, help="Timed runs per image; the median is reported.")
+    parser.add_argument("--colors", type=int, default=6)
+    args = parser.parse_args()
+
+    if args.sources:
+        images = [(source, load_source(source)) for source in args.sources]
+    else:
+        images = [(f"synthetic {w}x{h}", synthetic_photo(w, h)) for w, h in SYNTHETIC_SIZES]
+
+    try:
+        import colorgram  # noqa: F401
+        has_colorgram = True
+    except ImportError:
+        has_colorgram = False
+        print("colorgram is not installed; only the vectorized engine is timed.\n")
+
+    print(f"{'image':<28}{'colorgram':>12}{'engine':>12}{'speedup':>10}")
+    for name, image_bytes in images:
+        engine_s, engine_palette = time_it(lambda: extract_palette(image_bytes, args.colors), args.runs)
+        if has_colorgram:
+            colorgram_s, colorgram_result = time_it(lambda: colorgram_palette(image_bytes, args.colors), args.runs)
+            print(f"{name:<28}{colorgram_s * 1000:>10.0f}ms{engine_s * 1000:>10.0f}ms{colorgram_s / engine_s:>9.1f}x")
+            print(f"  colorgram: {colorgram_result}")
+        else:
+            print(f"{name:<28}{'-':>12}{engine_s * 1000:>10.0f}ms{'-':>10}")
+        print(f"  engine:    {engine_palette}")
+
+if __name__ == "__main__":
+    main()
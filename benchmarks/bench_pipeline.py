@@ -0,0 +1,227 @@
+# benchmarks/bench_pipeline.py
+#
+# End-to-end benchmark of PresentationAgent.run_conversation_turn and
+# StaticImageExporter.export against the local stand-ins in fakes.py.
+#
+#   python benchmarks/bench_pipeline.py                        # 5/20/50-slide decks
+#   python benchmarks/bench_pipeline.py --slides 20 --llm-latency 1.0 --no-export
+#   python benchmarks/bench_pipeline.py --slides 20 --profiles standard hd compact preview
+#   python benchmarks/bench_pipeline.py --compare benchmarks/results/<run>.json
+#
+# Each run is saved under benchmarks/results/ (named by time and commit) and
+# compared against the previous one.
+
+import os
+import sys
+import json
+import time
+import glob
+import shutil
+import asyncio
+import argparse
+import resource
+import tempfile
+import subprocess
+from datetime import datetime, timezone
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+from export_profiles import EXPORT_PROFILES
+RESULTS_DIR = os.path.join(ROOT, "benchmarks", "results")
+DEFAULT_DECKS = [5, 20, 50]
+
+def isolate_caches():
+    """Points every on-disk cache at a fresh temporary directory and turns the LLM cache off."""
+    scratch = tempfile.mkdtemp(prefix="slidegen-bench-")
+    os.environ.update({
+        "ASSET_STORE_DIR": os.path.join(scratch, "assets"),
+        "RENDER_CACHE_DIR": os.path.join(scratch, "renders"),
+        "SEARCH_CACHE_PATH": os.path.join(scratch, "search.sqlite3"),
+        "LLM_CACHE": "0",
+        "GEMINI_API_KEY": os.environ.get("GEMINI_API_KEY", "benchmark"),
+    })
+    return scratch
+
+def peak_rss_mb():
+    usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return usage / 1024 / 1024 if sys.platform == 'darwin' else usage / 1024  # bytes on macOS, KiB elsewhere
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+def run_turn(agent, prompt, use_async):
+    """Runs one conversation turn; returns (events, seconds until the first slide, total seconds)."""
+    history = [{"role": "user", "content": prompt}]
+    start = time.perf_counter()
+    events, first_slide_s = [], None
+
+    def record(event):
+        nonlocal first_slide_s
+        if event['type'] == 'new_slide' and first_slide_s is None:
+            first_slide_s = time.perf_counter() - start
+        events.append(event)
+
+    if use_async:
+        async def consume():
+            async for event in agent.run_conversation_turn_async(history, emit_timing=True):
+                record(event)
+        asyncio.run(consume())
+    else:
+        for event in agent.run_conversation_turn(history, emit_timing=True):
+            record(event)
+    return events, first_slide_s, time.perf_counter() - start
+
+def stage_breakdown(events):
+    timing = next((e['data'] for e in reversed(events) if e['type'] == 'timing'), None)
+    return timing['stages'] if timing else {}
+
+def bench_export(slides_html, asset_store, profile):
+    """Times a full image export with the shared browser pool; returns None if Playwright is unavailable."""
+    try:
+        from browser_pool import BrowserPool
+        from presentation_exporter import StaticImageExporter
+    except ImportError as e:
+        print(f"  export skipped: {e}")
+        return None
+    pool = BrowserPool()
+    try:
+        pool.warm_up()  # Launch outside the timed region; it is a one-off per process
+        exporter = StaticImageExporter(slides_html, browser_pool=pool, render_cache=None, asset_store=asset_store, profile=profile)
+        start = time.perf_counter()
+        pptx = pool.run(exporter.export())
+        seconds = time.perf_counter() - start
+    except Exception as e:
+        print(f"  export failed: {e}")
+        return None
+    finally:
+        pool.shutdown()
+    return {"seconds": round(seconds, 3), "seconds_per_slide": round(seconds / len(slides_html), 3), "pptx_bytes": len(pptx),
+            "unique_images": exporter.size_report["images"], "image_bytes": exporter.size_report["image_bytes"]}
+
+def bench_deck(slide_count, args, search_client):
+    from presentation_generator import PresentationAgent
+    from fakes import FakeGeminiModel
+
+    model = FakeGeminiModel(latency_s=args.llm_latency, chars_per_s=args.llm_chars_per_s)
+    if args.use_async:
+        from async_agent import AsyncPresentationAgent as agent_class
+    else:
+        agent_class = PresentationAgent
+    agent = agent_class(max_concurrency=args.concurrency, model=model, search_client=search_client)
+
+    events, first_slide_s, create_s = run_turn(agent, f"Benchmark: a {slide_count}-slide deck", args.use_async)
+    slides = sorted((e['data'] for e in events if e['type'] == 'new_slide'), key=lambda d: d['slide_number'])
+    result = {
+        "slides": len(slides),
+        "create_seconds": round(create_s, 3),
+        "slides_per_second": round(len(slides) / create_s, 3),
+        "time_to_first_slide": round(first_slide_s, 3) if first_slide_s is not None else None,
+        "model_calls": model.calls,
+        "stages": stage_breakdown(events),
+    }
+
+    edit_events, _, edit_s = run_turn(agent, "Change the title of slide 2", args.use_async)
+    result["edit_seconds"] = round(edit_s, 3)
+
+    if args.export and slides:
+        result["exports"] = {profile: bench_export([s['html'] for s in slides], agent.asset_store, profile) for profile in args.profiles}
+    result["peak_rss_mb"] = round(peak_rss_mb(), 1)
+    return result
+
+def print_deck(slide_count, result):
+    print(f"\n{slide_count}-slide deck: {result['slides']} slides in {result['create_seconds']:.2f} s "
+          f"({result['slides_per_second']:.2f} slides/s), first slide after {result['time_to_first_slide'] or float('nan'):.2f} s, "
+          f"edit {result['edit_seconds']:.2f} s, peak RSS {result['peak_rss_mb']:.0f} MB")
+    for profile, export in (result.get("exports") or {}).items():
+        if export:
+            print(f"  export ({profile}): {export['seconds']:.2f} s ({export['seconds_per_slide']:.3f} s/slide), "
+                  f"{export['pptx_bytes'] / 1024:.0f} KiB, {export['unique_images']} unique image(s)")
+    print(f"  {'stage':<28}{'count':>7}{'total ms':>12}{'max ms':>10}")
+    for stage, entry in sorted(result["stages"].items(), key=lambda item: -item[1]['total_ms']):
+        print(f"  {stage:<28}{entry['count']:>7}{entry['total_ms']:>12.0f}{entry['max_ms']:>10.0f}")
+
+def first_export(result):
+    """The export of the first profile benchmarked; runs saved before profiles existed have one `export`."""
+    exports = result.get("exports") or {"standard": result.get("export")}
+    return next(iter(exports.values()), None) or {}
+
+def kib(size_bytes):
+    return size_bytes / 1024 if size_bytes is not None else None
+
+def compare(current, previous_path):
+    with open(previous_path) as f:
+        previous = json.load(f)
+    print(f"\nCompared with {os.path.basename(previous_path)} (commit {previous.get('commit')}):")
+    print(f"  {'deck':<8}{'slides/s':>18}{'first slide s':>20}{'export s/slide':>20}{'export KiB':>20}")
+
+    def delta(new, old):
+        if new is None or old is None:
+            return f"{'-':>18}"
+        change = (new - old) / old * 100 if old else 0.0
+        return f"{old:>7.3f} -> {new:<7.3f}{change:+.0f}%".rjust(18)
+
+    for deck, result in current["decks"].items():
+        before = previous.get("decks", {}).get(deck)
+        if before is None:
+            continue
+        export_now = first_export(result)
+        export_before = first_export(before)
+        print(f"  {deck:<8}{delta(result['slides_per_second'], before['slides_per_second'])}"
+              f"  {delta(result['time_to_first_slide'], before['time_to_first_slide'])}"
+              f"  {delta(export_now.get('seconds_per_slide'), export_before.get('seconds_per_slide'))}"
+              f"  {delta(kib(export_now.get('pptx_bytes')), kib(export_before.get('pptx_bytes')))}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark deck generation and export against local fakes.")
+    parser.add_argument("--slides", type=int, nargs="+", default=DEFAULT_DECKS, help="Deck sizes to generate.")
+    parser.add_argument("--concurrency", type=int, default=4, help="Slides sourced/designed at once.")
+    parser.add_argument("--llm-latency", type=float, default=0.5, help="Seconds before the fake model's first token.")
+    parser.add_argument("--llm-chars-per-s", type=float, default=2000, help="Fake model output speed.")
+    parser.add_argument("--search-latency", type=float, default=0.2, help="Seconds per fake SearXNG search.")
+    parser.add_argument("--image-latency", type=float, default=0.05, help="Seconds per fake image download.")
+    parser.add_argument("--async", dest="use_async", action="store_true", help="Benchmark AsyncPresentationAgent instead.")
+    parser.add_argument("--no-export", dest="export", action="store_false", help="Skip the Playwright export.")
+    parser.add_argument("--profiles", nargs="+", default=["standard"], choices=sorted(EXPORT_PROFILES),
+                        help="Export profiles to benchmark; the first is compared across runs.")
+    parser.add_argument("--compare", help="Result file to compare against (default: the latest saved run).")
+    parser.add_argument("--no-save", dest="save", action="store_false", help="Do not save this run's results.")
+    args = parser.parse_args()
+
+    scratch = isolate_caches()
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    from fakes import FakeSearxngServer
+    from search_client import SearxngClient
+    from presentation_generator import HEADERS
+
+    previous = args.compare or max(glob.glob(os.path.join(RESULTS_DIR, "*.json")), default=None)
+    run = {
+        "commit": git_commit(),
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "settings": {k: v for k, v in vars(args).items() if k not in ("compare", "save")},
+        "decks": {},
+    }
+
+    try:
+        with FakeSearxngServer(latency_s=args.search_latency, image_latency_s=args.image_latency) as server:
+            search_client = SearxngClient([server.url], headers=HEADERS, cache=None)
+            for slide_count in args.slides:
+                result = bench_deck(slide_count, args, search_client)
+                run["decks"][str(slide_count)] = result
+                print_deck(slide_count, result)
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+
+    if args.save:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        path = os.path.join(RESULTS_DIR, f"{datetime.now(timezone.utc):%Y%m%dT%H%M%S}_{run['commit']}.json")
+        with open(path, "w") as f:
+            json.dump(run, f, indent=2)
+        print(f"\nSaved results to {os.path.relpath(path, ROOT)}")
+    if previous:
+        compare(run, previous)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+# benchmarks/bench_startup.py
+#
+# Measures cold-start cost: importing the app in a fresh interpreter, and the
+# prewarm hook (heavy imports, model client, export browser).
+#
+#   python benchmarks/bench_startup.py --runs 5
+#   python benchmarks/bench_startup.py --top 15     # slowest imports (python -X importtime)
+
+import os
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+MEASURE_SCRIPT = """
+import json, sys, time
+start = time.perf_counter()
+import app
+imported = time.perf_counter() - start
+prewarm = None
+if {prewarm!r}:
+    app.prewarm(launch_browser={browser!r})
+    prewarm = dict(app.startup_timings)
+heavy = [name for name in app.HEAVY_MODULES if name in sys.modules]
+print(json.dumps({{"import_s": imported, "prewarm": prewarm, "heavy_loaded_at_import": heavy if not {prewarm!r} else None}}))
+"""
+
+def measure(prewarm, browser):
+    env = dict(os.environ, GEMINI_API_KEY=os.environ.get("GEMINI_API_KEY", "benchmark"))
+    completed = subprocess.run(
+        [sys.executable, "-c", MEASURE_SCRIPT.format(prewarm=prewarm, browser=browser)],
+        cwd=ROOT, env=env, capture_output=True, text=True, check=True
+    )
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+def slowest_imports(top):
+    completed = subprocess.run([sys.executable, "-X", "importtime", "-c", "import app"], cwd=ROOT, capture_output=True, text=True)
+    rows = []
+    for line in completed.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        if depth != 1:  # Modules imported directly by app; deeper ones are included in their parent
+            continue
+        rows.append((int(cumulative), name.strip()))
+    return sorted(rows, reverse=True)[:top]
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure app import and prewarm times.")
+    parser.add_argument("--runs", type=int, default=5, help="Fresh interpreters per measurement; the median is reported.")
+    parser.add_argument("--no-browser", dest="browser", action="store_false", help="Do not launch the export browser while prewarming.")
+    parser.add_argument("--top", type=int, default=0, help="Also list the N slowest imports under `import app`.")
+    args = parser.parse_args()
+
+    cold = [measure(prewarm=False, browser=False) for _ in range(args.runs)]
+    print(f"import app: median {statistics.median(r['import_s'] for r in cold) * 1000:.0f} ms over {args.runs} runs")
+    print(f"  heavy modules loaded at import: {', '.join(cold[0]['heavy_loaded_at_import']) or 'none'}")
+
+    warm = [measure(prewarm=True, browser=args.browser) for _ in range(args.runs)]
+    phases = sorted({phase for r in warm for phase in r['prewarm']})
+    for phase in phases:
+        values = [r['prewarm'][phase] for r in warm if phase in r['prewarm']]
+        print(f"  {phase:<28}median {statistics.median(values) * 1000:>7.0f} ms")
+
+    if args.top:
+        print("\nSlowest imports under `import app` (cumulative):")
+        for microseconds, name in slowest_imports(args.top):
+            print(f"  {microseconds / 1000:>8.1f} ms  {name}")
+
+if __name__ == "__main__":
+    main()
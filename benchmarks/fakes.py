@@ -0,0 +1,241 @@
+# benchmarks/fakes.py
+#
+# Local stand-ins for Gemini and SearXNG (plus the image hosts it points at),
+# with configurable latency, so the generation and export pipelines can be
+# benchmarked deterministically without paid or rate-limited services.
+
+import io
+import re
+import json
+import time
+import asyncio
+import hashlib
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+import numpy as np
+from PIL import Image
+
+IMAGE_RESULTS_PER_SEARCH = 8
+IMAGE_SIZE = (1280, 720)
+CHART_EVERY_N_SLIDES = 4
+STREAM_CHUNK_CHARS = 120
+DECK_SIZE_PATTERN = re.compile(r'(\d+)[- ]slide')
+
+class FakeResponse:
+    """Mimics the `.text` of a Gemini response or streamed chunk."""
+    def __init__(self, text):
+        self.text = text
+
+class FakeGeminiModel:
+    """
+    Answers every prompt the agent sends with a fixed, well-formed response,
+    taking `latency_s` before the first token and then `chars_per_s` to
+    "generate" the rest. Decks have as many slides as the request asks for
+    ("... a 20-slide deck ..."), or `default_slides`.
+    """
+    def __init__(self, latency_s=0.5, chars_per_s=2000, default_slides=5):
+        self.latency_s = latency_s
+        self.chars_per_s = chars_per_s
+        self.default_slides = default_slides
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    # --- Responses ---
+    def _respond(self, prompt):
+        if "differentiate between the core subject matter" in prompt:
+            request = re.search(r"User's Request: '(.*)'", prompt)
+            return json.dumps({"topic": request.group(1) if request else "Benchmarks", "theme_hint": "clean and modern"})
+        if "Create a complete visual and content plan" in prompt:
+            topic = re.search(r"\*\*Topic:\*\* '(.*)'", prompt)
+            return json.dumps(self._plan(topic.group(1) if topic else "Benchmarks"))
+        if "You are an expert HTML/CSS designer" in prompt:
+            slide_data = re.search(r"\*\*Slide Data:\*\* (.*)", prompt)
+            return self._slide_html(json.loads(slide_data.group(1)) if slide_data else {})
+        if "You are a data analysis expert" in prompt:
+            return json.dumps({"labels": ["2021", "2022", "2023", "2024"], "datasets": [{"label": "Value", "data": [12, 19, 23, 31]}]})
+        if "JSON Patch (RFC 6902)" in prompt:
+            return json.dumps([{"op": "replace", "path": "/slides/1/title", "value": "Revised for the benchmark"}])
+        return "abstract benchmark scenery"  # Image search queries
+
+    def _plan(self, topic):
+        match = DECK_SIZE_PATTERN.search(topic)
+        slide_count = int(match.group(1)) if match else self.default_slides
+        deck = hashlib.sha1(topic.encode('utf-8')).hexdigest()[:8]
+        slides = []
+        for i in range(slide_count):
+            slide = {
+                "title": f"Slide {i + 1} of {slide_count}",
+                "content": f"Key point {i + 1}: steady, measurable progress across the pipeline.",
+                "layout": "background_image_content_overlay" if i == 0 else "image_right",
+                # Unique per deck, so one deck never warms another's caches.
+                "image_search_queries": [f"benchmark {deck} visual {i + 1}"],
+            }
+            if i % CHART_EVERY_N_SLIDES == CHART_EVERY_N_SLIDES - 1:
+                slide["chart"] = {"type": "bar", "data_query": f"benchmark {deck} figures {i + 1}"}
+            slides.append(slide)
+        theme = {
+            "colors": {"primary": "#1f3a5f", "secondary": "#f4a259", "background": "#f7f7f2", "text": "#1b1b1b"},
+            "font_pairing": {"heading": "Montserrat", "body": "Lato"},
+        }
+        return {"title": topic, "theme": theme, "slides": slides}
+
+    def _slide_html(self, slide_data):
+        images = ''.join(
+            f'<div data-layer="1" data-element-type="image" style="position:absolute;left:55%;top:10%;width:40%;height:80%;">'
+            f'<img src="{url}" style="width:100%;height:100%;object-fit:cover;"></div>'
+            for url in slide_data.get("image_urls", [])
+        )
+        bullets = ''.join(f"<li>{slide_data.get('content', '')} ({n})</li>" for n in range(1, 6))
+        return f"""```html
+<!DOCTYPE html>
+<html><head><style>
+body {{ margin: 0; width: 1280px; height: 720px; background: var(--theme-colors-background); font-family: var(--theme-font-pairing-body); }}
+h1 {{ color: var(--theme-colors-primary); font-family: var(--theme-font-pairing-heading); }}
+[contentEditable="true"]:hover {{ outline: 2px dashed rgba(106, 90, 205, 0.7); }}
+</style></head><body>
+<div data-layer="0" data-element-type="shape" style="position:absolute;left:0;top:0;width:1280px;height:12px;background:var(--theme-colors-secondary);"></div>
+{images}
+<div data-layer="2" data-element-type="textbox" contentEditable="true" style="position:absolute;left:5%;top:12%;width:45%;"><h1>{slide_data.get('title', '')}</h1></div>
+<div data-layer="3" data-element-type="textbox" contentEditable="true" style="position:absolute;left:5%;top:35%;width:45%;color:var(--theme-colors-text);"><ul>{bullets}</ul></div>
+</body></html>
+```"""
+
+    # --- Gemini API surface ---
+    def _count(self):
+        with self._lock:
+            self.calls += 1
+
+    def generate_content(self, prompt, generation_config=None, stream=False):
+        self._count()
+        text = self._respond(prompt)
+        if stream:
+            return self._stream(text)
+        time.sleep(self.latency_s + len(text) / self.chars_per_s)
+        return FakeResponse(text)
+
+    def _stream(self, text):
+        time.sleep(self.latency_s)
+        for start in range(0, len(text), STREAM_CHUNK_CHARS):
+            chunk = text[start:start + STREAM_CHUNK_CHARS]
+            time.sleep(len(chunk) / self.chars_per_s)
+            yield FakeResponse(chunk)
+
+    async def generate_content_async(self, prompt, generation_config=None, stream=False):
+        self._count()
+        text = self._respond(prompt)
+        if stream:
+            return self._stream_async(text)
+        await asyncio.sleep(self.latency_s + len(text) / self.chars_per_s)
+        return FakeResponse(text)
+
+    async def _stream_async(self, text):
+        await asyncio.sleep(self.latency_s)
+        for start in range(0, len(text), STREAM_CHUNK_CHARS):
+            chunk = text[start:start + STREAM_CHUNK_CHARS]
+            await asyncio.sleep(len(chunk) / self.chars_per_s)
+            yield FakeResponse(chunk)
+
+# --- SearXNG and image hosting ---
+def synthetic_image(seed, size=IMAGE_SIZE):
+    """A deterministic photo-like JPEG for an image URL."""
+    rng = np.random.default_rng(seed)
+    width, height = size
+    y, x = np.mgrid[0:height, 0:width].astype(np.float32)
+    base = rng.uniform(40, 215, 3)
+    img = np.stack([base[0] + x / width * 40, base[1] + y / height * 40, base[2] - x / width * 40], axis=2)
+    img += rng.normal(0, 6, img.shape)
+    buffer = io.BytesIO()
+    Image.fromarray(np.clip(img, 0, 255).astype(np.uint8)).save(buffer, format='JPEG', quality=85)
+    return buffer.getvalue()
+
+class FakeSearxngServer:
+    """
+    A local HTTP server that answers SearXNG's JSON search API and serves the
+    images its results point at. Every request waits `latency_s` first.
+
+        with FakeSearxngServer(latency_s=0.2) as server:
+            client = SearxngClient([server.url])
+    """
+    def __init__(self, latency_s=0.2, image_latency_s=0.05, host="127.0.0.1", port=0):
+        self.latency_s = latency_s
+        self.image_latency_s = image_latency_s
+        self.requests = 0
+        self._images = {}
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def _image(self, name):
+        with self._lock:
+            if name not in self._images:
+                self._images[name] = synthetic_image(int(hashlib.sha1(name.encode('utf-8')).hexdigest()[:8], 16))
+            return self._images[name]
+
+    def _search(self, query, category):
+        digest = hashlib.sha1(query.encode('utf-8')).hexdigest()[:12]
+        if category == 'images':
+            return {"query": query, "results": [{
+                "title": f"{query} ({n + 1})",
+                "url": f"{self.url}/page/{digest}-{n}",
+                "img_src": f"{self.url}/img/{digest}-{n}.jpg",
+                "thumbnail_src": f"{self.url}/img/{digest}-{n}.jpg?w=300",
+                "resolution": f"{IMAGE_SIZE[0]} x {IMAGE_SIZE[1]}",
+            } for n in range(IMAGE_RESULTS_PER_SEARCH)]}
+        return {"query": query, "results": [{
+            "title": f"{query} report {n + 1}",
+            "url": f"{self.url}/page/{digest}-{n}",
+            "content": f"In 2021 the figure was {12 + n}, rising to {19 + n} in 2022, {23 + n} in 2023 and {31 + n} in 2024.",
+        } for n in range(5)]}
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass  # Keep benchmark output readable
+
+            def _send(self, status, body, content_type):
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                with server._lock:
+                    server.requests += 1
+                parsed = urlparse(self.path)
+                if parsed.path == "/search":
+                    time.sleep(server.latency_s)
+                    params = parse_qs(parsed.query)
+                    results = server._search(params.get('q', [''])[0], params.get('categories', ['general'])[0])
+                    self._send(200, json.dumps(results).encode('utf-8'), "application/json")
+                elif parsed.path.startswith("/img/"):
+                    time.sleep(server.image_latency_s)
+                    self._send(200, server._image(parsed.path.rsplit('/', 1)[-1]), "image/jpeg")
+                else:
+                    self._send(404, b"{}", "application/json")
+
+        return Handler
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name="fake-searxng", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
@@ -0,0 +1,227 @@
+# browser_pool.py
+
+import os
+import asyncio
+import threading
+from collections import deque
+from contextlib import asynccontextmanager
+from metrics import span
+
+# --- Constants ---
+VIEWPORT_WIDTH_PX = 1280    # Slides are designed for, and captured at, this size
+VIEWPORT_HEIGHT_PX = 720
+POOL_SIZE = int(os.getenv("EXPORT_BROWSER_PAGES", 4))  # Pages that may capture at the same time
+MAX_PAGE_USES = 50          # Recycle a page's context after this many captures to cap leaks
+MAX_BROWSER_CHECKOUTS = 1000  # Relaunch Chromium after this many page checkouts
+HEALTH_CHECK_TIMEOUT_S = 5
+
+class _PooledPage:
+    """A page in its own browser context, plus the bookkeeping needed to recycle it."""
+    def __init__(self, context, page, generation, scale):
+        self.context = context
+        self.page = page
+        self.generation = generation
+        self.scale = scale  # Device scale factor, fixed for the context's lifetime
+        self.uses = 0
+
+class BrowserPool:
+    """
+    A long-lived headless Chromium shared by every export.
+
+    The browser lives on a dedicated event loop thread, so synchronous callers
+    (Flask handlers) submit coroutines through `run()` instead of starting a new
+    loop and a new browser per request. Pages are handed out through `page()`,
+    bounded by `size`, reused between exports, and recycled when they crash,
+    fail a health check, or have served `MAX_PAGE_USES` captures. A disconnected
+    browser is relaunched at once. One that has served `MAX_BROWSER_CHECKOUTS`
+    pages is replaced for new checkouts but only closed once the pages borrowed
+    from it have been returned, so captures in flight are not cut off.
+    """
+    def __init__(self, size=POOL_SIZE, viewport=None):
+        self.size = size
+        self.viewport = viewport or {"width": VIEWPORT_WIDTH_PX, "height": VIEWPORT_HEIGHT_PX}
+        self._loop = None
+        self._thread = None
+        self._thread_lock = threading.Lock()
+        self._playwright = None
+        self._browser = None
+        self._browser_lock = None
+        self._slots = None
+        self._idle = deque()
+        self._generation = 0
+        self._checkouts = 0
+        self._active = {}   # browser generation -> pages currently checked out
+        self._retired = {}  # generation -> worn-out browser kept until its pages are returned
+
+    # --- Event loop plumbing ---
+    def _ensure_loop(self):
+        with self._thread_lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                self._thread = threading.Thread(target=self._loop.run_forever, name="browser-pool", daemon=True)
+                self._thread.start()
+
+    def run(self, coro):
+        """Runs a coroutine on the pool's event loop from any thread and returns its result."""
+        self._ensure_loop()
+        return asyncio.run_coroutine_threadsafe(coro, self._loop).result()
+
+    async def run_async(self, coro):
+        """Awaitable form of `run` for code running on another event loop (the ASGI app)."""
+        self._ensure_loop()
+        return await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(coro, self._loop))
+
+    def warm_up(self):
+        """Launches the browser now instead of on the first export (see the prewarm hook in app.py)."""
+        self.run(self._ensure_browser())
+
+    # --- Browser lifecycle ---
+    async def _ensure_browser(self):
+        if self._browser_lock is None:
+            self._browser_lock = asyncio.Lock()
+            self._slots = asyncio.Semaphore(self.size)
+        async with self._browser_lock:
+            if self._browser is not None and self._browser.is_connected() and self._checkouts < MAX_BROWSER_CHECKOUTS:
+                return
+            if self._browser is not None and self._browser.is_connected():
+                print("BrowserPool: Browser worn out, launching a replacement...")
+                await self._retire_browser()
+            elif self._browser is not None:
+                print("BrowserPool: Browser disconnected, relaunching...")
+                await self._close_browser()
+            print("BrowserPool: Launching headless browser...")
+            with span('browser_launch'):
+                if self._playwright is None:
+                    # Imported here so that importing the app does not load Playwright.
+                    from playwright.async_api import async_playwright
+                    self._playwright = await async_playwright().start()
+                self._browser = await self._playwright.chromium.launch()
+            self._generation += 1
+            self._checkouts = 0
+
+    async def _close(self, browser):
+        try:
+            await browser.close()
+        except Exception as e:
+            print(f"BrowserPool: Error while closing browser: {e}")
+
+    async def _close_browser(self):
+        while self._idle:
+            await self._discard(self._idle.popleft())
+        if self._browser is not None:
+            await self._close(self._browser)
+            self._browser = None
+
+    async def _retire_browser(self):
+        """Stops handing out the current browser; it is closed when its last borrowed page comes back."""
+        while self._idle:
+            await self._discard(self._idle.popleft())
+        if self._active.get(self._generation, 0) > 0:
+            self._retired[self._generation] = self._browser
+        else:
+            await self._close(self._browser)
+        self._browser = None
+
+    async def _new_page(self, browser, generation, scale):
+        context = await browser.new_context(viewport=self.viewport, device_scale_factor=scale)
+        page = await context.new_page()
+        return _PooledPage(context, page, generation, scale)
+
+    async def _discard(self, pooled):
+        try:
+            await pooled.context.close()
+        except Exception:
+            pass  # The context dies with a crashed browser; nothing left to clean up.
+
+    async def _is_healthy(self, pooled):
+        if pooled.generation != self._generation or pooled.page.is_closed():
+            return False
+        try:
+            await asyncio.wait_for(pooled.page.evaluate("1"), HEALTH_CHECK_TIMEOUT_S)
+            return True
+        except Exception:
+            return False
+
+    async def _checkout(self, scale):
+        await self._ensure_browser()
+        # Counted before any await, so the browser cannot be closed under this checkout.
+        browser, generation = self._browser, self._generation
+        self._checkouts += 1
+        self._active[generation] = self._active.get(generation, 0) + 1
+        try:
+            for pooled in [p for p in self._idle if p.scale == scale]:
+                self._idle.remove(pooled)
+                if await self._is_healthy(pooled):
+                    return pooled
+                print("BrowserPool: Recycling an unhealthy page.")
+                await self._discard(pooled)
+            return await self._new_page(browser, generation, scale)
+        except BaseException:
+            await self._release(generation)
+            raise
+
+    async def _release(self, generation):
+        self._active[generation] -= 1
+        if self._active[generation] == 0:
+            del self._active[generation]
+            retired = self._retired.pop(generation, None)
+            if retired is not None:
+                print("BrowserPool: Closing a retired browser; its last page was returned.")
+                await self._close(retired)
+
+    async def _checkin(self, pooled, healthy):
+        pooled.uses += 1
+        reusable = (
+            healthy
+            and pooled.uses < MAX_PAGE_USES
+            and pooled.generation == self._generation
+            and not pooled.page.is_closed()
+        )
+        if reusable:
+            if len(self._idle) >= self.size:
+                # Pages rendered at another scale may pile up; keep the most recently used.
+                await self._discard(self._idle.popleft())
+            self._idle.append(pooled)
+        else:
+            await self._discard(pooled)
+        await self._release(pooled.generation)
+
+    @asynccontextmanager
+    async def page(self, scale=1):
+        """
+        Borrows a page for the duration of the `async with` block. `scale` is
+        its device scale factor: screenshots are `scale` times the viewport.
+        """
+        await self._ensure_browser()
+        async with self._slots:
+            pooled = await self._checkout(scale)
+            healthy = True
+            try:
+                yield pooled.page
+            except Exception:
+                healthy = False
+                raise
+            finally:
+                await self._checkin(pooled, healthy)
+
+    async def _shutdown(self):
+        await self._close_browser()
+        for browser in self._retired.values():
+            await self._close(browser)
+        self._retired.clear()
+        if self._playwright is not None:
+            await self._playwright.stop()
+            self._playwright = None
+
+    def shutdown(self):
+        """Closes the browser and stops the event loop thread."""
+        if self._loop is None:
+            return
+        try:
+            self.run(self._shutdown())
+        finally:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join(timeout=5)
+            self._loop = None
+            self._browser_lock = None
+            self._slots = None
@@ -0,0 +1,213 @@
+# export_jobs.py
+
+import os
+import time
+import asyncio
+import uuid
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from sse import format_sse, format_comment
+from export_profiles import DEFAULT_EXPORT_PROFILE
+
+# --- Constants ---
+EXPORT_WORKERS = int(os.getenv("EXPORT_WORKERS", 2))              # Exports that may run at the same time
+EXPORT_RESULT_TTL_S = int(os.getenv("EXPORT_RESULT_TTL_S", 15 * 60))  # Finished jobs (and their PPTX) are kept this long
+# Finished PPTX files held in memory, across all jobs; the oldest are dropped first.
+EXPORT_RESULT_MAX_BYTES = int(os.getenv("EXPORT_RESULT_MAX_BYTES", 256 * 1024 * 1024))
+MAX_QUEUED_JOBS = int(os.getenv("EXPORT_MAX_QUEUED_JOBS", 32))  # Jobs waiting for a worker; running and finished ones do not count
+EVENT_WAIT_TIMEOUT_S = 15  # A keep-alive comment is sent when nothing happened for this long
+
+class ExportQueueFull(RuntimeError):
+    """Raised when too many exports are already waiting for a worker."""
+
+class ExportJob:
+    """
+    One export request. Progress is recorded as a list of events so any number
+    of clients can stream it from the beginning; `status` moves from "queued"
+    to "running" to "done" or "failed".
+    """
+    def __init__(self, key, slides_html, export_format, profile=DEFAULT_EXPORT_PROFILE):
+        self.id = uuid.uuid4().hex
+        self.key = key
+        self.slides_html = slides_html
+        self.export_format = export_format
+        self.profile = profile
+        self.total_slides = len(slides_html)
+        self.status = "queued"
+        self.result = None
+        self.size_report = None  # The exporter's size breakdown, if it reports one
+        self.error = None
+        self.created_at = time.time()
+        self.finished_at = None
+        self.events = []
+        self._changed = threading.Condition(threading.RLock())
+        self._record("status", {"status": self.status})
+
+    def _record(self, event_type, data):
+        with self._changed:
+            self.events.append({"type": event_type, "data": data})
+            self._changed.notify_all()
+
+    def progress(self, stage, completed, total):
+        """Progress callback handed to the exporter; may be called from any thread."""
+        self._record("progress", {"stage": stage, "completed": completed, "total": total})
+
+    def _set_status(self, status, **data):
+        with self._changed:
+            # Status and its event change together, so a reader never sees one without the other.
+            self.status = status
+            if status in ("done", "failed"):
+                self.finished_at = time.time()
+            self._record("status", {"status": status, **data})
+
+    @property
+    def finished(self):
+        return self.status in ("done", "failed")
+
+    def next_events(self, after, timeout=EVENT_WAIT_TIMEOUT_S):
+        """
+        Blocks until there are events past index `after` (or the timeout passes)
+        and returns them with a flag telling whether the job has finished.
+        """
+        with self._changed:
+            self._changed.wait_for(lambda: len(self.events) > after, timeout=timeout)
+            return self.events[after:], self.finished
+
+    def wait(self, timeout=None):
+        """Blocks until the job has finished."""
+        with self._changed:
+            return self._changed.wait_for(lambda: self.finished, timeout=timeout)
+
+    def describe(self):
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "format": self.export_format,
+            "profile": self.profile,
+            "total_slides": self.total_slides,
+            "size_bytes": len(self.result) if self.result is not None else None,
+            "size_report": self.size_report,
+            "error": self.error,
+        }
+
+class ExportJobQueue:
+    """
+    Runs exports in the background on a bounded pool of workers, so an export
+    no longer ties up the web request that asked for it and at most `workers`
+    exports compete for the browser at once.
+
+    Jobs are keyed by a hash of their format and slides: submitting an export
+    that is identical to one queued, running or recently finished returns that
+    job instead of rendering the deck again. Finished jobs, including their
+    PPTX bytes, are dropped `result_ttl_s` after they finish, or earlier, oldest
+    first, when their results together exceed `result_max_bytes`.
+    """
+    def __init__(self, build_exporter, run, workers=EXPORT_WORKERS, result_ttl_s=EXPORT_RESULT_TTL_S,
+                 result_max_bytes=EXPORT_RESULT_MAX_BYTES, max_queued=MAX_QUEUED_JOBS):
+        self.build_exporter = build_exporter  # (slides_html, export_format, progress, profile) -> exporter
+        self.run = run  # Runs the exporter's coroutine to completion, e.g. BrowserPool.run
+        self.result_ttl_s = result_ttl_s
+        self.result_max_bytes = result_max_bytes
+        self.max_queued = max_queued
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="export")
+        self._jobs = {}      # job id -> job
+        self._by_key = {}    # request key -> job id
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(slides_html, export_format, profile=DEFAULT_EXPORT_PROFILE):
+        digest = hashlib.sha256()
+        digest.update(export_format.encode('utf-8'))
+        digest.update(b'\0')
+        digest.update(profile.encode('utf-8'))
+        for html_content in slides_html:
+            digest.update(b'\0')
+            digest.update(html_content.encode('utf-8'))
+        return digest.hexdigest()
+
+    def _purge(self, now):
+        finished = sorted((job for job in self._jobs.values() if job.finished), key=lambda job: job.finished_at)
+        retained = sum(len(job.result) for job in finished if job.result is not None)
+        for job in finished:
+            if now - job.finished_at <= self.result_ttl_s and retained <= self.result_max_bytes:
+                break
+            if job.result is not None:
+                retained -= len(job.result)
+            del self._jobs[job.id]
+            if self._by_key.get(job.key) == job.id:
+                del self._by_key[job.key]
+
+    def submit(self, slides_html, export_format, profile=DEFAULT_EXPORT_PROFILE):
+        """Returns the job for this export, queuing a new one unless an identical job already exists."""
+        key = self.make_key(slides_html, export_format, profile)
+        with self._lock:
+            self._purge(time.time())
+            existing = self._jobs.get(self._by_key.get(key))
+            if existing is not None and existing.status != "failed":
+                return existing
+            if sum(1 for job in self._jobs.values() if job.status == "queued") >= self.max_queued:
+                raise ExportQueueFull("Too many exports are waiting; please try again shortly.")
+            job = ExportJob(key, slides_html, export_format, profile)
+            self._jobs[job.id] = job
+            self._by_key[key] = job.id
+        self._executor.submit(self._run_job, job)
+        return job
+
+    def get(self, job_id):
+        """Returns a job by ID, or None if it is unknown or has expired."""
+        with self._lock:
+            self._purge(time.time())
+            return self._jobs.get(job_id)
+
+    def _run_job(self, job):
+        job._set_status("running")
+        start = time.perf_counter()
+        try:
+            exporter = self.build_exporter(job.slides_html, job.export_format, job.progress, job.profile)
+            job.result = self.run(exporter.export())
+            job.size_report = getattr(exporter, 'size_report', None)
+            job.slides_html = None  # No longer needed; the key still identifies the deck
+            job._set_status("done", size_bytes=len(job.result), size_report=job.size_report,
+                            elapsed_s=round(time.perf_counter() - start, 2))
+        except Exception as e:
+            print(f"ExportJobQueue: Job {job.id} failed: {e}")
+            job.error = str(e)
+            job._set_status("failed", error=job.error)
+        with self._lock:
+            self._purge(time.time())  # Keeps the retained results within budget as they arrive
+
+    def stream(self, job):
+        """Yields the job's events as server-sent events until it has finished."""
+        seen = 0
+        while True:
+            events, finished = job.next_events(seen)
+            if not events:
+                if finished:
+                    return
+                yield format_comment("keep-alive")
+                continue
+            seen += len(events)
+            for event in events:
+                yield format_sse(event)
+            if finished:
+                return
+
+    async def stream_async(self, job):
+        """Async form of `stream` for the ASGI app; waiting for events happens on a worker thread."""
+        events = self.stream(job)
+        while True:
+            chunk = await asyncio.to_thread(next, events, None)
+            if chunk is None:
+                return
+            yield chunk
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self):
+        with self._lock:
+            counts = {}
+            for job in self._jobs.values():
+                counts[job.status] = counts.get(job.status, 0) + 1
+            return {'jobs': counts}
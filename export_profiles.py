@@ -0,0 +1,24 @@
+# export_profiles.py
+#
+# Named resolution and encoding settings for image exports. Kept apart from
+# presentation_exporter so the web app can validate a profile without
+# importing the exporter and its dependencies.
+
+import os
+
+# scale: device scale factor of the capture (1 = 1280x720 pixels).
+# image_format/quality: how each slide image is encoded. PPTX has no WebP
+# support, so lossy profiles use JPEG.
+EXPORT_PROFILES = {
+    "standard": {"scale": 1, "image_format": "png", "quality": None},
+    # Crisp on high-DPI screens and projectors; four times the pixels.
+    "hd": {"scale": 2, "image_format": "png", "quality": None},
+    # Photo-heavy decks shrink several-fold; text edges soften slightly.
+    "compact": {"scale": 1, "image_format": "jpeg", "quality": 80},
+    # Small files for sharing or quick review.
+    "preview": {"scale": 0.5, "image_format": "jpeg", "quality": 60},
+}
+DEFAULT_EXPORT_PROFILE = os.getenv("EXPORT_PROFILE", "standard")
+if DEFAULT_EXPORT_PROFILE not in EXPORT_PROFILES:
+    print(f"Warning: Unknown EXPORT_PROFILE '{DEFAULT_EXPORT_PROFILE}' (expected one of {', '.join(EXPORT_PROFILES)}); using 'standard'.")
+    DEFAULT_EXPORT_PROFILE = "standard"
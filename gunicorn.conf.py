@@ -0,0 +1,28 @@
+# gunicorn.conf.py
+#
+#   gunicorn app:app -c gunicorn.conf.py
+#
+# The app is imported once in the master (cheap: heavy modules load lazily),
+# heavy modules are then imported before forking so workers share them, and
+# each worker creates its model client and export browser before it serves.
+
+import os
+
+bind = os.getenv("BIND", "0.0.0.0:8000")
+workers = int(os.getenv("WEB_CONCURRENCY", 2))
+worker_class = "gthread"
+threads = int(os.getenv("GUNICORN_THREADS", 8))  # Each open chat stream holds a thread
+timeout = 300  # Long generations stream for minutes
+preload_app = True
+
+def when_ready(server):
+    # In the master, before any worker is forked.
+    import app
+    app.prewarm_imports()
+    server.log.info(f"Prewarmed imports in {app.startup_timings['prewarm_imports_seconds']:.2f} s")
+
+def post_fork(server, worker):
+    # Threads, event loops, gRPC channels and browsers do not survive a fork,
+    # so they are created in each worker.
+    import app
+    app.prewarm()
@@ -0,0 +1,179 @@
+# llm_cache.py
+
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+import dataclasses
+from collections import OrderedDict
+from contextlib import contextmanager
+
+# --- Constants ---
+# Opt-in: cached answers make repeated prompts deterministic, which is what
+# retries, regression runs and demo decks want but not what users expect by default.
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE", "0") == "1"
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", os.path.join(".cache", "llm_responses.sqlite3"))
+LLM_CACHE_TTL_S = int(os.getenv("LLM_CACHE_TTL_S", 7 * 24 * 3600))
+LLM_CACHE_MAX_BYTES = int(os.getenv("LLM_CACHE_MAX_BYTES", 256 * 1024 * 1024))
+MEMORY_CACHE_ENTRIES = 256
+PURGE_EVERY_N_WRITES = 50
+
+def _config_fingerprint(generation_config):
+    """Returns a stable JSON-able form of a GenerationConfig (dataclass), dict or None."""
+    if generation_config is None:
+        return None
+    if dataclasses.is_dataclass(generation_config):
+        generation_config = dataclasses.asdict(generation_config)
+    if isinstance(generation_config, dict):
+        return {k: v for k, v in sorted(generation_config.items()) if v is not None}
+    return repr(generation_config)
+
+class CachedResponse:
+    """Stands in for a model response replayed from the cache; callers only read `.text`."""
+    def __init__(self, text):
+        self.text = text
+
+class LlmCache:
+    """
+    A two-tier cache for model responses, keyed by a hash of the model ID, the
+    generation config and the prompt.
+
+    Lookups hit an in-process LRU first and a durable SQLite table second.
+    Entries older than `ttl_s` are ignored and purged, and once the stored
+    responses exceed `max_bytes` the least recently used ones are deleted.
+    """
+    def __init__(self, path=LLM_CACHE_PATH, memory_entries=MEMORY_CACHE_ENTRIES, ttl_s=LLM_CACHE_TTL_S, max_bytes=LLM_CACHE_MAX_BYTES):
+        self.path = path
+        self.memory_entries = memory_entries
+        self.ttl_s = ttl_s
+        self.max_bytes = max_bytes
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._writes = 0
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS llm_responses (
+                    key TEXT PRIMARY KEY,
+                    model_id TEXT NOT NULL,
+                    response TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    created_at REAL NOT NULL,
+                    last_used_at REAL NOT NULL
+                )
+            """)
+
+    @contextmanager
+    def _connect(self):
+        """Yields a short-lived connection that commits on success and is always closed."""
+        conn = sqlite3.connect(self.path, timeout=5)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    @staticmethod
+    def make_key(model_id, generation_config, prompt):
+        material = json.dumps(
+            {'model': model_id, 'config': _config_fingerprint(generation_config), 'prompt': prompt},
+            sort_keys=True, default=str
+        )
+        return hashlib.sha256(material.encode('utf-8')).hexdigest()
+
+    def _remember(self, key, text, created_at):
+        self._memory[key] = (text, created_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def get(self, key):
+        """Returns the cached response text, or None if absent or expired."""
+        now = time.time()
+        oldest_valid = now - self.ttl_s
+
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                if entry[1] >= oldest_valid:
+                    self._memory.move_to_end(key)
+                    self.memory_hits += 1
+                    return entry[0]
+                del self._memory[key]
+
+        try:
+            with self._connect() as conn:
+                row = conn.execute("SELECT response, created_at FROM llm_responses WHERE key = ?", (key,)).fetchone()
+                if row is not None and row[1] >= oldest_valid:
+                    conn.execute("UPDATE llm_responses SET last_used_at = ? WHERE key = ?", (now, key))
+        except sqlite3.Error as e:
+            print(f"LlmCache: Could not read from {self.path}: {e}")
+            row = None
+
+        with self._lock:
+            if row is None or row[1] < oldest_valid:
+                self.misses += 1
+                return None
+            self._remember(key, row[0], row[1])
+            self.disk_hits += 1
+            return row[0]
+
+    def put(self, key, model_id, text):
+        """Stores a response text in both tiers."""
+        now = time.time()
+        with self._lock:
+            self._remember(key, text, now)
+            self._writes += 1
+            purge = self._writes % PURGE_EVERY_N_WRITES == 0
+        try:
+            with self._connect() as conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO llm_responses (key, model_id, response, size, created_at, last_used_at) VALUES (?, ?, ?, ?, ?, ?)",
+                    (key, model_id, text, len(text.encode('utf-8')), now, now)
+                )
+                if purge:
+                    self._purge(conn)
+        except sqlite3.Error as e:
+            print(f"LlmCache: Could not write to {self.path}: {e}")
+
+    def _purge(self, conn):
+        """Deletes expired rows, then least recently used rows until the table is under `max_bytes`."""
+        conn.execute("DELETE FROM llm_responses WHERE created_at < ?", (time.time() - self.ttl_s,))
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM llm_responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        evicted = []
+        for key, size in conn.execute("SELECT key, size FROM llm_responses ORDER BY last_used_at"):
+            if total <= self.max_bytes:
+                break
+            evicted.append((key,))
+            total -= size
+        conn.executemany("DELETE FROM llm_responses WHERE key = ?", evicted)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'memory_hits': self.memory_hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'memory_entries': len(self._memory),
+            }
+
+_shared_cache = None
+_shared_cache_lock = threading.Lock()
+
+def get_llm_cache():
+    """Returns the process-wide LLM response cache, or None unless LLM_CACHE=1."""
+    global _shared_cache
+    if not LLM_CACHE_ENABLED:
+        return None
+    with _shared_cache_lock:
+        if _shared_cache is None:
+            _shared_cache = LlmCache()
+        return _shared_cache
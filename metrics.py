@@ -0,0 +1,170 @@
+# metrics.py
+#
+# Timing spans for every stage of generation and export, aggregated into
+# Prometheus-style histograms and, optionally, per-turn summaries.
+
+import os
+import time
+import threading
+import contextvars
+from contextlib import contextmanager
+
+# --- Constants ---
+METRIC_PREFIX = "slidegen"
+# Seconds; spans range from cache hits (~1 ms) to whole turns (minutes).
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120, 300)
+TIMING_EVENTS = os.getenv("TIMING_EVENTS", "0") == "1"  # Send a `timing` SSE event at the end of every turn
+
+def _escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape_label(value)}"' for name, value in labels) + '}'
+
+class _Histogram:
+    """Cumulative bucket counts plus sum and count for one label set."""
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        for i, upper in enumerate(self.buckets):
+            if value <= upper:
+                self.counts[i] += 1
+        self.sum += value
+        self.count += 1
+
+class MetricsRegistry:
+    """
+    Thread-safe store of duration histograms and counters, rendered in the
+    Prometheus text exposition format by `render()`.
+    """
+    def __init__(self, buckets=DURATION_BUCKETS):
+        self.buckets = buckets
+        self._histograms = {}  # (name, sorted labels) -> _Histogram
+        self._counters = {}    # (name, sorted labels) -> value
+        self._help = {}
+        self._lock = threading.Lock()
+
+    def observe(self, name, value, help_text='', **labels):
+        key = (name, tuple(sorted((k, str(v)) for k, v in labels.items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = _Histogram(self.buckets)
+                self._help.setdefault(name, help_text)
+            histogram.observe(value)
+
+    def increment(self, name, amount=1, help_text='', **labels):
+        key = (name, tuple(sorted((k, str(v)) for k, v in labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+            self._help.setdefault(name, help_text)
+
+    def render(self, gauges=None):
+        """
+        Returns every metric in the Prometheus text format. `gauges` maps extra
+        gauge names to values (e.g. cache sizes) sampled at scrape time.
+        """
+        lines = []
+        with self._lock:
+            for name in sorted({name for name, _ in self._histograms}):
+                full_name = f"{METRIC_PREFIX}_{name}"
+                lines.append(f"# HELP {full_name} {self._help.get(name, '')}")
+                lines.append(f"# TYPE {full_name} histogram")
+                for (metric, labels), histogram in sorted(self._histograms.items()):
+                    if metric != name:
+                        continue
+                    for upper, count in zip(histogram.buckets, histogram.counts):
+                        lines.append(f"{full_name}_bucket{_format_labels(labels + (('le', upper),))} {count}")
+                    lines.append(f"{full_name}_bucket{_format_labels(labels + (('le', '+Inf'),))} {histogram.count}")
+                    lines.append(f"{full_name}_sum{_format_labels(labels)} {histogram.sum:.6f}")
+                    lines.append(f"{full_name}_count{_format_labels(labels)} {histogram.count}")
+            for name in sorted({name for name, _ in self._counters}):
+                full_name = f"{METRIC_PREFIX}_{name}_total"
+                lines.append(f"# HELP {full_name} {self._help.get(name, '')}")
+                lines.append(f"# TYPE {full_name} counter")
+                for (metric, labels), value in sorted(self._counters.items()):
+                    if metric == name:
+                        lines.append(f"{full_name}{_format_labels(labels)} {value}")
+        for name, value in sorted((gauges or {}).items()):
+            full_name = f"{METRIC_PREFIX}_{name}"
+            lines.append(f"# TYPE {full_name} gauge")
+            lines.append(f"{full_name} {value}")
+        return '\n'.join(lines) + '\n'
+
+_registry = MetricsRegistry()
+
+def get_metrics():
+    """Returns the process-wide metrics registry."""
+    return _registry
+
+class TurnTimings:
+    """Collects the spans recorded while one conversation turn is running."""
+    def __init__(self):
+        self.started = time.perf_counter()
+        self._spans = []
+        self._lock = threading.Lock()
+
+    def add(self, stage, labels, seconds):
+        with self._lock:
+            self._spans.append((stage, labels, seconds))
+
+    def summary(self):
+        """Per-stage count, total and slowest span in milliseconds, plus the turn's wall time."""
+        stages = {}
+        with self._lock:
+            spans = list(self._spans)
+        for stage, labels, seconds in spans:
+            name = stage if 'purpose' not in labels else f"{stage}:{labels['purpose']}"
+            entry = stages.setdefault(name, {'count': 0, 'total_ms': 0.0, 'max_ms': 0.0})
+            entry['count'] += 1
+            entry['total_ms'] += seconds * 1000
+            entry['max_ms'] = max(entry['max_ms'], seconds * 1000)
+        for entry in stages.values():
+            entry['total_ms'] = round(entry['total_ms'], 1)
+            entry['max_ms'] = round(entry['max_ms'], 1)
+        return {'wall_ms': round((time.perf_counter() - self.started) * 1000, 1), 'stages': stages}
+
+# The turn whose spans are being collected. Worker threads inherit it through
+# contextvars.copy_context() (ConcurrentEventStream) or asyncio.to_thread.
+_current_turn = contextvars.ContextVar("current_turn", default=None)
+
+@contextmanager
+def collect_turn():
+    """Collects every span recorded in this context (and its workers) into a TurnTimings."""
+    timings = TurnTimings()
+    token = _current_turn.set(timings)
+    try:
+        yield timings
+    finally:
+        try:
+            _current_turn.reset(token)
+        except ValueError:
+            # A generator can be finished from a different context than it started in.
+            _current_turn.set(None)
+
+@contextmanager
+def span(stage, **labels):
+    """
+    Times the enclosed block as one `stage` span. The duration goes into the
+    `stage_duration_seconds` histogram and the current turn's timings; errors
+    are counted under `stage_errors`.
+    """
+    start = time.perf_counter()
+    try:
+        yield labels  # Callers may add labels known only after the work, e.g. a cache hit
+    except BaseException as e:
+        if not isinstance(e, GeneratorExit):
+            _registry.increment('stage_errors', help_text="Spans that ended with an exception.", stage=stage)
+        raise
+    finally:
+        seconds = time.perf_counter() - start
+        _registry.observe('stage_duration_seconds', seconds, help_text="Time spent in each generation and export stage.", stage=stage, **labels)
+        turn = _current_turn.get()
+        if turn is not None:
+            turn.add(stage, dict(labels), seconds)
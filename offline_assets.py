@@ -0,0 +1,347 @@
+# offline_assets.py
+#
+# Local replacements for the Tailwind CDN and Google Fonts used by generated slides.
+#
+#   python offline_assets.py build                          # default font families
+#   python offline_assets.py build --fonts "Inter" "Lora"   # extra families
+
+import os
+import re
+import html
+import asyncio
+import argparse
+import mimetypes
+import threading
+import requests
+from contextlib import asynccontextmanager
+from urllib.parse import urlparse, parse_qs, quote
+
+# --- Constants ---
+OFFLINE_BUNDLE_DIR = os.getenv("OFFLINE_BUNDLE_DIR", os.path.join("static", "vendor", "offline"))
+# "off": always use the network; "auto": use the bundle and cache what is missing
+# on first use; "strict": never touch the network (for network-isolated hosts).
+OFFLINE_MODE = os.getenv("OFFLINE_MODE", "auto")
+OFFLINE_ROUTE = "/offline"
+# When set, generated slide HTML itself references OFFLINE_ROUTE, so browser
+# previews are served by the app instead of the CDNs too.
+LOCALIZE_SLIDE_HTML = os.getenv("OFFLINE_PREVIEW", "0") == "1"
+# Origin under which exporter pages load bundled files through request routing.
+EXPORT_OFFLINE_ORIGIN = "http://offline.localhost"
+TAILWIND_CSS_SOURCE = "https://cdn.jsdelivr.net/npm/tailwindcss@2.2.19/dist/tailwind.min.css"
+TAILWIND_SCRIPT_SOURCE = "https://cdn.tailwindcss.com"
+# The prompts target Tailwind v3, whose CDN script compiles classes in the page
+# (arbitrary values such as `top-[10%]` included). The precompiled stylesheet
+# is v2 and lacks those classes; it renders faster but is opt-in for that reason.
+TAILWIND_PRECOMPILED = os.getenv("OFFLINE_TAILWIND_PRECOMPILED", "0") == "1"
+CHART_JS_SOURCE = "https://cdn.jsdelivr.net/npm/chart.js"
+GOOGLE_FONTS_CSS_HOST = "fonts.googleapis.com"
+GOOGLE_FONTS_FILES_URL = "https://fonts.gstatic.com/"
+DEFAULT_FONT_FAMILIES = [
+    "Inter", "Roboto", "Open Sans", "Lato", "Montserrat", "Poppins", "Raleway", "Oswald",
+    "Playfair Display", "Merriweather", "Lora", "Source Sans 3", "Nunito", "Work Sans",
+    "DM Sans", "Space Grotesk", "Bebas Neue", "Orbitron", "Roboto Mono", "Fira Sans",
+]
+DOWNLOAD_TIMEOUT = 30
+# Google Fonts returns woff2 only to modern browsers.
+HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/125.0.0.0 Safari/537.36"
+}
+TAILWIND_SCRIPT_TAG = re.compile(r'<script[^>]+src=["\']https?://cdn\.tailwindcss\.com[^"\']*["\'][^>]*>\s*</script>', re.IGNORECASE)
+CHART_JS_SCRIPT_TAG = re.compile(r'<script[^>]+src=["\']https?://cdn\.jsdelivr\.net/npm/chart\.js[^"\']*["\'][^>]*>\s*</script>', re.IGNORECASE)
+GOOGLE_FONTS_HREF = re.compile(r'https?://fonts\.googleapis\.com/css2?\?[^"\'\s)]+')
+LOCAL_OFFLINE_REFERENCE = re.compile(r'(?<=["\'(\s])' + re.escape(OFFLINE_ROUTE) + r'/')
+
+def _slug(family):
+    return re.sub(r'[^a-z0-9]+', '-', family.lower()).strip('-')
+
+def _font_families(fonts_url):
+    """Returns the family names requested by a Google Fonts css/css2 URL."""
+    families = []
+    for value in parse_qs(urlparse(html.unescape(fonts_url)).query).get('family', []):
+        for family in value.split('|'):  # The legacy css API joins families with '|'
+            name = family.split(':')[0].replace('+', ' ').strip()
+            if name:
+                families.append(name)
+    return families
+
+class OfflineBundle:
+    """
+    A local copy of the third-party assets generated slides depend on: the
+    Tailwind v3 CDN script (or, opt-in, a precompiled v2 stylesheet), Chart.js,
+    and Google Fonts stylesheets and font files, stored per family.
+
+    Exporter pages use it through `serve_to_page`, which answers requests to the
+    Tailwind CDN, Chart.js and Google Fonts from disk via Playwright request routing. The
+    Flask app can serve the same files under OFFLINE_ROUTE and rewrite slide
+    HTML to reference them with `localize_html`.
+    """
+    def __init__(self, directory=OFFLINE_BUNDLE_DIR, mode=OFFLINE_MODE, tailwind_precompiled=TAILWIND_PRECOMPILED):
+        self.directory = directory
+        self.mode = mode
+        self.tailwind_precompiled = tailwind_precompiled
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return self.mode in ('auto', 'strict')
+
+    @property
+    def render_variant(self):
+        """Identifies what slides are rendered with, for render cache keys."""
+        if not self.enabled:
+            return 'off'
+        return f"{self.mode}/tailwind-{'v2-precompiled' if self.tailwind_precompiled else 'v3'}"
+
+    def _path(self, *parts):
+        path = os.path.normpath(os.path.join(self.directory, *parts))
+        if not path.startswith(os.path.normpath(self.directory) + os.sep):
+            raise ValueError(f"path escapes the offline bundle: {parts}")
+        return path
+
+    def _read(self, *parts):
+        try:
+            with open(self._path(*parts), 'rb') as f:
+                return f.read()
+        except (OSError, ValueError):
+            return None
+
+    def _write(self, data, *parts):
+        path = self._path(*parts)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    def _download(self, url):
+        response = requests.get(url, timeout=DOWNLOAD_TIMEOUT, headers=HEADERS)
+        response.raise_for_status()
+        return response.content
+
+    # --- Tailwind ---
+    def tailwind_shim(self, origin):
+        """
+        JavaScript served in place of the Tailwind CDN script. It links the
+        precompiled stylesheet (render-blocking while the document is parsing)
+        and defines `window.tailwind` so inline `tailwind.config = ...` still runs.
+        """
+        href = f"{origin}{OFFLINE_ROUTE}/tailwind.css"
+        return (
+            "(function () {"
+            f"var href = '{href}';"
+            "if (document.readyState === 'loading') { document.write('<link rel=\"stylesheet\" href=\"' + href + '\">'); }"
+            "else { var link = document.createElement('link'); link.rel = 'stylesheet'; link.href = href; document.head.appendChild(link); }"
+            "window.tailwind = window.tailwind || { config: {} };"
+            "})();"
+        ).encode('utf-8')
+
+    def tailwind_css(self):
+        return self._read('tailwind.min.css')
+
+    def _vendor_script(self, name, source):
+        """A bundled script, downloaded and cached on first use in auto mode."""
+        script = self._read(name)
+        if script is None and self.mode == 'auto':
+            with self._lock:
+                script = self._read(name)
+                if script is None:
+                    try:
+                        script = self._download(source)
+                        self._write(script, name)
+                        print(f"OfflineBundle: Cached {source}.")
+                    except requests.RequestException as e:
+                        print(f"OfflineBundle: Could not download {source}: {e}")
+        return script
+
+    def tailwind_script(self):
+        return self._vendor_script('tailwind-cdn.js', TAILWIND_SCRIPT_SOURCE)
+
+    def tailwind(self, origin):
+        """(body, content type) answering a request for the Tailwind CDN script."""
+        if self.tailwind_precompiled and self.tailwind_css() is not None:
+            return self.tailwind_shim(origin), 'application/javascript'
+        return self.tailwind_script(), 'application/javascript'
+
+    def chart_js(self):
+        return self._vendor_script('chart.js', CHART_JS_SOURCE)
+
+    # --- Google Fonts ---
+    def _family_css(self, family):
+        css = self._read('fonts', 'css', f"{_slug(family)}.css")
+        if css is None and self.mode == 'auto':
+            css = self._fetch_family(family)
+        return css
+
+    def _fetch_family(self, family):
+        """Downloads a family's stylesheet and font files into the bundle; returns the CSS or None."""
+        with self._lock:
+            # Another thread may have fetched the family while this one waited.
+            css = self._read('fonts', 'css', f"{_slug(family)}.css")
+            return css if css is not None else self._fetch_family_unlocked(family)
+
+    def _fetch_family_unlocked(self, family):
+        encoded = quote(family).replace('%20', '+')
+        for axes in (':ital,wght@0,300;0,400;0,600;0,700;1,400;1,700', ':wght@300;400;600;700', ':wght@400;700', ''):
+            try:
+                css = self._download(f"https://{GOOGLE_FONTS_CSS_HOST}/css2?family={encoded}{axes}&display=swap")
+                break
+            except requests.RequestException:
+                continue
+        else:
+            print(f"OfflineBundle: Could not download Google Font '{family}'.")
+            return None
+
+        for font_url in set(re.findall(re.escape(GOOGLE_FONTS_FILES_URL) + r'[^)\'"\s]+', css.decode('utf-8'))):
+            relative = font_url[len(GOOGLE_FONTS_FILES_URL):]
+            if self._read('fonts', 'files', relative) is None:
+                try:
+                    self._write(self._download(font_url), 'fonts', 'files', relative)
+                except requests.RequestException as e:
+                    print(f"OfflineBundle: Could not download font file {font_url}: {e}")
+        self._write(css, 'fonts', 'css', f"{_slug(family)}.css")
+        print(f"OfflineBundle: Cached Google Font '{family}'.")
+        return css
+
+    def fonts_css(self, fonts_url, files_prefix):
+        """
+        Returns the combined stylesheet for every family in a Google Fonts URL, with
+        font file URLs pointed at `files_prefix`, or None if any family is missing.
+        """
+        parts = []
+        for family in _font_families(fonts_url):
+            css = self._family_css(family)
+            if css is None:
+                return None
+            parts.append(css.decode('utf-8'))
+        if not parts:
+            return None
+        return '\n'.join(parts).replace(GOOGLE_FONTS_FILES_URL, files_prefix).encode('utf-8')
+
+    def font_file(self, relative_path):
+        return self._read('fonts', 'files', relative_path)
+
+    # --- Exporter integration ---
+    def localize_for_export(self, html_content):
+        """Makes `/offline/...` references absolute under EXPORT_OFFLINE_ORIGIN for pages loaded with set_content."""
+        return LOCAL_OFFLINE_REFERENCE.sub(EXPORT_OFFLINE_ORIGIN + OFFLINE_ROUTE + '/', html_content)
+
+    @asynccontextmanager
+    async def serve_to_page(self, page):
+        """
+        Answers Tailwind CDN, Chart.js, Google Fonts and EXPORT_OFFLINE_ORIGIN requests on a
+        Playwright page from the bundle for the duration of the block. In strict
+        mode every other external request is aborted, so rendering never waits on
+        the network.
+        """
+        if not self.enabled:
+            yield
+            return
+
+        async def fulfill(route, body, content_type):
+            if body is None:
+                if self.mode == 'strict':
+                    await route.abort()
+                else:
+                    await route.continue_()
+                return
+            await route.fulfill(status=200, body=body, content_type=content_type)
+
+        async def handle_tailwind(route):
+            # May download the script in auto mode, so keep it off the event loop.
+            body, content_type = await asyncio.to_thread(self.tailwind, EXPORT_OFFLINE_ORIGIN)
+            await fulfill(route, body, content_type)
+
+        async def handle_chart_js(route):
+            await fulfill(route, await asyncio.to_thread(self.chart_js), 'application/javascript')
+
+        async def handle_fonts_css(route):
+            # May download missing families in auto mode, so keep it off the event loop.
+            css = await asyncio.to_thread(self.fonts_css, route.request.url, GOOGLE_FONTS_FILES_URL)
+            await fulfill(route, css, 'text/css')
+
+        async def handle_font_file(route):
+            relative = route.request.url[len(GOOGLE_FONTS_FILES_URL):].split('?')[0]
+            await fulfill(route, self.font_file(relative), mimetypes.guess_type(relative)[0] or 'font/woff2')
+
+        async def handle_offline_origin(route):
+            path = urlparse(route.request.url).path[len(OFFLINE_ROUTE) + 1:]
+            body, content_type = await asyncio.to_thread(self.serve, path, route.request.url, EXPORT_OFFLINE_ORIGIN)
+            await fulfill(route, body, content_type)
+
+        async def block_external(route):
+            await route.abort()
+
+        # Playwright tries the most recently registered route first, so the
+        # strict-mode catch-all is registered before the specific handlers.
+        routes = []
+        if self.mode == 'strict':
+            routes.append(("http*://**", block_external))
+        routes += [
+            ("**://cdn.tailwindcss.com/**", handle_tailwind),
+            ("**://cdn.jsdelivr.net/npm/chart.js**", handle_chart_js),
+            (f"**://{GOOGLE_FONTS_CSS_HOST}/**", handle_fonts_css),
+            (f"{GOOGLE_FONTS_FILES_URL}**", handle_font_file),
+            (f"{EXPORT_OFFLINE_ORIGIN}/**", handle_offline_origin),
+        ]
+        for pattern, handler in routes:
+            await page.route(pattern, handler)
+        try:
+            yield
+        finally:
+            for pattern, handler in routes:
+                await page.unroute(pattern, handler)
+
+    # --- Flask integration ---
+    def serve(self, path, request_url, origin=''):
+        """Returns (body, content type) for a path under OFFLINE_ROUTE, or (None, None)."""
+        if path == 'tailwind.css':
+            return self.tailwind_css(), 'text/css'
+        if path == 'tailwind.js':
+            return self.tailwind(origin)
+        if path == 'chart.js':
+            return self.chart_js(), 'application/javascript'
+        if path == 'fonts.css':
+            return self.fonts_css(request_url, f"{origin}{OFFLINE_ROUTE}/fonts/files/"), 'text/css'
+        if path.startswith('fonts/files/'):
+            relative = path[len('fonts/files/'):]
+            return self.font_file(relative), mimetypes.guess_type(relative)[0] or 'font/woff2'
+        return None, None
+
+    def localize_html(self, html_content):
+        """Rewrites Tailwind CDN, Chart.js and Google Fonts references to the app's OFFLINE_ROUTE."""
+        if not self.enabled:
+            return html_content
+        html_content = TAILWIND_SCRIPT_TAG.sub(f'<script src="{OFFLINE_ROUTE}/tailwind.js"></script>', html_content)
+        html_content = CHART_JS_SCRIPT_TAG.sub(f'<script src="{OFFLINE_ROUTE}/chart.js"></script>', html_content)
+        return GOOGLE_FONTS_HREF.sub(lambda m: f"{OFFLINE_ROUTE}/fonts.css?{urlparse(m.group(0)).query}", html_content)
+
+    # --- Bundle building ---
+    def build(self, families=DEFAULT_FONT_FAMILIES):
+        """Downloads the Tailwind CDN script, Chart.js, the precompiled Tailwind CSS and the given font families."""
+        sources = ((TAILWIND_SCRIPT_SOURCE, 'tailwind-cdn.js'), (CHART_JS_SOURCE, 'chart.js'), (TAILWIND_CSS_SOURCE, 'tailwind.min.css'))
+        for source, name in sources:
+            print(f"OfflineBundle: Downloading {source}")
+            self._write(self._download(source), name)
+        for family in families:
+            self._fetch_family(family)
+        print(f"OfflineBundle: Bundle written to {self.directory}")
+
+_shared_bundle = None
+_shared_bundle_lock = threading.Lock()
+
+def get_offline_bundle():
+    """Returns the process-wide offline bundle, creating it on first use."""
+    global _shared_bundle
+    with _shared_bundle_lock:
+        if _shared_bundle is None:
+            _shared_bundle = OfflineBundle()
+        return _shared_bundle
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the local Tailwind/Google Fonts bundle used for offline rendering.")
+    parser.add_argument("command", choices=["build"])
+    parser.add_argument("--fonts", nargs="*", default=[], help="Font families to add to the default set.")
+    parser.add_argument("--dir", default=OFFLINE_BUNDLE_DIR, help="Bundle directory.")
+    args = parser.parse_args()
+
+    OfflineBundle(directory=args.dir).build(DEFAULT_FONT_FAMILIES + args.fonts)
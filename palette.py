@@ -0,0 +1,155 @@
+# palette.py
+
+import io
+import hashlib
+import threading
+from collections import OrderedDict
+import numpy as np
+from PIL import Image
+
+# --- Constants ---
+DECODE_MAX_SIZE = 128     # Longest side, in pixels, that images are decoded/downscaled to
+SAMPLE_PIXELS = 4096      # Pixels fed to k-means
+KMEANS_ITERATIONS = 12
+CACHE_ENTRIES = 512
+DHASH_SIZE = 8            # Rows (and gradient columns) of the perceptual hash: 64 bits
+
+def _load_pixels(image_bytes):
+    """Decodes an image at reduced resolution and returns its opaque pixels as an (N, 3) float array."""
+    img = Image.open(io.BytesIO(image_bytes))
+    # For JPEGs this makes the decoder itself scale down (DCT scaling), so a
+    # multi-megapixel photo is never fully decoded.
+    img.draft('RGB', (DECODE_MAX_SIZE, DECODE_MAX_SIZE))
+    img = img.convert('RGBA')
+    img.thumbnail((DECODE_MAX_SIZE, DECODE_MAX_SIZE), Image.Resampling.BOX)
+    pixels = np.asarray(img, dtype=np.uint8).reshape(-1, 4)
+    return pixels[pixels[:, 3] >= 128, :3].astype(np.float32)
+
+def _kmeans(pixels, k, rng):
+    """Vectorized k-means with k-means++ seeding; returns (centers, cluster sizes)."""
+    centers = np.empty((k, 3), dtype=np.float32)
+    centers[0] = pixels[rng.integers(len(pixels))]
+    closest = ((pixels - centers[0]) ** 2).sum(axis=1)
+    for c in range(1, k):
+        total = closest.sum()
+        index = rng.choice(len(pixels), p=closest / total) if total > 0 else rng.integers(len(pixels))
+        centers[c] = pixels[index]
+        closest = np.minimum(closest, ((pixels - centers[c]) ** 2).sum(axis=1))
+
+    for _ in range(KMEANS_ITERATIONS):
+        distances = ((pixels[:, None, :] - centers[None, :, :]) ** 2).sum(axis=2)
+        labels = distances.argmin(axis=1)
+        counts = np.bincount(labels, minlength=k)
+        sums = np.zeros_like(centers)
+        np.add.at(sums, labels, pixels)
+        occupied = counts > 0
+        new_centers = centers.copy()
+        new_centers[occupied] = sums[occupied] / counts[occupied, None]
+        if np.allclose(new_centers, centers, atol=0.5):
+            centers = new_centers
+            break
+        centers = new_centers
+
+    labels = ((pixels[:, None, :] - centers[None, :, :]) ** 2).sum(axis=2).argmin(axis=1)
+    return centers, np.bincount(labels, minlength=k)
+
+def extract_palette(image_bytes, num_colors=6):
+    """
+    Returns up to `num_colors` dominant colors of an image as '#rrggbb' strings,
+    most common first (the same format and order as the colorgram path).
+    """
+    pixels = _load_pixels(image_bytes)
+    if len(pixels) == 0:
+        return []
+    rng = np.random.default_rng(0)  # Deterministic: the same image always yields the same palette
+    if len(pixels) > SAMPLE_PIXELS:
+        pixels = pixels[rng.choice(len(pixels), SAMPLE_PIXELS, replace=False)]
+
+    k = min(num_colors, len(np.unique(pixels, axis=0)))
+    centers, counts = _kmeans(pixels, k, rng)
+    order = np.argsort(-counts, kind='stable')
+    colors = np.clip(np.rint(centers[order][counts[order] > 0]), 0, 255).astype(int)
+    return [f"#{r:02x}{g:02x}{b:02x}" for r, g, b in colors]
+
+def perceptual_hash(image_bytes):
+    """
+    Difference hash (dHash) of an image as a 64-bit int: each bit records whether
+    a pixel of a 9x8 grayscale thumbnail is brighter than its right neighbour.
+    Rescaled or recompressed copies of a picture differ in only a few bits.
+    """
+    img = Image.open(io.BytesIO(image_bytes))
+    img.draft('L', (DECODE_MAX_SIZE, DECODE_MAX_SIZE))
+    img = img.convert('L').resize((DHASH_SIZE + 1, DHASH_SIZE), Image.Resampling.BOX)
+    pixels = np.asarray(img, dtype=np.int16)
+    bits = np.packbits(pixels[:, 1:] > pixels[:, :-1])
+    return int.from_bytes(bits.tobytes(), 'big')
+
+def hash_distance(a, b):
+    """Number of differing bits between two perceptual hashes."""
+    return bin(a ^ b).count('1')
+
+class PaletteEngine:
+    """
+    Memoizes palettes by image URL and by content hash, so a URL that was seen
+    before costs nothing and the same picture served from different URLs is only
+    analysed once. Perceptual hashes of thumbnails are memoized by URL as well.
+    """
+    def __init__(self, cache_entries=CACHE_ENTRIES):
+        self.cache_entries = cache_entries
+        self._by_url = OrderedDict()
+        self._by_content = OrderedDict()
+        self._hashes_by_url = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _remember(self, cache, key, palette):
+        cache[key] = palette
+        cache.move_to_end(key)
+        while len(cache) > self.cache_entries:
+            cache.popitem(last=False)
+
+    def for_url(self, url, num_colors=6):
+        """Returns the memoized palette for a URL, or None if it has not been analysed yet."""
+        with self._lock:
+            palette = self._by_url.get((url, num_colors))
+            if palette is not None:
+                self._by_url.move_to_end((url, num_colors))
+            return palette
+
+    def from_bytes(self, image_bytes, num_colors=6, url=None):
+        """Returns the palette for downloaded image bytes, computing it only if the content is new."""
+        content_key = (hashlib.sha256(image_bytes).hexdigest(), num_colors)
+        with self._lock:
+            palette = self._by_content.get(content_key)
+        if palette is None:
+            palette = extract_palette(image_bytes, num_colors)
+        with self._lock:
+            self._remember(self._by_content, content_key, palette)
+            if url:
+                self._remember(self._by_url, (url, num_colors), palette)
+        return palette
+
+    def hash_for_url(self, url):
+        """Returns the memoized perceptual hash of an image URL, or None if it has not been hashed yet."""
+        with self._lock:
+            image_hash = self._hashes_by_url.get(url)
+            if image_hash is not None:
+                self._hashes_by_url.move_to_end(url)
+            return image_hash
+
+    def hash_from_bytes(self, image_bytes, url):
+        """Returns the perceptual hash of downloaded image bytes and remembers it for the URL."""
+        image_hash = perceptual_hash(image_bytes)
+        with self._lock:
+            self._remember(self._hashes_by_url, url, image_hash)
+        return image_hash
+
+_shared_engine = None
+_shared_engine_lock = threading.Lock()
+
+def get_palette_engine():
+    """Returns the process-wide palette engine, creating it on first use."""
+    global _shared_engine
+    with _shared_engine_lock:
+        if _shared_engine is None:
+            _shared_engine = PaletteEngine()
+        return _shared_engine
@@ -0,0 +1,184 @@
+# plan_patch.py
+#
+# Applies model-produced JSON Patch (RFC 6902) edits to a presentation plan and
+# works out which slides actually need to be redesigned.
+
+import copy
+
+PATCH_OPERATIONS = ('add', 'remove', 'replace', 'move', 'copy', 'test')
+
+class PlanPatchError(ValueError):
+    """Raised when a patch is malformed or cannot be applied to the plan."""
+
+def _parse_pointer(pointer):
+    if not isinstance(pointer, str) or (pointer and not pointer.startswith('/')):
+        raise PlanPatchError(f"invalid JSON pointer: {pointer!r}")
+    return [token.replace('~1', '/').replace('~0', '~') for token in pointer.split('/')[1:]]
+
+def _list_index(container, token, allow_end):
+    if token == '-' and allow_end:
+        return len(container)
+    if not token.isdigit() or (len(token) > 1 and token.startswith('0')):
+        raise PlanPatchError(f"invalid list index: {token!r}")
+    index = int(token)
+    if index > len(container) or (index == len(container) and not allow_end):
+        raise PlanPatchError(f"list index out of range: {index}")
+    return index
+
+def _resolve_parent(document, tokens):
+    """Returns the container holding the location the tokens point at."""
+    if not tokens:
+        raise PlanPatchError("operations on the whole plan are not allowed")
+    node = document
+    for token in tokens[:-1]:
+        if isinstance(node, list):
+            node = node[_list_index(node, token, allow_end=False)]
+        elif isinstance(node, dict) and token in node:
+            node = node[token]
+        else:
+            raise PlanPatchError(f"path does not exist: /{'/'.join(tokens)}")
+    if not isinstance(node, (list, dict)):
+        raise PlanPatchError(f"path does not exist: /{'/'.join(tokens)}")
+    return node
+
+def _get(document, tokens):
+    parent = _resolve_parent(document, tokens)
+    if isinstance(parent, list):
+        return parent[_list_index(parent, tokens[-1], allow_end=False)]
+    if tokens[-1] not in parent:
+        raise PlanPatchError(f"path does not exist: /{'/'.join(tokens)}")
+    return parent[tokens[-1]]
+
+def _add(document, tokens, value):
+    parent = _resolve_parent(document, tokens)
+    if isinstance(parent, list):
+        parent.insert(_list_index(parent, tokens[-1], allow_end=True), value)
+    else:
+        parent[tokens[-1]] = value
+
+def _remove(document, tokens):
+    parent = _resolve_parent(document, tokens)
+    if isinstance(parent, list):
+        return parent.pop(_list_index(parent, tokens[-1], allow_end=False))
+    if tokens[-1] not in parent:
+        raise PlanPatchError(f"path does not exist: /{'/'.join(tokens)}")
+    return parent.pop(tokens[-1])
+
+def _slide_position(tokens, slide_count, allow_end):
+    """For a path directly at /slides/<n>, returns n; for anything else returns None."""
+    if len(tokens) == 2 and tokens[0] == 'slides':
+        return slide_count if tokens[1] == '-' and allow_end else int(tokens[1])
+    return None
+
+def _touches_slide(tokens):
+    """For a path inside a slide (/slides/<n>/...), returns n; otherwise None."""
+    if len(tokens) > 2 and tokens[0] == 'slides' and tokens[1].isdigit():
+        return int(tokens[1])
+    return None
+
+def apply_patch(plan, operations):
+    """
+    Applies a list of JSON Patch operations to a copy of `plan`.
+
+    Returns (new_plan, slide_sources, theme_changed). `slide_sources[i]` is the
+    index slide i had in the old plan when its content is unchanged (it may have
+    moved), or None when it is new or was modified and must be redesigned.
+    Raises PlanPatchError if any operation fails; `plan` itself is never modified.
+    """
+    if not isinstance(operations, list):
+        raise PlanPatchError("the patch must be a JSON array of operations")
+
+    document = copy.deepcopy(plan)
+    # Follows each slide through the patch: (old index or None, modified?)
+    sources = [(i, False) for i in range(len(document.get('slides', [])))]
+    theme_changed = False
+
+    for number, operation in enumerate(operations, start=1):
+        if not isinstance(operation, dict) or operation.get('op') not in PATCH_OPERATIONS or 'path' not in operation:
+            raise PlanPatchError(f"operation {number} is not a valid JSON Patch operation: {operation!r}")
+        op = operation['op']
+        tokens = _parse_pointer(operation['path'])
+        try:
+            if op in ('add', 'replace', 'test') and 'value' not in operation:
+                raise PlanPatchError(f"'{op}' requires a value")
+            if op in ('move', 'copy'):
+                if 'from' not in operation:
+                    raise PlanPatchError(f"'{op}' requires a from path")
+                from_tokens = _parse_pointer(operation['from'])
+
+            if tokens == ['slides'] and op != 'test':
+                # The slide list as a whole is being replaced.
+                if op in ('remove', 'move'):
+                    raise PlanPatchError("the slide list itself cannot be removed or moved")
+                value = operation['value'] if op in ('add', 'replace') else _get(document, from_tokens)
+                document['slides'] = copy.deepcopy(value)
+                sources = [(None, True)] * (len(value) if isinstance(value, list) else 0)
+                continue
+
+            if op == 'test':
+                if _get(document, tokens) != operation['value']:
+                    raise PlanPatchError(f"value differs from {operation['value']!r}")
+            elif op == 'add':
+                _add(document, tokens, copy.deepcopy(operation['value']))
+                position = _slide_position(tokens, len(sources), allow_end=True)
+                if position is not None:
+                    sources.insert(position, (None, True))
+            elif op == 'remove':
+                _remove(document, tokens)
+                position = _slide_position(tokens, len(sources), allow_end=False)
+                if position is not None:
+                    sources.pop(position)
+            elif op == 'replace':
+                _remove(document, tokens)
+                _add(document, tokens, copy.deepcopy(operation['value']))
+                position = _slide_position(tokens, len(sources), allow_end=False)
+                if position is not None:
+                    sources[position] = (sources[position][0], True)
+            elif op == 'move':
+                if tokens[:len(from_tokens)] == from_tokens and tokens != from_tokens:
+                    raise PlanPatchError("a value cannot be moved into one of its own children")
+                from_slide = _touches_slide(from_tokens)
+                if from_slide is not None and from_slide < len(sources):
+                    sources[from_slide] = (sources[from_slide][0], True)
+                if from_tokens and from_tokens[0] == 'theme':
+                    theme_changed = True
+                value = _remove(document, from_tokens)
+                from_position = _slide_position(from_tokens, len(sources), allow_end=False)
+                moved = sources.pop(from_position) if from_position is not None else (None, True)
+                _add(document, tokens, value)
+                position = _slide_position(tokens, len(sources), allow_end=True)
+                if position is not None:
+                    sources.insert(position, moved)
+            elif op == 'copy':
+                _add(document, tokens, copy.deepcopy(_get(document, from_tokens)))
+                position = _slide_position(tokens, len(sources), allow_end=True)
+                if position is not None:
+                    from_position = _slide_position(from_tokens, len(sources), allow_end=False)
+                    # A copied slide reuses its source's design when that is unchanged.
+                    sources.insert(position, sources[from_position] if from_position is not None else (None, True))
+        except (PlanPatchError, IndexError, KeyError, TypeError) as e:
+            raise PlanPatchError(f"operation {number} ({op} {operation['path']}) failed: {e}") from e
+
+        if op != 'test':
+            inner_slide = _touches_slide(tokens)
+            if inner_slide is not None and inner_slide < len(sources):
+                sources[inner_slide] = (sources[inner_slide][0], True)
+            if tokens and tokens[0] == 'theme':
+                theme_changed = True
+
+    validate_plan(document)
+    slide_sources = [None if modified else source for source, modified in sources]
+    return document, slide_sources, theme_changed
+
+def validate_plan(plan):
+    """Raises PlanPatchError unless the plan has a theme object and a list of slide objects."""
+    if not isinstance(plan, dict):
+        raise PlanPatchError("the plan must be a JSON object")
+    if not isinstance(plan.get('theme'), dict):
+        raise PlanPatchError("the plan must have a 'theme' object")
+    slides = plan.get('slides')
+    if not isinstance(slides, list) or not slides:
+        raise PlanPatchError("the plan must have a non-empty 'slides' list")
+    for i, slide in enumerate(slides):
+        if not isinstance(slide, dict):
+            raise PlanPatchError(f"slide {i} must be a JSON object")
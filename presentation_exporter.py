@@ -1,80 +1,744 @@
 # presentation_exporter.py
 
+import os
+import time
 import asyncio
 import io
-from playwright.async_api import async_playwright
+import re
+import json
+import base64
+import hashlib
+import requests
+from contextlib import asynccontextmanager, AsyncExitStack
 from pptx import Presentation
-from pptx.util import Inches
+from pptx.util import Inches, Emu, Pt
 from pptx.dml.color import RGBColor
+from pptx.enum.shapes import MSO_SHAPE
+from pptx.enum.text import PP_ALIGN
+from pptx.chart.data import CategoryChartData
+from pptx.enum.chart import XL_CHART_TYPE
 from bs4 import BeautifulSoup
+from render_cache import RenderCache
+from asset_store import ASSET_ROUTE
+from tailwind_css import tailwind_style
+from metrics import span
+from export_profiles import EXPORT_PROFILES, DEFAULT_EXPORT_PROFILE
+# The browser pool owns the slide viewport; it is re-exported here for callers.
+from browser_pool import VIEWPORT_WIDTH_PX, VIEWPORT_HEIGHT_PX
 
 # --- Constants ---
-VIEWPORT_WIDTH_PX = 1280
-VIEWPORT_HEIGHT_PX = 720
 PPTX_WIDTH_INCHES = 13.333  # 1280px / 96 DPI
 PPTX_HEIGHT_INCHES = 7.5     # 720px / 96 DPI
+CAPTURE_MODE = os.getenv("EXPORT_CAPTURE_MODE", "settled")  # "settled" or "fixed" (legacy fixed wait)
+FIXED_WAIT_MS = 5000
+SETTLE_TIMEOUT_MS = 8000  # Hard per-slide cap when waiting for the render to settle
+CACHEABLE_RENDER_OUTCOMES = ("settled", "fixed")  # Captures that ended any other way are not cached
+EMU_PER_PX = 9525  # 914400 EMU per inch / 96 DPI
+IMAGE_FETCH_TIMEOUT = 15
+HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/125.0.0.0 Safari/537.36"
+}
+
+# Resolves once the slide is visually final: fonts loaded, images decoded, finite
+# Web Animations / CSS animations / transitions fast-forwarded to their end state,
+# Chart.js animations completed, and a frame painted. Infinite animations are left
+# running, since they have no end state. Resolves to "timeout" if the cap is hit.
+SETTLE_SCRIPT = """
+async (timeoutMs) => {
+    const nextFrame = () => new Promise(resolve => requestAnimationFrame(() => resolve()));
+    const settle = async () => {
+        if (document.fonts && document.fonts.ready) {
+            await document.fonts.ready;
+        }
+        await Promise.all(Array.from(document.images).map(img =>
+            img.decode ? img.decode().catch(() => null) : null
+        ));
+        for (let pass = 0; pass < 2; pass++) {
+            for (const animation of document.getAnimations()) {
+                const timing = animation.effect && animation.effect.getComputedTiming();
+                if (timing && Number.isFinite(timing.endTime)) {
+                    try { animation.finish(); } catch (e) { /* not finishable; leave as is */ }
+                }
+            }
+            if (window.Chart && window.Chart.instances) {
+                Object.values(window.Chart.instances).forEach(chart => {
+                    try { chart.stop(); chart.update('none'); } catch (e) { /* older Chart.js API */ }
+                });
+            }
+            // Finishing one animation can start a transition; give it a frame and sweep again.
+            await nextFrame();
+        }
+        await nextFrame();
+        return "settled";
+    };
+    const timeout = new Promise(resolve => setTimeout(() => resolve("timeout"), timeoutMs));
+    return Promise.race([settle(), timeout]);
+}
+"""
+
+def _hex_to_rgb(hex_color):
+    """Converts a hex color string to an (R, G, B) tuple."""
+    hex_color = hex_color.lstrip('#')
+    if len(hex_color) in (3, 4):
+        hex_color = ''.join(c * 2 for c in hex_color)
+    return tuple(int(hex_color[i:i+2], 16) for i in (0, 2, 4))
+
+NAMED_COLORS = {
+    'white': (255, 255, 255), 'black': (0, 0, 0), 'red': (255, 0, 0), 'green': (0, 128, 0),
+    'blue': (0, 0, 255), 'gray': (128, 128, 128), 'grey': (128, 128, 128), 'yellow': (255, 255, 0),
+    'orange': (255, 165, 0), 'purple': (128, 0, 128), 'navy': (0, 0, 128), 'teal': (0, 128, 128),
+}
+
+def _parse_css_color(value):
+    """
+    Returns an (R, G, B) tuple for the first opaque color found in a CSS value
+    (hex, rgb()/rgba() or a basic named color), or None.
+    """
+    if not value:
+        return None
+    value = value.strip().lower()
+    match = re.search(r'#([0-9a-f]{8}|[0-9a-f]{6}|[0-9a-f]{3,4})\b', value)
+    if match:
+        return _hex_to_rgb(match.group(1))
+    match = re.search(r'rgba?\(\s*([\d.]+)[\s,]+([\d.]+)[\s,]+([\d.]+)(?:[\s,/]+([\d.]+%?))?\s*\)', value)
+    if match:
+        alpha = match.group(4)
+        if alpha is not None and float(alpha.rstrip('%')) == 0:
+            return None
+        return tuple(min(255, int(float(match.group(n)))) for n in (1, 2, 3))
+    for word in re.findall(r'[a-z]+', value):
+        if word in NAMED_COLORS:
+            return NAMED_COLORS[word]
+    return None
+
+def _parse_style(element):
+    """Parses an element's inline `style` attribute into a dict of lowercase properties."""
+    style = {}
+    for declaration in (element.get('style') or '').split(';'):
+        if ':' in declaration:
+            name, value = declaration.split(':', 1)
+            style[name.strip().lower()] = value.replace('!important', '').strip()
+    return style
+
+CUSTOM_PROPERTY_DECLARATION = re.compile(r'(--[\w-]+)\s*:\s*([^;{}]+)')
+CSS_VARIABLE_REFERENCE = re.compile(r'var\(\s*(--[\w-]+)\s*(?:,\s*([^()]*))?\)')
+
+def _custom_properties(soup):
+    """Collects the custom properties (e.g. the theme's --theme-* variables) declared in a page's `<style>` blocks."""
+    variables = {}
+    for style_tag in soup.find_all('style'):
+        for name, value in CUSTOM_PROPERTY_DECLARATION.findall(style_tag.get_text()):
+            variables[name] = value.strip()
+    return variables
+
+def _resolve_css_variables(value, variables):
+    """Substitutes `var(--name, fallback)` references in a CSS value."""
+    for _ in range(3):  # Variables may refer to other variables
+        if 'var(' not in value:
+            break
+        value = CSS_VARIABLE_REFERENCE.sub(lambda m: variables.get(m.group(1), m.group(2) or ''), value)
+    return value
+
+def _element_style(element, variables):
+    """
+    An element's style as the native exporter sees it: what its Tailwind classes
+    set, overridden by its inline `style`, with CSS variables substituted.
+    """
+    style = tailwind_style(element.get('class') or [])
+    style.update(_parse_style(element))
+    return {name: _resolve_css_variables(value, variables) for name, value in style.items()}
+
+def _css_length_px(value, reference_px):
+    """Converts a CSS length in px, % or rem/em to pixels; returns None for anything else."""
+    if not value:
+        return None
+    match = re.fullmatch(r'(-?[\d.]+)(px|%|rem|em)?', value.strip())
+    if not match:
+        return None
+    number, unit = float(match.group(1)), match.group(2)
+    if unit == '%':
+        return number * reference_px / 100
+    if unit in ('rem', 'em'):
+        return number * 16
+    return number
+
+@asynccontextmanager
+async def _local_routing(page, asset_store, offline_bundle):
+    """Serves stored slide images and the offline Tailwind/font bundle to a page for the duration of the block."""
+    async with AsyncExitStack() as stack:
+        # Registered first so that the asset routes below take precedence over
+        # the bundle's strict-mode catch-all.
+        if offline_bundle is not None:
+            await stack.enter_async_context(offline_bundle.serve_to_page(page))
+        if asset_store is not None:
+            await stack.enter_async_context(asset_store.serve_to_page(page))
+        yield
+
+def _report(progress, stage, completed, total):
+    """Forwards export progress to an optional callback; a failing callback never fails the export."""
+    if progress is None:
+        return
+    try:
+        progress(stage, completed, total)
+    except Exception as e:
+        print(f"Exporter: Progress callback failed: {e}")
+
+def _localize(html_content, asset_store, offline_bundle):
+    """Rewrites app-relative asset/bundle references so they resolve on a set_content page."""
+    if asset_store is not None:
+        html_content = asset_store.localize_for_export(html_content)
+    if offline_bundle is not None:
+        html_content = offline_bundle.localize_for_export(html_content)
+    return html_content
 
 class StaticImageExporter:
     """
     Exports a presentation by taking high-resolution screenshots of each slide
-    and compiling them into a PPTX file.
+    and compiling them into a PPTX file. The export profile (see
+    export_profiles.py) sets the capture scale and how screenshots are encoded.
     """
-    def __init__(self, slides_html):
+    def __init__(self, slides_html, browser_pool=None, capture_mode=CAPTURE_MODE, render_cache=None, asset_store=None, offline_bundle=None, progress=None,
+                 profile=DEFAULT_EXPORT_PROFILE):
         self.slides_html = slides_html
+        self.profile = profile
+        self.settings = EXPORT_PROFILES[profile]
+        self.browser_pool = browser_pool
+        self.render_cache = render_cache
+        self.asset_store = asset_store
+        self.offline_bundle = offline_bundle
+        self.capture_mode = capture_mode
+        self.progress = progress  # Called as progress(stage, completed, total)
+        self._completed = 0
+        self.render_waits = {}  # slide index -> {"ms": wait time, "outcome": how the wait ended}
+        self.size_report = None  # Filled in by export()
+
+    async def _wait_for_render(self, page, index):
+        """Waits until the slide is ready to capture and records how long that took."""
+        start = time.perf_counter()
+        if self.capture_mode == "fixed":
+            # --- FIX 2: Extend timeout for animations to complete ---
+            await page.wait_for_timeout(FIXED_WAIT_MS)
+            outcome = "fixed"
+        else:
+            try:
+                outcome = await asyncio.wait_for(
+                    page.evaluate(SETTLE_SCRIPT, SETTLE_TIMEOUT_MS),
+                    timeout=SETTLE_TIMEOUT_MS / 1000 + 2
+                )
+            except Exception as e:
+                print(f"   Slide {index + 1}: render-settle detection failed ({e}); capturing as is.")
+                outcome = "error"
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        self.render_waits[index] = {"ms": round(elapsed_ms, 1), "outcome": outcome}
+        print(f"   Slide {index + 1}: waited {elapsed_ms:.0f} ms for render ({outcome}).")
+
+    def _slides_done(self, count):
+        self._completed += count
+        _report(self.progress, 'capturing', self._completed, len(self.slides_html))
+
+    async def _capture_slide(self, page, index, html_content):
+        """Renders one slide's HTML on the given page and returns its screenshot bytes in the profile's format."""
+        print(f" - Capturing screenshot for Slide {index + 1}/{len(self.slides_html)}...")
+        with span('slide_capture'):
+            async with _local_routing(page, self.asset_store, self.offline_bundle):
+                await page.set_content(_localize(html_content, self.asset_store, self.offline_bundle))
+                await self._wait_for_render(page, index)
+                screenshot = await page.screenshot(**self._screenshot_options())
+        self._slides_done(1)
+        return screenshot
+
+    async def _capture_with_pool(self, jobs):
+        """Captures the given (index, html) jobs in parallel on pages borrowed from the shared browser pool."""
+        async def capture(index, html_content):
+            async with self.browser_pool.page(scale=self.settings['scale']) as page:
+                return await self._capture_slide(page, index, html_content)
 
-    def _hex_to_rgb(self, hex_color):
-        """Converts a hex color string to an (R, G, B) tuple."""
-        hex_color = hex_color.lstrip('#')
-        if len(hex_color) == 3:
-            hex_color = hex_color * 2
-        return tuple(int(hex_color[i:i+2], 16) for i in (0, 2, 4))
+        results = await asyncio.gather(*(capture(i, html) for i, html in jobs))
+        return {i: data for (i, _), data in zip(jobs, results)}
+
+    async def _capture_with_new_browser(self, jobs):
+        """Launches a one-off browser and captures the given (index, html) jobs sequentially."""
+        print("Exporter: Initializing headless browser for static export...")
+        captures = {}
+        from playwright.async_api import async_playwright  # Only needed without a browser pool
+
+        async with async_playwright() as p:
+            with span('browser_launch'):
+                browser = await p.chromium.launch()
+            page = await browser.new_page(
+                viewport={"width": VIEWPORT_WIDTH_PX, "height": VIEWPORT_HEIGHT_PX},
+                device_scale_factor=self.settings['scale']
+            )
+
+            for i, html_content in jobs:
+                captures[i] = await self._capture_slide(page, i, html_content)
+
+            await browser.close()
+        return captures
+
+    def _screenshot_options(self):
+        options = {'type': self.settings['image_format'], 'scale': 'device'}
+        if self.settings['quality'] is not None:
+            options['quality'] = self.settings['quality']
+        return options
+
+    def _cache_key(self, html_content):
+        return RenderCache.make_key(
+            html_content,
+            width=VIEWPORT_WIDTH_PX,
+            height=VIEWPORT_HEIGHT_PX,
+            scale=self.settings['scale'],
+            format=self.settings['image_format'],
+            quality=self.settings['quality'],
+            capture_mode=self.capture_mode,
+            # Bundled Tailwind/fonts can render slightly differently from the CDN.
+            offline_mode=self.offline_bundle.render_variant if self.offline_bundle is not None else 'off'
+        )
+
+    async def _render_slides(self):
+        """
+        Returns the screenshot bytes for every slide. Slides found in the render cache
+        (or identical to another slide in this deck) are not sent to the browser.
+        """
+        keys = [self._cache_key(html) for html in self.slides_html]
+        images_by_key = {}
+        jobs = []
+        for i, (key, html_content) in enumerate(zip(keys, self.slides_html)):
+            if key in images_by_key:
+                continue
+            cached = self.render_cache.get(key) if self.render_cache is not None else None
+            if cached is not None:
+                images_by_key[key] = cached
+            else:
+                images_by_key[key] = None
+                jobs.append((i, html_content))
+
+        print(f"Exporter: {len(self.slides_html) - len(jobs)} slide(s) reused from cache, {len(jobs)} to capture.")
+        self._slides_done(len(self.slides_html) - len(jobs))
+        if jobs:
+            if self.browser_pool is not None:
+                captures = await self._capture_with_pool(jobs)
+            else:
+                captures = await self._capture_with_new_browser(jobs)
+            for i, data in captures.items():
+                images_by_key[keys[i]] = data
+                # A capture taken after a timeout or a failed wait may be a partial
+                # frame (an image or font still loading); never replay it.
+                complete = self.render_waits.get(i, {}).get("outcome") in CACHEABLE_RENDER_OUTCOMES
+                if self.render_cache is not None and complete:
+                    self.render_cache.put(keys[i], data)
+
+            total_wait_ms = sum(w["ms"] for w in self.render_waits.values())
+            print(f"Exporter: Slides captured ({total_wait_ms / 1000:.1f} s spent waiting for renders, "
+                  f"vs {FIXED_WAIT_MS * len(jobs) / 1000:.1f} s with fixed waits).")
+
+        return [images_by_key[key] for key in keys]
 
     async def export(self):
         """
         Main public method to run the entire export process.
-        - Launches a headless browser.
-        - Takes a screenshot of each slide's HTML.
+        - Reuses cached screenshots for slides that have not changed.
+        - Borrows pages from the browser pool (or launches a one-off headless browser).
+        - Takes a screenshot of each remaining slide's HTML.
         - Compiles the screenshots into a PPTX file.
         """
-        print("Exporter: Initializing headless browser for static export...")
-        screenshots = []
+        screenshots = await self._render_slides()
 
-        async with async_playwright() as p:
-            browser = await p.chromium.launch()
-            page = await browser.new_page()
-            await page.set_viewport_size({"width": VIEWPORT_WIDTH_PX, "height": VIEWPORT_HEIGHT_PX})
-
-            num_slides = len(self.slides_html)
-            for i, html_content in enumerate(self.slides_html):
-                print(f" - Capturing screenshot for Slide {i + 1}/{num_slides}...")
-                await page.set_content(html_content)
-                # --- FIX 2: Extend timeout for animations to complete ---
-                await page.wait_for_timeout(5000) 
-                
-                screenshot_bytes = await page.screenshot(type='png')
-                screenshots.append(io.BytesIO(screenshot_bytes))
+        print("Exporter: Compiling PPTX file...")
+        _report(self.progress, 'compiling', len(screenshots), len(screenshots))
+        with span('pptx_assembly', format='image'):
+            prs = Presentation()
+            prs.slide_width = Inches(PPTX_WIDTH_INCHES)
+            prs.slide_height = Inches(PPTX_HEIGHT_INCHES)
 
-            await browser.close()
+            for screenshot_bytes in screenshots:
+                slide_layout = prs.slide_layouts[6]  # Blank layout
+                slide = prs.slides.add_slide(slide_layout)
 
-        print("Exporter: All slides captured. Compiling PPTX file...")
-        prs = Presentation()
-        prs.slide_width = Inches(PPTX_WIDTH_INCHES)
-        prs.slide_height = Inches(PPTX_HEIGHT_INCHES)
-
-        for screenshot_buffer in screenshots:
-            slide_layout = prs.slide_layouts[6]  # Blank layout
-            slide = prs.slides.add_slide(slide_layout)
-            
-            slide.shapes.add_picture(
-                screenshot_buffer,
-                left=Inches(0),
-                top=Inches(0),
-                width=prs.slide_width
-            )
+                slide.shapes.add_picture(
+                    io.BytesIO(screenshot_bytes),
+                    left=Inches(0),
+                    top=Inches(0),
+                    width=prs.slide_width
+                )
+
+            output_buffer = io.BytesIO()
+            prs.save(output_buffer)
+            output_buffer.seek(0)
+
+        # python-pptx stores byte-identical images once, and identical slides
+        # share one screenshot (see _render_slides), so repeats cost nothing.
+        unique_images = {hashlib.sha1(data).digest(): len(data) for data in screenshots}
+        pptx_bytes = output_buffer.getvalue()
+        self.size_report = {
+            'profile': self.profile,
+            'pptx_bytes': len(pptx_bytes),
+            'images': len(unique_images),
+            'duplicate_images': len(screenshots) - len(unique_images),
+            'image_bytes': sum(unique_images.values()),
+        }
+        print(f"Exporter: Static PPTX compilation complete ({self.profile} profile, {len(pptx_bytes) / 1024:.0f} KiB, "
+              f"{len(unique_images)} unique image(s)).")
+        return pptx_bytes
+
+# --- Native (browser-free) export ---
+
+# Hides every layer except the target so it can be captured on its own, and
+# returns the target's bounding box in CSS pixels.
+ISOLATE_LAYER_SCRIPT = """
+(index) => {
+    const layers = Array.from(document.querySelectorAll('[data-layer]'));
+    const target = layers[index];
+    if (!target) return null;
+    layers.forEach(el => {
+        if (el !== target && !el.contains(target) && !target.contains(el)) el.style.visibility = 'hidden';
+    });
+    document.documentElement.style.background = 'transparent';
+    document.body.style.background = 'transparent';
+    const rect = target.getBoundingClientRect();
+    return {x: rect.x, y: rect.y, width: rect.width, height: rect.height};
+}
+"""
+
+CHART_TYPES = {
+    'bar': XL_CHART_TYPE.COLUMN_CLUSTERED,
+    'horizontalbar': XL_CHART_TYPE.BAR_CLUSTERED,
+    'line': XL_CHART_TYPE.LINE_MARKERS,
+    'pie': XL_CHART_TYPE.PIE,
+    'doughnut': XL_CHART_TYPE.DOUGHNUT,
+    'radar': XL_CHART_TYPE.RADAR,
+}
+
+TEXT_BLOCK_TAGS = ['h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'p', 'li', 'blockquote']
+
+class _Layer:
+    """One `data-layer` element of a slide and how it will be written to the PPTX."""
+    def __init__(self, slide_index, dom_index, element, element_type, style, variables, box):
+        self.slide_index = slide_index
+        self.dom_index = dom_index  # Position among all [data-layer] elements, for the rasterizer
+        self.element = element
+        self.element_type = element_type
+        self.style = style  # See _element_style
+        self.variables = variables  # The slide's CSS custom properties
+        self.box = box  # (left, top, width, height) in px, or None if unknown
+        self.native = False  # Whether the layer is written as native shapes
+        self.image_bytes = None  # Set for image layers and rasterized fallbacks
+
+class NativePptxExporter:
+    """
+    Exports a presentation by mapping the annotated slide HTML (`data-layer` and
+    `data-element-type` with absolute positioning) onto native, editable python-pptx
+    text boxes, pictures, autoshapes and charts, without launching a browser.
+    Positions, sizes and colors are read from inline styles and Tailwind classes.
+
+    Layers that cannot be mapped are rasterized on their own through the browser
+    pool when one is given. A slide with a layer that is neither mapped nor
+    rasterized is exported as a screenshot instead (see StaticImageExporter), so
+    no layer is ever dropped; that needs a browser even without a pool.
+    """
+    def __init__(self, slides_html, browser_pool=None, asset_store=None, offline_bundle=None, progress=None):
+        self.slides_html = slides_html
+        self.browser_pool = browser_pool
+        self.asset_store = asset_store
+        self.offline_bundle = offline_bundle
+        self.progress = progress  # Called as progress(stage, completed, total)
+        self.unmapped_layers = 0
+        self.screenshot_slides = []  # Indices of slides exported as screenshots
+
+    # --- Parsing ---
+    def _layer_box(self, style):
+        left = _css_length_px(style.get('left'), VIEWPORT_WIDTH_PX)
+        top = _css_length_px(style.get('top'), VIEWPORT_HEIGHT_PX)
+        width = _css_length_px(style.get('width'), VIEWPORT_WIDTH_PX)
+        height = _css_length_px(style.get('height'), VIEWPORT_HEIGHT_PX)
+        right = _css_length_px(style.get('right'), VIEWPORT_WIDTH_PX)
+        bottom = _css_length_px(style.get('bottom'), VIEWPORT_HEIGHT_PX)
+        if left is None and right is not None and width is not None:
+            left = VIEWPORT_WIDTH_PX - right - width
+        if top is None and bottom is not None and height is not None:
+            top = VIEWPORT_HEIGHT_PX - bottom - height
+        if width is None and left is not None and right is not None:
+            width = VIEWPORT_WIDTH_PX - left - right
+        if height is None and top is not None and bottom is not None:
+            height = VIEWPORT_HEIGHT_PX - top - bottom
+        if left is None and top is None:
+            return None
+        left, top = left or 0, top or 0
+        width = width if width is not None else VIEWPORT_WIDTH_PX - left
+        height = height if height is not None else VIEWPORT_HEIGHT_PX - top
+        return (left, top, width, height)
+
+    def _parse_slide(self, slide_index, html_content):
+        """Returns (background color, layers in stacking order) for one slide."""
+        soup = BeautifulSoup(html_content, 'html.parser')
+        variables = _custom_properties(soup)
+        background = None
+        for element in (soup.body, soup.html):
+            if element is not None and background is None:
+                style = _element_style(element, variables)
+                background = _parse_css_color(style.get('background-color') or style.get('background'))
+
+        layers = []
+        for dom_index, element in enumerate(soup.select('[data-layer]')):
+            if element.find_parent(attrs={'data-layer': True}) is not None:
+                continue  # Nested layers are written as part of their top-level layer
+            style = _element_style(element, variables)
+            layer = _Layer(slide_index, dom_index, element, element.get('data-element-type', ''), style, variables, self._layer_box(style))
+            try:
+                order = int(element.get('data-layer'))
+            except ValueError:
+                order = 0
+            layers.append((order, dom_index, layer))
+        layers.sort(key=lambda item: (item[0], item[1]))
+        return background, [layer for _, _, layer in layers]
+
+    def _is_mappable(self, layer):
+        """Decides whether a layer can be written as native shapes; image bytes are fetched later."""
+        if layer.box is None:
+            return False
+        element = layer.element
+        if layer.element_type == 'textbox':
+            return element.find(['img', 'svg', 'canvas', 'table']) is None
+        if layer.element_type == 'image':
+            return element.find('img') is not None or element.name == 'img'
+        if layer.element_type == 'shape':
+            fill = _parse_css_color(layer.style.get('background-color') or layer.style.get('background'))
+            return element.find(['svg', 'img']) is None and fill is not None
+        if layer.element_type == 'chart':
+            return self._parse_chart(element) is not None
+        return False
+
+    def _parse_chart(self, element):
+        """Extracts (chart type, Chart.js data) from an inline `new Chart(...)` script, or None."""
+        script = element.find('script')
+        if script is None or not script.string:
+            return None
+        source = script.string
+        type_match = re.search(r'type\s*:\s*[\'"](\w+)[\'"]', source)
+        data_match = re.search(r'data\s*:\s*\{', source)
+        if not type_match or not data_match:
+            return None
+        start = data_match.end() - 1
+        depth, end = 0, None
+        for pos in range(start, len(source)):
+            if source[pos] == '{':
+                depth += 1
+            elif source[pos] == '}':
+                depth -= 1
+                if depth == 0:
+                    end = pos + 1
+                    break
+        if end is None:
+            return None
+        try:
+            data = json.loads(source[start:end])
+        except json.JSONDecodeError:
+            return None  # A JS object literal rather than JSON; let the rasterizer handle it
+        chart_type = CHART_TYPES.get(type_match.group(1).lower())
+        if chart_type is None or not data.get('labels') or not data.get('datasets'):
+            return None
+        return chart_type, data
+
+    # --- Asset loading ---
+    def _load_image(self, src):
+        """Returns image bytes for a data: URI, a local asset or an http(s) URL, or None."""
+        if not src:
+            return None
+        try:
+            if src.startswith(ASSET_ROUTE + '/') and self.asset_store is not None:
+                return self.asset_store.read(src.rsplit('/', 1)[-1])
+            if src.startswith('data:'):
+                header, payload = src.split(',', 1)
+                return base64.b64decode(payload) if ';base64' in header else payload.encode('utf-8')
+            response = requests.get(src, timeout=IMAGE_FETCH_TIMEOUT, headers=HEADERS)
+            response.raise_for_status()
+            return response.content
+        except Exception as e:
+            print(f"NativeExporter: Could not load image {src[:80]}: {e}")
+            return None
+
+    async def _rasterize_layers(self, slide_index, html_content, layers):
+        """Captures each unmapped layer on its own, with a transparent background."""
+        for layer in layers:
+            async with self.browser_pool.page() as page:
+                async with _local_routing(page, self.asset_store, self.offline_bundle):
+                    html_for_page = _localize(html_content, self.asset_store, self.offline_bundle)
+                    rect = await self._capture_isolated_layer(page, html_for_page, layer)
+            if rect:
+                print(f" - Rasterized unmapped '{layer.element_type or 'unknown'}' layer on slide {slide_index + 1}.")
+
+    async def _capture_isolated_layer(self, page, html_content, layer):
+        await page.set_content(html_content)
+        try:
+            await asyncio.wait_for(page.evaluate(SETTLE_SCRIPT, SETTLE_TIMEOUT_MS), timeout=SETTLE_TIMEOUT_MS / 1000 + 2)
+        except Exception:
+            pass  # Capture whatever has rendered by now
+        rect = await page.evaluate(ISOLATE_LAYER_SCRIPT, layer.dom_index)
+        if not rect or rect['width'] < 1 or rect['height'] < 1:
+            return None
+        layer.box = (rect['x'], rect['y'], rect['width'], rect['height'])
+        layer.image_bytes = await page.screenshot(type='png', omit_background=True, clip=rect)
+        return rect
+
+    # --- Writing shapes ---
+    def _emu_box(self, box):
+        return tuple(Emu(int(v * EMU_PER_PX)) for v in box)
+
+    def _apply_font(self, run, style):
+        font = run.font
+        size = _css_length_px(style.get('font-size'), VIEWPORT_HEIGHT_PX)
+        if size:
+            font.size = Pt(size * 0.75)
+        color = _parse_css_color(style.get('color'))
+        if color:
+            font.color.rgb = RGBColor(*color)
+        weight = style.get('font-weight', '')
+        if weight == 'bold' or (weight.isdigit() and int(weight) >= 600):
+            font.bold = True
+        if style.get('font-style') == 'italic':
+            font.italic = True
+        if style.get('font-family'):
+            font.name = style['font-family'].split(',')[0].strip().strip('\'"')
+
+    def _add_textbox(self, slide, layer):
+        textbox = slide.shapes.add_textbox(*self._emu_box(layer.box))
+        frame = textbox.text_frame
+        frame.word_wrap = True
+        frame.margin_left = frame.margin_right = frame.margin_top = frame.margin_bottom = 0
+        layer_style = layer.style
+
+        blocks = layer.element.find_all(TEXT_BLOCK_TAGS) or [layer.element]
+        first = True
+        for block in blocks:
+            text = block.get_text(' ', strip=True)
+            if not text:
+                continue
+            style = dict(layer_style)
+            styled = block.find_all(lambda tag: tag.has_attr('style') or tag.has_attr('class'))[:1]
+            for node in ([block] if block is not layer.element else []) + styled:
+                style.update(_element_style(node, layer.variables))
+            if block.name and block.name.startswith('h') and 'font-weight' not in style:
+                style['font-weight'] = 'bold'
+
+            paragraph = frame.paragraphs[0] if first else frame.add_paragraph()
+            first = False
+            alignment = {'center': PP_ALIGN.CENTER, 'right': PP_ALIGN.RIGHT, 'justify': PP_ALIGN.JUSTIFY}.get(style.get('text-align'))
+            if alignment is not None:
+                paragraph.alignment = alignment
+            run = paragraph.add_run()
+            run.text = f"• {text}" if block.name == 'li' else text
+            self._apply_font(run, style)
+
+    def _add_shape(self, slide, layer):
+        style = layer.style
+        radius = style.get('border-radius', '')
+        if radius.startswith('50%') or radius.startswith('9999'):
+            kind = MSO_SHAPE.OVAL
+        elif radius and radius not in ('0', '0px'):
+            kind = MSO_SHAPE.ROUNDED_RECTANGLE
+        else:
+            kind = MSO_SHAPE.RECTANGLE
+        shape = slide.shapes.add_shape(kind, *self._emu_box(layer.box))
+        shape.fill.solid()
+        shape.fill.fore_color.rgb = RGBColor(*_parse_css_color(style.get('background-color') or style.get('background')))
+        shape.line.fill.background()
+
+    def _add_chart(self, slide, layer):
+        chart_type, data = self._parse_chart(layer.element)
+        chart_data = CategoryChartData()
+        chart_data.categories = [str(label) for label in data['labels']]
+        for index, dataset in enumerate(data['datasets']):
+            values = [v if isinstance(v, (int, float)) else 0 for v in dataset.get('data', [])]
+            chart_data.add_series(dataset.get('label') or f"Series {index + 1}", values)
+        graphic_frame = slide.shapes.add_chart(chart_type, *self._emu_box(layer.box), chart_data)
+        graphic_frame.chart.has_legend = len(data['datasets']) > 1 or chart_type in (XL_CHART_TYPE.PIE, XL_CHART_TYPE.DOUGHNUT)
+
+    def _add_picture(self, slide, layer):
+        slide.shapes.add_picture(io.BytesIO(layer.image_bytes), *self._emu_box(layer.box))
+
+    async def export(self):
+        """
+        Main public method to run the entire export process.
+        - Parses each slide's layers and decides which map to native shapes.
+        - Fetches images; rasterizes only the layers that cannot be mapped.
+        - Captures a screenshot of any slide with a layer that is still missing.
+        - Writes the shapes in stacking order into a PPTX file.
+        """
+        print("NativeExporter: Mapping slide layers to native shapes...")
+        slides = [self._parse_slide(i, html) for i, html in enumerate(self.slides_html)]
+        _report(self.progress, 'mapping', len(slides), len(slides))
+
+        fallbacks = {}
+        image_layers = []
+        for slide_index, (_, layers) in enumerate(slides):
+            for layer in layers:
+                layer.native = self._is_mappable(layer)
+                if layer.native and layer.element_type == 'image':
+                    image_layers.append(layer)
+                elif not layer.native:
+                    fallbacks.setdefault(slide_index, []).append(layer)
+
+        async def load(layer):
+            img = layer.element if layer.element.name == 'img' else layer.element.find('img')
+            layer.image_bytes = await asyncio.to_thread(self._load_image, img.get('src'))
+            if layer.image_bytes is None:
+                layer.native = False
+                fallbacks.setdefault(layer.slide_index, []).append(layer)
+        await asyncio.gather(*(load(layer) for layer in image_layers))
+
+        self.unmapped_layers = sum(len(layers) for layers in fallbacks.values())
+        if fallbacks and self.browser_pool is not None:
+            print(f"NativeExporter: Rasterizing {self.unmapped_layers} unmapped layer(s)...")
+            rasterized = 0
+
+            async def rasterize(slide_index, layers):
+                nonlocal rasterized
+                await self._rasterize_layers(slide_index, self.slides_html[slide_index], layers)
+                rasterized += 1
+                _report(self.progress, 'rasterizing', rasterized, len(fallbacks))
+            await asyncio.gather(*(rasterize(i, layers) for i, layers in fallbacks.items()))
+
+        # A layer left without native shapes or an image would be missing from the slide.
+        self.screenshot_slides = sorted(
+            i for i, layers in fallbacks.items() if any(layer.image_bytes is None for layer in layers)
+        )
+        screenshots = {}
+        if self.screenshot_slides:
+            print(f"NativeExporter: Exporting slide(s) {', '.join(str(i + 1) for i in self.screenshot_slides)} "
+                  f"as screenshots; some of their layers could not be mapped or rasterized.")
+            screenshot_exporter = StaticImageExporter([self.slides_html[i] for i in self.screenshot_slides],
+                                                      browser_pool=self.browser_pool, asset_store=self.asset_store,
+                                                      offline_bundle=self.offline_bundle)
+            screenshots = dict(zip(self.screenshot_slides, await screenshot_exporter._render_slides()))
+
+        with span('pptx_assembly', format='native'):
+            prs = Presentation()
+            prs.slide_width = Inches(PPTX_WIDTH_INCHES)
+            prs.slide_height = Inches(PPTX_HEIGHT_INCHES)
+            writers = {'textbox': self._add_textbox, 'shape': self._add_shape, 'chart': self._add_chart, 'image': self._add_picture}
+
+            for slide_index, (background, layers) in enumerate(slides):
+                slide = prs.slides.add_slide(prs.slide_layouts[6])  # Blank layout
+                if slide_index in screenshots:
+                    slide.shapes.add_picture(io.BytesIO(screenshots[slide_index]), 0, 0, width=prs.slide_width)
+                    _report(self.progress, 'writing', slide_index + 1, len(slides))
+                    continue
+                if background:
+                    slide.background.fill.solid()
+                    slide.background.fill.fore_color.rgb = RGBColor(*background)
+                for layer in layers:
+                    try:
+                        if layer.native:
+                            writers[layer.element_type](slide, layer)
+                        elif layer.image_bytes is not None:
+                            self._add_picture(slide, layer)
+                    except Exception as e:
+                        print(f"NativeExporter: Could not write '{layer.element_type}' layer on slide {slide_index + 1}: {e}")
+                _report(self.progress, 'writing', slide_index + 1, len(slides))
+
+            output_buffer = io.BytesIO()
+            prs.save(output_buffer)
+            output_buffer.seek(0)
 
-        output_buffer = io.BytesIO()
-        prs.save(output_buffer)
-        output_buffer.seek(0)
-        
-        print("Exporter: Static PPTX compilation complete!")
-        return output_buffer.getvalue()
\ No newline at end of file
+        print("NativeExporter: Native PPTX compilation complete!")
+        return output_buffer.getvalue()
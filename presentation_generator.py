@@ -3,19 +3,27 @@
 import os
 import json
 import time
+import queue
 import requests
-import colorgram
-from io import BytesIO
-from bs4 import BeautifulSoup
-from urllib.parse import urljoin
-import google.generativeai as genai
+import threading
+import contextvars
+from urllib.parse import urlparse, parse_qsl
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
+from search_client import get_search_client, SearchUnavailableError
+from search_cache import get_search_cache
+from palette import get_palette_engine, hash_distance
+from asset_store import get_asset_store
+from offline_assets import get_offline_bundle, LOCALIZE_SLIDE_HTML
+from llm_cache import get_llm_cache, CachedResponse
+from plan_patch import apply_patch, PlanPatchError
+from slide_theme import theme_variables, apply_theme, theme_variable_changes, can_reskin
+from metrics import span, collect_turn, TIMING_EVENTS
 
 load_dotenv()
-genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
 
 MODEL_ID = "gemini-2.5-flash-lite-preview-06-17"
-GENERATION_CONFIG = genai.types.GenerationConfig(temperature=0.8)
+GENERATION_CONFIG = {"temperature": 0.8}  # Accepted by generate_content as is; no SDK import needed
 
 # --- CRITICAL FIX: Remove failing public instances, use local only ---
 SEARXNG_INSTANCE_URLS = [
@@ -26,21 +34,308 @@ HEADERS = {
 }
 REQUEST_TIMEOUT = 25
 IMAGE_SEARCH_RETRIES = 2 # How many times to try different queries
+IMAGE_QUERY_VARIANT_SUFFIXES = ["photo", "illustration", "background"] # Used to widen a thin image search
+THUMBNAIL_SIZE_PARAMS = {'w', 'h', 'width', 'height', 'size', 'sz', 'q', 'quality', 'dpr', 'fit', 'crop'}
+# Image picker results whose thumbnails' perceptual hashes differ in at most
+# this many of 64 bits are treated as the same picture on different sites.
+IMAGE_PERCEPTUAL_DEDUPE = os.getenv("IMAGE_PERCEPTUAL_DEDUPE", "1") == "1"
+PERCEPTUAL_DUPLICATE_BITS = 6
+THUMBNAIL_TIMEOUT = 5
+THUMBNAIL_FETCH_WORKERS = 8
+SLIDE_CONCURRENCY = int(os.getenv("SLIDE_CONCURRENCY", 4)) # Slides sourced/designed at once; 1 = sequential
+STREAM_SLIDE_HTML = os.getenv("STREAM_SLIDE_HTML", "1") == "1" # Forward partial slide HTML as `slide_chunk` events
+MARKDOWN_FENCES = ("```html", "```")
+EDIT_HISTORY_TURNS = 6 # Conversation messages sent along with an edit request
+PIPELINE_PLAN = os.getenv("PIPELINE_PLAN", "1") == "1" # Start slides while the plan is still streaming (needs SLIDE_CONCURRENCY > 1)
+
+_WORKER_DONE = object()
+
+_shared_model = None
+_shared_model_lock = threading.Lock()
+
+def get_model():
+    """
+    Returns the process-wide Gemini model client. The SDK is imported and
+    configured on first use rather than at import time, so starting the app
+    (or a worker) does not pay for it, and sessions share one client.
+    """
+    global _shared_model
+    with _shared_model_lock:
+        if _shared_model is None:
+            import google.generativeai as genai
+            genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
+            _shared_model = genai.GenerativeModel(MODEL_ID)
+        return _shared_model
+
+class ConcurrentEventStream:
+    """
+    Runs event generators on a bounded thread pool and hands their events back to
+    the calling thread as they are produced. Events from a single generator keep
+    their relative order; events from different generators are interleaved.
+    """
+    def __init__(self, max_workers):
+        self._events = queue.Queue()
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="slide-worker")
+        self._futures = []
+        self._pending = 0
+
+    def _drain_generator(self, generator_factory):
+        try:
+            for event in generator_factory():
+                self._events.put(event)
+        finally:
+            self._events.put(_WORKER_DONE)
+
+    def submit(self, generator_factory):
+        """Schedules a zero-argument callable that returns an event generator."""
+        # Workers run in a copy of the caller's context, so their timing spans count towards its turn.
+        context = contextvars.copy_context()
+        self._futures.append(self._pool.submit(context.run, self._drain_generator, generator_factory))
+        self._pending += 1
+
+    def _next_event(self, block):
+        while self._pending:
+            try:
+                event = self._events.get(block=block)
+            except queue.Empty:
+                return None
+            if event is _WORKER_DONE:
+                self._pending -= 1
+                continue
+            return event
+        return None
+
+    def ready_events(self):
+        """Yields the events that are already available without blocking."""
+        while (event := self._next_event(block=False)) is not None:
+            yield event
+
+    def drain(self):
+        """Yields events until every submitted generator has finished, then re-raises the first worker error."""
+        while (event := self._next_event(block=True)) is not None:
+            yield event
+        for future in self._futures:
+            future.result()
+
+    def close(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+class MarkdownFenceStripper:
+    """
+    Removes markdown code fences from text that arrives in chunks, producing the
+    same result as `text.strip().replace("```html", "").replace("```", "")` on
+    the whole text apart from trailing whitespace. A chunk ending in what may be
+    the start of a fence is held back until the next chunk shows what it is.
+    """
+    def __init__(self):
+        self._pending = ''
+        self._started = False
+
+    def _held_back_length(self, text):
+        fence = MARKDOWN_FENCES[0]
+        for length in range(min(len(fence), len(text)), 0, -1):
+            if fence.startswith(text[-length:]):
+                return length
+        return 0
+
+    def _clean(self, text):
+        for fence in MARKDOWN_FENCES:
+            text = text.replace(fence, '')
+        return text
+
+    def feed(self, chunk):
+        """Returns the part of the text seen so far that can safely be emitted."""
+        text = self._pending + chunk
+        if not self._started:
+            text = text.lstrip()
+            self._started = bool(text)
+        held_back = self._held_back_length(text)
+        self._pending = text[len(text) - held_back:]
+        return self._clean(text[:len(text) - held_back])
+
+    def finish(self):
+        """Returns whatever is still held back once the stream has ended."""
+        text, self._pending = self._pending, ''
+        return self._clean(text)
+
+class IncrementalPlanParser:
+    """
+    Scans a presentation plan JSON object as it streams in and reports the
+    top-level `theme` and each element of the top-level `slides` array as soon
+    as its closing brace arrives. Text outside the root object (such as
+    markdown fences) is ignored; the plan as a whole is still validated once
+    the stream has ended.
+    """
+    def __init__(self):
+        self._buffer = ''
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+        self._string_start = None
+        self._last_string = None
+        self._key = None
+        self._awaiting_value = False
+        self._value_start = None
+        self._element_start = None
+
+    def feed(self, text):
+        """Consumes a chunk and returns the completed items as ('theme' | 'slide', value) pairs."""
+        completed = []
+        start = len(self._buffer)
+        self._buffer += text
+        for j in range(start, len(self._buffer)):
+            c = self._buffer[j]
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif c == '\\':
+                    self._escaped = True
+                elif c == '"':
+                    self._in_string = False
+                    self._last_string = self._buffer[self._string_start:j + 1]
+                continue
+            if self._depth == 0 and c != '{':
+                continue
+            if self._awaiting_value and not c.isspace():
+                self._awaiting_value = False
+                self._value_start = j
+
+            if c == '"':
+                self._in_string = True
+                self._string_start = j
+            elif c == ':' and self._depth == 1:
+                self._key = json.loads(self._last_string) if self._last_string else None
+                self._awaiting_value = True
+            elif c == ',' and self._depth == 1:
+                self._key, self._value_start = None, None
+            elif c in '{[':
+                if c == '{' and self._depth == 2 and self._key == 'slides':
+                    self._element_start = j
+                self._depth += 1
+            elif c in '}]':
+                self._depth -= 1
+                if self._depth == 2 and self._key == 'slides' and self._element_start is not None:
+                    completed.append(('slide', self._load(self._element_start, j)))
+                    self._element_start = None
+                elif self._depth == 1 and self._key == 'theme' and self._value_start is not None:
+                    completed.append(('theme', self._load(self._value_start, j)))
+                    self._key, self._value_start = None, None
+        return [(kind, value) for kind, value in completed if value is not None]
+
+    def _load(self, start, end):
+        try:
+            return json.loads(self._buffer[start:end + 1])
+        except json.JSONDecodeError:
+            return None
+
+def _is_json_response(text):
+    """Whether a model response parses as JSON once markdown fences are removed."""
+    try:
+        json.loads(text.strip().replace("```json", "").replace("```", ""))
+        return True
+    except ValueError:
+        return False
+
+def _is_html_response(text):
+    return '<' in text and '>' in text
 
 class PresentationAgent:
     """
     An agent that orchestrates the creation and editing of a professional presentation
     through a conversational interface.
     """
-    def __init__(self):
-        self.model = genai.GenerativeModel(MODEL_ID)
+    def __init__(self, max_concurrency=SLIDE_CONCURRENCY, model=None, search_client=None):
+        # Any object with Gemini's generate_content(prompt, generation_config=..., stream=...)
+        # can stand in for the model, e.g. the fake backend in benchmarks/fakes.py.
+        self.model = model or get_model()
         self.presentation_plan = None # This will store the state of our presentation
+        self.slide_html = {} # Slide index -> last generated HTML, reused for slides an edit leaves unchanged
+        self.max_concurrency = max(1, max_concurrency)
+        self.palette_engine = get_palette_engine()
+        self.asset_store = get_asset_store()
+        self.offline_bundle = get_offline_bundle()
+        self.search_client = search_client or get_search_client(SEARXNG_INSTANCE_URLS, headers=HEADERS, timeout=REQUEST_TIMEOUT, cache=get_search_cache())
+        self.llm_cache = get_llm_cache()  # None unless LLM_CACHE=1
+
+    def export_state(self):
+        """Returns the agent's conversation state as JSON-serializable data."""
+        return {'presentation_plan': self.presentation_plan, 'slide_html': self.slide_html}
 
-    def _call_llm(self, prompt):
-        return self.model.generate_content(prompt, generation_config=GENERATION_CONFIG)
+    def restore_state(self, state):
+        """Restores state produced by export_state (JSON object keys arrive as strings)."""
+        self.presentation_plan = state.get('presentation_plan')
+        self.slide_html = {int(i): html for i, html in (state.get('slide_html') or {}).items()}
+
+    def _call_llm(self, prompt, cache=True, purpose='other', validate=None):
+        """
+        Sends a prompt to the model. With the response cache enabled, a prompt seen
+        before is answered from the cache; pass cache=False for calls that must
+        produce a fresh answer (e.g. asking again after an unusable result).
+        A response is only cached if `validate(text)` accepts it, so a reply the
+        caller cannot parse is asked for again next time rather than replayed.
+        `purpose` labels the call's timing span.
+
+        Replay is exact: with the cache on, an identical prompt gets the same
+        design, plan or query back despite the sampling temperature, until the
+        entry expires. That is the point for retries and demo decks, and why
+        the cache is opt-in (LLM_CACHE=1).
+        """
+        with span('llm', purpose=purpose) as labels:
+            if self.llm_cache is None or not cache:
+                return self.model.generate_content(prompt, generation_config=GENERATION_CONFIG)
+
+            key = self.llm_cache.make_key(MODEL_ID, GENERATION_CONFIG, prompt)
+            text = self.llm_cache.get(key)
+            if text is not None:
+                labels['cached'] = 'true'
+                return CachedResponse(text)
+            response = self.model.generate_content(prompt, generation_config=GENERATION_CONFIG)
+            try:
+                text = response.text
+            except ValueError:
+                return response  # Blocked or empty responses are never cached
+            self._store_response(key, text, validate)
+            return response
+
+    def _store_response(self, key, text, validate):
+        """Caches a model response unless it is empty or `validate` rejects it (returns falsy or raises)."""
+        if not text:
+            return
+        if validate is not None:
+            try:
+                if not validate(text):
+                    return
+            except Exception:
+                return
+        self.llm_cache.put(key, MODEL_ID, text)
+
+    def _stream_llm(self, prompt, cache=True, purpose='other', validate=None):
+        """Like _call_llm, but yields the response text in chunks as the model produces it."""
+        with span('llm', purpose=purpose) as labels:
+            key = None
+            if self.llm_cache is not None and cache:
+                key = self.llm_cache.make_key(MODEL_ID, GENERATION_CONFIG, prompt)
+                text = self.llm_cache.get(key)
+                if text is not None:
+                    labels['cached'] = 'true'
+                    yield text
+                    return
+
+            parts = []
+            for chunk in self.model.generate_content(prompt, generation_config=GENERATION_CONFIG, stream=True):
+                try:
+                    text = chunk.text
+                except ValueError:
+                    continue  # Chunks without text parts (e.g. the final finish-reason chunk)
+                if text:
+                    parts.append(text)
+                    yield text
+            if key is not None:
+                self._store_response(key, ''.join(parts), validate)
 
     def _yield_event(self, event_type, data):
-        return f"data: {json.dumps({'type': event_type, 'data': data})}\n\n"
+        # Events stay structured until the transport edge (sse.format_sse) encodes them.
+        return {'type': event_type, 'data': data}
 
     def _generate_image_search_query(self, topic, slide_title, slide_body):
         prompt = f"""
@@ -53,21 +348,23 @@ class PresentationAgent:
         Optimal Image Search Query:
         """
         try:
-            response = self._call_llm(prompt)
+            response = self._call_llm(prompt, purpose='image_query')
             return response.text.strip().replace('"', '')
         except Exception:
             return f"{topic} {slide_title}"
 
-    def _regenerate_image_search_query(self, topic, slide_title, original_query):
-        """Asks the LLM to come up with a different search query if the first one failed."""
-        prompt = f"""
+    def _regenerate_query_prompt(self, topic, slide_title, original_query):
+        return f"""
         You are a creative assistant. The image search query '{original_query}' failed to find good results for a slide titled '{slide_title}' in a presentation about '{topic}'.
         Generate a different, creative 2-4 word alternative search query. Try a more abstract or conceptual approach.
 
         New Optimal Image Search Query:
         """
+
+    def _regenerate_image_search_query(self, topic, slide_title, original_query):
+        """Asks the LLM to come up with a different search query if the first one failed."""
         try:
-            response = self._call_llm(prompt)
+            response = self._call_llm(self._regenerate_query_prompt(topic, slide_title, original_query), cache=False, purpose='image_query_retry')
             return response.text.strip().replace('"', '')
         except Exception:
             return f"{topic} abstract" # A simple fallback
@@ -97,108 +394,205 @@ class PresentationAgent:
 
         return True
 
-    def _search_for_image(self, query):
-        """Searches for an image using a list of SearXNG instances via their JSON API."""
-        for base_url in SEARXNG_INSTANCE_URLS:
-            print(f"Searching for image via SearXNG instance '{base_url}': {query}")
-            search_url = f"{base_url}/search"
-            params = {'q': query, 'categories': 'images', 'language': 'en', 'format': 'json'}
-            
-            try:
-                response = requests.get(search_url, params=params, timeout=REQUEST_TIMEOUT, headers=HEADERS)
-                response.raise_for_status()
-                results = response.json()
-                
-                image_results = results.get('results', [])
-                if not image_results:
-                    print(f"Instance '{base_url}' returned no images for query '{query}'.")
-                    return None
-
-                for img in image_results:
-                    image_url = img.get('img_src')
-                    if self._is_high_quality_image(image_url):
-                        print(f"Success! Found high-quality image URL: {image_url}")
-                        return image_url
-                
-                print("No high-quality images found, returning the first result as a fallback.")
-                if image_results:
-                    return image_results[0].get('img_src')
-
-            except requests.RequestException as e:
-                print(f"Could not connect to SearXNG instance at {base_url}. Is it running? Error: {e}. Trying next instance...")
+    def _image_dedupe_keys(self, result):
+        """
+        Keys under which two image results count as the same picture: the image URL,
+        the thumbnail URL without size parameters, and the file name plus resolution.
+        Copies that share none of these are caught by _drop_similar_images.
+        """
+        keys = set()
+        image_url = result.get('img_src') or ''
+        parsed = urlparse(image_url)
+        keys.add(('url', parsed.netloc.lower().removeprefix('www.') + parsed.path))
+
+        thumbnail = result.get('thumbnail_src')
+        if thumbnail:
+            parsed_thumb = urlparse(thumbnail)
+            params = sorted((k, v) for k, v in parse_qsl(parsed_thumb.query) if k.lower() not in THUMBNAIL_SIZE_PARAMS)
+            keys.add(('thumb', parsed_thumb.netloc.lower() + parsed_thumb.path, tuple(params)))
+
+        file_name = parsed.path.rsplit('/', 1)[-1].lower()
+        if file_name and result.get('resolution'):
+            keys.add(('file', file_name, result['resolution']))
+        return keys
+
+    def _collect_image_candidates(self, image_results, candidates, seen_keys):
+        """Appends de-duplicated candidates from one SearXNG response, high-quality images first."""
+        high_quality, fallback = [], []
+        for result in image_results:
+            image_url = result.get('img_src')
+            if not image_url:
                 continue
-            except Exception as e:
-                print(f"SearXNG image search failed for '{query}' at '{base_url}': {e}")
-                return None
-        
-        print("All SearXNG instances failed.")
-        return None
+            keys = self._image_dedupe_keys(result)
+            if keys & seen_keys:
+                continue
+            seen_keys.update(keys)
+            candidate = {
+                'url': image_url,
+                'thumbnail_url': result.get('thumbnail_src') or image_url,
+                'title': result.get('title', ''),
+                'source_url': result.get('url'),
+                'resolution': result.get('resolution'),
+            }
+            (high_quality if self._is_high_quality_image(image_url) else fallback).append(candidate)
+        candidates.extend(high_quality + fallback)
+
+    def _thumbnail_hash(self, candidate):
+        """Perceptual hash of a candidate's thumbnail, or None if it cannot be downloaded or decoded."""
+        url = candidate['thumbnail_url']
+        image_hash = self.palette_engine.hash_for_url(url)
+        if image_hash is not None:
+            return image_hash
+        try:
+            response = requests.get(url, timeout=THUMBNAIL_TIMEOUT, headers=HEADERS)
+            response.raise_for_status()
+            return self.palette_engine.hash_from_bytes(response.content, url)
+        except Exception as e:
+            print(f"Could not hash thumbnail {url}: {e}")
+            return None
+
+    def _drop_similar_images(self, candidates, hashes):
+        """Removes candidates that look like an earlier one; candidates without a hash are kept."""
+        kept, seen = [], []
+        for candidate, image_hash in zip(candidates, hashes):
+            if image_hash is not None:
+                if any(hash_distance(image_hash, other) <= PERCEPTUAL_DUPLICATE_BITS for other in seen):
+                    continue
+                seen.append(image_hash)
+            kept.append(candidate)
+        return kept
+
+    def _search_image_results(self, query, use_cache):
+        try:
+            return self.search_client.search(query, category='images', use_cache=use_cache).get('results', [])
+        except SearchUnavailableError as e:
+            print(f"Image search unavailable for '{query}': {e}")
+        except Exception as e:
+            print(f"SearXNG image search failed for '{query}': {e}")
+        return []
+
+    def _search_for_images(self, query, limit=10, offset=0, use_cache=True, expand=True):
+        """
+        Returns (candidates, has_more): a ranked, de-duplicated page of image candidates
+        built from a single SearXNG response. When that response cannot fill the page
+        and `expand` is set, query variants are searched concurrently to top it up.
+        """
+        print(f"Searching for images via SearXNG: {query}")
+        candidates, seen_keys = [], set()
+        self._collect_image_candidates(self._search_image_results(query, use_cache), candidates, seen_keys)
+
+        needed = offset + limit + 1  # One extra tells us whether another page exists
+        if expand and len(candidates) < needed:
+            variants = [f"{query} {suffix}" for suffix in IMAGE_QUERY_VARIANT_SUFFIXES]
+            with ThreadPoolExecutor(max_workers=len(variants)) as pool:
+                variant_results = list(pool.map(lambda q: self._search_image_results(q, use_cache), variants))
+            for results in variant_results:
+                self._collect_image_candidates(results, candidates, seen_keys)
+
+        if expand and IMAGE_PERCEPTUAL_DEDUPE:
+            # Only the pages up to this one are compared; thumbnail hashes are memoized across pages.
+            with span('image_dedupe'), ThreadPoolExecutor(max_workers=THUMBNAIL_FETCH_WORKERS) as pool:
+                hashes = list(pool.map(self._thumbnail_hash, candidates[:needed]))
+            candidates = self._drop_similar_images(candidates[:needed], hashes) + candidates[needed:]
+
+        return candidates[offset:offset + limit], len(candidates) > offset + limit
 
-    def _search_for_data(self, query):
-        """Searches for textual data/facts using SearXNG's JSON API."""
+    def _search_for_image(self, query, use_cache=True):
+        """Searches for the single best image for a query, preferring high-quality results."""
+        candidates, _ = self._search_for_images(query, limit=1, use_cache=use_cache, expand=False)
+        if not candidates:
+            print(f"SearXNG returned no images for query '{query}'.")
+            return None
+        print(f"Found image URL: {candidates[0]['url']}")
+        return candidates[0]['url']
+
+    def _search_for_data(self, query, use_cache=True):
+        """Searches for textual data/facts through the shared SearXNG client's JSON API."""
         print(f"Searching for data with query: '{query}'")
-        for base_url in SEARXNG_INSTANCE_URLS:
-            search_url = f"{base_url}/search"
-            params = {'q': query, 'categories': 'general', 'language': 'en', 'format': 'json'}
-            try:
-                response = requests.get(search_url, params=params, timeout=REQUEST_TIMEOUT, headers=HEADERS)
-                response.raise_for_status()
-                results = response.json()
-                
-                snippets = []
-                for item in results.get('results', [])[:5]: # Get top 5 results
-                    title = item.get('title', '')
-                    content = item.get('content', '')
-                    if title and content:
-                        snippets.append(f"Title: {title}\nSnippet: {content}")
-                
-                if snippets:
-                    print(f"Successfully found data snippets for '{query}'")
-                    return "\n\n".join(snippets)
-                
-            except requests.RequestException as e:
-                print(f"Could not connect to SearXNG instance at {base_url} for data search. Error: {e}. Trying next instance...")
-                continue
-            except Exception as e:
-                print(f"Data search failed for '{query}' at '{base_url}': {e}")
-                return None
+        try:
+            results = self.search_client.search(query, category='general', use_cache=use_cache)
+        except SearchUnavailableError as e:
+            print(f"Data search unavailable for '{query}': {e}")
+            return None
+        except Exception as e:
+            print(f"Data search failed for '{query}': {e}")
+            return None
+        return self._format_data_snippets(query, results)
+
+    def _format_data_snippets(self, query, results):
+        """Turns the top SearXNG results into the text the chart prompt is built from."""
+        snippets = []
+        for item in results.get('results', [])[:5]: # Get top 5 results
+            title = item.get('title', '')
+            content = item.get('content', '')
+            if title and content:
+                snippets.append(f"Title: {title}\nSnippet: {content}")
         
-        print("All SearXNG instances failed for data search.")
+        if snippets:
+            print(f"Successfully found data snippets for '{query}'")
+            return "\n\n".join(snippets)
+
+        print(f"No data snippets found for '{query}'.")
         return None
 
     def _get_palette_from_image_url(self, image_url: str, num_colors: int = 6) -> list[str]:
         """
-        Downloads an image from a URL and extracts a color palette.
-        Returns a list of hex color strings.
+        Downloads an image from a URL (into the asset store) and extracts a color palette.
+        Returns a list of hex color strings. Palettes are memoized by URL and content.
         """
         if not image_url:
             return []
+        palette = self.palette_engine.for_url(image_url, num_colors)
+        if palette is not None:
+            return palette
+        with span('palette'):
+            return self._extract_palette(image_url, num_colors)
+
+    def _extract_palette(self, image_url, num_colors):
         try:
             print(f"Extracting color palette from: {image_url}")
-            response = requests.get(image_url, timeout=15, headers=HEADERS)
-            response.raise_for_status()
-            
-            img = BytesIO(response.content)
-            colors = colorgram.extract(img, num_colors)
+            # The asset store keeps the one downloaded copy that previews and exports also use.
+            asset_name = self.asset_store.fetch(image_url)
+            image_bytes = self.asset_store.read(asset_name) if asset_name else None
+            if image_bytes is None:
+                response = requests.get(image_url, timeout=15, headers=HEADERS)
+                response.raise_for_status()
+                image_bytes = response.content
             
-            palette = [f"#{c.rgb.r:02x}{c.rgb.g:02x}{c.rgb.b:02x}" for c in colors]
+            palette = self.palette_engine.from_bytes(image_bytes, num_colors, url=image_url)
             print(f"Extracted palette: {palette}")
             return palette
         except Exception as e:
             print(f"Could not extract color palette from {image_url}: {e}")
             return []
 
-    def _get_chart_data_from_search(self, data_query, chart_type):
+    def _chart_search_event(self, data_query):
+        return self._yield_event('status_update', {'message': f"Searching for data to build chart: '{data_query}'..."})
+
+    def _chart_missing_event(self, data_query):
+        return self._yield_event('status_update', {'message': f"Could not find any data for '{data_query}'."})
+
+    def _chart_found_event(self):
+        return self._yield_event('status_update', {'message': "Found data. Asking AI to structure it for the chart..."})
+
+    def _get_chart_data_from_search(self, data_query, chart_type, use_cache=True):
         """Generator that searches for data, processes it with an LLM, and yields updates."""
-        yield self._yield_event('status_update', {'message': f"Searching for data to build chart: '{data_query}'..."})
-        search_results = self._search_for_data(data_query)
+        yield self._chart_search_event(data_query)
+        search_results = self._search_for_data(data_query, use_cache=use_cache)
         if not search_results:
-            yield self._yield_event('status_update', {'message': f"Could not find any data for '{data_query}'."})
+            yield self._chart_missing_event(data_query)
             return None
 
-        yield self._yield_event('status_update', {'message': "Found data. Asking AI to structure it for the chart..."})
-        
-        prompt = f"""
+        yield self._chart_found_event()
+        try:
+            response = self._call_llm(self._chart_data_prompt(search_results, chart_type), purpose='chart_data', validate=self._parse_chart_data)
+            return self._parse_chart_data(response.text)
+        except Exception as e:
+            print(f"Failed to structure chart data with LLM: {e}")
+            return None
+
+    def _chart_data_prompt(self, search_results, chart_type):
+        return f"""
         You are a data analysis expert. Based on the provided search results, extract and structure data to create a '{chart_type}' chart.
         The data should be factual and directly supported by the search results.
 
@@ -223,25 +617,22 @@ class PresentationAgent:
 
         **CRITICAL: Output ONLY the raw JSON object.**
         """
-        try:
-            response = self._call_llm(prompt)
-            # Clean potential markdown formatting from the response
-            cleaned_response = response.text.strip().replace("```json", "").replace("```", "")
-            chart_data = json.loads(cleaned_response)
-            if 'labels' in chart_data and 'datasets' in chart_data:
-                return chart_data
-            else:
-                print("LLM response for chart data was missing 'labels' or 'datasets'.")
-                return None
-        except Exception as e:
-            print(f"Failed to structure chart data with LLM: {e}")
-            return None
 
-    def _generate_slide_html(self, slide_data, theme_data, style, palette):
-        prompt = f"""
+    def _parse_chart_data(self, text):
+        # Clean potential markdown formatting from the response
+        cleaned_response = text.strip().replace("```json", "").replace("```", "")
+        chart_data = json.loads(cleaned_response)
+        if 'labels' in chart_data and 'datasets' in chart_data:
+            return chart_data
+        print("LLM response for chart data was missing 'labels' or 'datasets'.")
+        return None
+
+    def _slide_html_prompt(self, slide_data, theme_data, style, palette):
+        return f"""
         You are an expert HTML/CSS designer. Your mission is to create a single, self-contained, **structurally annotated** HTML file for a presentation slide.
 
         **Theme Data:** {json.dumps(theme_data)}
+        **Theme Variables (CSS custom properties, already defined on `:root`):** {json.dumps(theme_variables(theme_data))}
         **Slide Data:** {json.dumps(slide_data)}
         **Color Palette (derived from slide image):** {json.dumps(palette)}
 
@@ -267,46 +658,53 @@ class PresentationAgent:
         **--- DESIGN & CODE INSTRUCTIONS ---**
         - **HTML Structure:** Start with `<!DOCTYPE html>`.
         - **Styling:** Use the Tailwind CSS CDN. Use `position: absolute;` for all layered elements to allow user manipulation.
+        - **Layer Geometry:** Give every `data-layer` element inline `left`, `top`, `width` and `height` in px (e.g. `style="left: 64px; top: 40px; width: 800px; height: 120px;"`), and give the `<body>` an inline background color. The PowerPoint export reads these without a browser.
         - **Editor Hints:** Include this CSS in a `<style>` tag to provide visual cues for the user:
           ```css
           [contentEditable="true"]:hover {{ outline: 2px dashed rgba(106, 90, 205, 0.7); }}
           img:hover {{ outline: 2px dashed rgba(106, 90, 205, 0.7); }}
           ```
-        - **Fonts:** Import and use the Google Fonts from the theme's `fontPairing`.
+        - **Theme Binding:** Apply every theme color, font and background through its variable, e.g. `color: var(--theme-colors-primary);` or `font-family: var(--theme-font-pairing-heading);`, never as a literal value. The theme can then be changed without redesigning the slide. Colors from the image palette may be used literally.
+        - **Fonts:** The theme's Google Fonts are loaded for you; import any other fonts you use.
         - **Final Output:** Respond with ONLY the raw HTML code. Do not include explanations or markdown.
         """
-        response = self._call_llm(prompt)
-        return response.text.strip().replace("```html", "").replace("```", "")
 
-    def run_conversation_turn(self, conversation_history):
-        """Main entry point for the agent for each user message."""
-        if self.presentation_plan is None:
-            yield from self._create_new_presentation(conversation_history[-1]['content'])
-        else:
-            yield from self._edit_presentation(conversation_history)
+    def _generate_slide_html(self, slide_data, theme_data, style, palette):
+        response = self._call_llm(self._slide_html_prompt(slide_data, theme_data, style, palette), purpose='slide_html', validate=_is_html_response)
+        return self._clean_slide_html(response.text)
 
-    def _create_new_presentation(self, user_prompt):
-        """Workflow for generating a presentation from scratch."""
-        yield self._yield_event('status_update', {'message': "Understood. I will begin by creating a concept for your presentation."})
-        
-        topic_style_prompt = f"""
+    def _stream_slide_html(self, slide_data, theme_data, style, palette, slide_number):
+        """
+        Generates a slide's HTML with the model's streaming API, yielding each piece
+        as a `slide_chunk` event. Returns the complete HTML (via StopIteration), the
+        same as _generate_slide_html would.
+        """
+        prompt = self._slide_html_prompt(slide_data, theme_data, style, palette)
+        stripper = MarkdownFenceStripper()
+        parts = []
+        for text in self._stream_llm(prompt, purpose='slide_html', validate=_is_html_response):
+            parts.append(text)
+            yield from self._slide_chunk_events(stripper.feed(text), slide_number)
+        yield from self._slide_chunk_events(stripper.finish(), slide_number)
+        return self._clean_slide_html(''.join(parts))
+
+    def _topic_style_prompt(self, user_prompt):
+        return f"""
         Analyze the user's request to differentiate between the core subject matter (the topic) and a specific design instruction (the theme_hint).
         User's Request: '{user_prompt}'
         Output a single, raw JSON object with "topic" and "theme_hint" keys.
         """
-        topic_style_response = self._call_llm(topic_style_prompt)
+
+    def _parse_topic_style(self, text, user_prompt):
+        """Returns (topic, theme_hint) from the topic analysis, falling back to the raw request."""
         try:
-            parsed_response = json.loads(topic_style_response.text.strip().replace("```json", "").replace("```", ""))
-            topic = parsed_response.get('topic', user_prompt)
-            theme_hint = parsed_response.get('theme_hint')
+            parsed_response = json.loads(text.strip().replace("```json", "").replace("```", ""))
+            return parsed_response.get('topic', user_prompt), parsed_response.get('theme_hint')
         except json.JSONDecodeError:
-            topic, theme_hint = user_prompt, None
-
-        style = theme_hint or topic
-
-        yield self._yield_event('status_update', {'message': f"Acting as a creative director for a presentation on '{topic}' with a '{style}' theme. I will now devise a unique visual identity and a comprehensive slide outline."})
+            return user_prompt, None
 
-        plan_prompt = f"""
+    def _plan_prompt(self, topic, theme_hint):
+        return f"""
         You are a world-class presentation designer and visual artist. Your design philosophy is rooted in dynamic composition and clarity. Create a complete visual and content plan.
         **Topic:** '{topic}'
         **Theme Hint:** '{theme_hint if theme_hint else "None provided; derive theme from the topic."}'
@@ -327,15 +725,50 @@ class PresentationAgent:
                 *   **Use this to create focus points and visually engaging, asymmetrical compositions that guide the viewer's eye.**
         4.  **Title Slide Rule:** The first slide MUST use a `background_image_content_overlay` layout and have one image query.
         
-        **CRITICAL: Output a single, raw, valid JSON object with "theme" and "slides" as top-level keys.**
+        **CRITICAL: Output a single, raw, valid JSON object with "theme" and "slides" as top-level keys, with "theme" first.**
+        """
+
+    def _parse_plan(self, text):
+        """Parses and validates a complete plan; raises JSONDecodeError or KeyError."""
+        plan = json.loads(text.strip().replace("```json", "").replace("```", ""))
+        if 'slides' not in plan or 'theme' not in plan:
+            raise KeyError("The generated plan is missing 'slides' or 'theme' key.")
+        return plan
+
+    def run_conversation_turn(self, conversation_history, emit_timing=TIMING_EVENTS):
+        """
+        Main entry point for the agent for each user message. Yields
+        {'type': ..., 'data': ...} event dicts; sse.format_sse encodes them.
         """
-        plan_response = self._call_llm(plan_prompt)
+        with collect_turn() as timings:
+            if self.presentation_plan is None:
+                with span('turn', kind='create'):
+                    yield from self._create_new_presentation(conversation_history[-1]['content'])
+            else:
+                with span('turn', kind='edit'):
+                    yield from self._edit_presentation(conversation_history)
+            if emit_timing:
+                yield self._yield_event('timing', timings.summary())
+
+    def _create_new_presentation(self, user_prompt):
+        """Workflow for generating a presentation from scratch."""
+        yield self._yield_event('status_update', {'message': "Understood. I will begin by creating a concept for your presentation."})
+        
+        topic_style_response = self._call_llm(self._topic_style_prompt(user_prompt), purpose='topic_style', validate=_is_json_response)
+        topic, theme_hint = self._parse_topic_style(topic_style_response.text, user_prompt)
+        style = theme_hint or topic
+
+        yield self._yield_event('status_update', {'message': f"Acting as a creative director for a presentation on '{topic}' with a '{style}' theme. I will now devise a unique visual identity and a comprehensive slide outline."})
+
+        plan_prompt = self._plan_prompt(topic, theme_hint)
+        if PIPELINE_PLAN and self.max_concurrency > 1:
+            yield from self._stream_plan_and_slides(plan_prompt)
+            return
+
+        plan_response = self._call_llm(plan_prompt, purpose='plan', validate=self._parse_plan)
         
         try:
-            plan = json.loads(plan_response.text.strip().replace("```json", "").replace("```", ""))
-            if 'slides' not in plan or 'theme' not in plan:
-                raise KeyError("The generated plan is missing 'slides' or 'theme' key.")
-            self.presentation_plan = plan
+            self.presentation_plan = self._parse_plan(plan_response.text)
         except (json.JSONDecodeError, KeyError) as e:
             print(f"Error parsing or validating presentation plan: {e}")
             yield self._yield_event('status_update', {'message': "I'm sorry, I had trouble creating a valid presentation plan. Could you please try rephrasing your request?"})
@@ -345,142 +778,332 @@ class PresentationAgent:
         yield from self._process_and_generate_slides(range(len(self.presentation_plan['slides'])))
         yield self._yield_event('status_update', {'message': "I've completed the presentation! How does it look?"})
 
-    def _edit_presentation(self, conversation_history):
-        """Workflow for editing an existing presentation."""
-        yield self._yield_event('status_update', {'message': "Got it. I will revise the presentation based on your feedback."})
-        
-        edit_prompt = f"""
-        You are a presentation editor. Update the provided JSON plan based on the user's latest request.
-        You can modify text, layouts, and decorative `shapes`.
+    def _stream_plan_and_slides(self, plan_prompt):
+        """
+        Pipelined variant of plan generation: the plan is streamed from the model and
+        every slide is handed to the worker pool as soon as its JSON object is complete,
+        so image searches and slide design overlap with the rest of the plan.
+        """
+        plan = {'slides': []}
+        self.presentation_plan = plan
+        parser = IncrementalPlanParser()
+        waiting_for_theme = []
+        response_parts = []
+        stream = ConcurrentEventStream(self.max_concurrency)
+
+        def dispatch(slide_data):
+            plan['slides'].append(slide_data)
+            i = len(plan['slides']) - 1
+            stream.submit(lambda: self._generate_single_slide(i, False, 0))
+
+        try:
+            for text in self._stream_llm(plan_prompt, purpose='plan', validate=self._parse_plan):
+                response_parts.append(text)
+                for kind, value in parser.feed(text):
+                    if kind == 'theme' and 'theme' not in plan:
+                        plan['theme'] = value
+                        yield self._yield_event('status_update', {'message': "Visual identity ready. I'm designing the slides as the outline comes together."})
+                        for slide_data in waiting_for_theme:
+                            dispatch(slide_data)
+                        waiting_for_theme = []
+                    elif kind == 'slide':
+                        if 'theme' in plan:
+                            dispatch(value)
+                        else:
+                            waiting_for_theme.append(value)
+                yield from stream.ready_events()
+
+            remaining_slides = self._complete_streamed_plan(plan, ''.join(response_parts), waiting_for_theme)
+            if remaining_slides is None:
+                self.presentation_plan = None
+                yield self._yield_event('status_update', {'message': "I'm sorry, I had trouble creating a valid presentation plan. Could you please try rephrasing your request?"})
+                return
+            for slide_data in remaining_slides:
+                dispatch(slide_data)
+
+            yield self._yield_event('status_update', {'message': f"Creative plan complete with {len(plan['slides'])} slides. Finishing the remaining designs."})
+            yield from stream.drain()
+        finally:
+            stream.close()
+        yield self._yield_event('status_update', {'message': "I've completed the presentation! How does it look?"})
+
+    def _complete_streamed_plan(self, plan, response_text, waiting_for_theme):
+        """
+        Validates the complete streamed plan and folds its remaining top-level keys into
+        `plan`. Returns the slides that still have to be dispatched, or None if the plan
+        is unusable and no slide was dispatched yet.
+        """
+        try:
+            full_plan = self._parse_plan(response_text)
+        except (json.JSONDecodeError, KeyError) as e:
+            print(f"Error parsing or validating presentation plan: {e}")
+            if not plan['slides']:
+                return None
+            full_plan = {}  # Keep the slides that did arrive intact
+
+        # Already dispatched slides are being filled in by the workers, so the
+        # incrementally parsed objects stay authoritative; only the rest is copied.
+        for key, value in full_plan.items():
+            if key != 'slides':
+                plan.setdefault(key, value)
+        plan.setdefault('theme', {})
+        return waiting_for_theme + full_plan.get('slides', [])[len(plan['slides']) + len(waiting_for_theme):]
+
+    def _edit_patch_prompt(self, conversation_history, feedback=None):
+        """The edit prompt: the compact plan and only the last few turns of the conversation."""
+        recent_history = conversation_history[-EDIT_HISTORY_TURNS:]
+        return f"""
+        You are a presentation editor. Express the user's latest request as a JSON Patch (RFC 6902) against the presentation plan below.
+        You can modify text, layouts, and decorative `shapes`, and add, remove or reorder slides.
 
         **CRITICAL INSTRUCTIONS FOR CHANGING VISUALS:**
-        - **To change an image:** Delete `image_urls` and add `image_search_queries` with new terms.
-        - **To change a chart:** Delete `chart.data` and add a `chart.data_query`.
+        - **To change an image:** Remove `image_urls` and add `image_search_queries` with new terms.
+        - **To change a chart:** Remove `chart/data` and add a `chart/data_query`.
         - **To change image shape/position:** Modify the `image_styles` list for the slide. You can add this list if it doesn't exist to create a dynamic layout.
 
-        **Current Presentation Plan (JSON):** {json.dumps(self.presentation_plan, indent=2)}
-        **Conversation History:** {json.dumps(conversation_history, indent=2)}
-        
+        **Patch rules:** Paths are JSON Pointers into the plan, e.g. `/slides/2/title` or `/theme/colors/primary`; `/slides/-` appends a slide.
+        Use `move` (not remove + add) to reorder slides. Only touch what the request requires.
+
+        **Current Presentation Plan (JSON):** {json.dumps(self.presentation_plan, separators=(',', ':'))}
+        **Recent Conversation:** {json.dumps(recent_history, separators=(',', ':'))}
+
         **User's Last Request:** "{conversation_history[-1]['content']}"
+        {f"**Your previous patch could not be used:** {feedback}. Produce a corrected patch that applies the request." if feedback else ""}
 
-        **CRITICAL: Respond with the *complete, updated* presentation plan as a single, raw JSON object.**
+        **CRITICAL: Respond with ONLY a raw JSON array of patch operations, e.g. [{{"op": "replace", "path": "/slides/0/title", "value": "New title"}}].**
         """
-        edit_response = self._call_llm(edit_prompt)
+
+    def _parse_patch(self, text):
+        """Returns the patch operations in a model response, or None if it is not JSON."""
         try:
-            new_plan = json.loads(edit_response.text.strip().replace("```json", "").replace("```", ""))
+            return json.loads(text.strip().replace("```json", "").replace("```", ""))
         except json.JSONDecodeError:
+            return None
+
+    def _is_patch_response(self, text):
+        return isinstance(self._parse_patch(text), list)
+
+    def _request_plan_patch(self, conversation_history, feedback=None):
+        """Asks the model for a JSON Patch against the current plan and returns the parsed operations (or None)."""
+        # A retry must not be answered with the same cached patch.
+        response = self._call_llm(self._edit_patch_prompt(conversation_history, feedback), cache=feedback is None, purpose='edit_patch',
+                                  validate=self._is_patch_response)
+        try:
+            return self._parse_patch(response.text)
+        except ValueError:
+            return None
+
+    def _try_patch(self, operations):
+        """Returns (apply_patch result, None) for a usable patch, or (None, the reason it is not)."""
+        if operations is None:
+            return None, "the response was not a JSON array"
+        try:
+            result = apply_patch(self.presentation_plan, operations)
+        except PlanPatchError as e:
+            print(f"Could not apply edit patch: {e}")
+            return None, str(e)
+        if result[0] == self.presentation_plan:
+            return None, "it did not change the plan"
+        return result, None
+
+    def _reskin_slide(self, html_content, theme):
+        """Swaps a slide's theme variables (and theme font stylesheet) for those of a new theme."""
+        html_content = apply_theme(html_content, theme)
+        if LOCALIZE_SLIDE_HTML:
+            html_content = self.offline_bundle.localize_html(html_content)
+        return html_content
+
+    def _adopt_plan_edit(self, new_plan, slide_sources, theme_changed):
+        """
+        Makes an applied patch the current plan. Unchanged slides keep their HTML
+        wherever they moved to, and slides bound to every theme variable the edit
+        changed are re-skinned locally. Returns the events to send and the indices
+        that must be redesigned.
+        """
+        old_slide_count = len(self.presentation_plan['slides'])
+        if theme_changed:
+            changed_variables, removed_variables = theme_variable_changes(self.presentation_plan.get('theme'), new_plan['theme'])
+        self.presentation_plan = new_plan
+        previous_html = self.slide_html
+        self.slide_html = {}
+        reskinned_indices = []
+        for i, source in enumerate(slide_sources):
+            if source is None or source not in previous_html:
+                continue
+            if not theme_changed:
+                self.slide_html[i] = previous_html[source]
+            elif can_reskin(previous_html[source], changed_variables, removed_variables):
+                self.slide_html[i] = self._reskin_slide(previous_html[source], new_plan['theme'])
+                reskinned_indices.append(i)
+        changed_indices = [i for i in range(len(new_plan['slides'])) if i not in self.slide_html]
+
+        events = []
+        # Slides were added, removed or reordered: clients rearrange the slides they
+        # already have (keeping any manual edits) before the changed ones arrive.
+        if len(slide_sources) != old_slide_count or any(source != i for i, source in enumerate(slide_sources) if source is not None):
+            events.append(self._yield_event('slide_order', {'sources': slide_sources, 'total_slides': len(slide_sources)}))
+        if reskinned_indices:
+            events.append(self._yield_event('status_update', {'message': f"Applying the new theme to {len(reskinned_indices)} slide(s)..."}))
+            for i in reskinned_indices:
+                events.append(self._yield_event('slide_update', {
+                    'html': self.slide_html[i],
+                    'slide_number': i + 1,
+                    'total_slides': len(new_plan['slides']),
+                    'animations': new_plan['slides'][i].get('animations', {}),
+                    'theme': new_plan['theme']
+                }))
+        return events, changed_indices
+
+    def _edit_presentation(self, conversation_history):
+        """Workflow for editing an existing presentation."""
+        yield self._yield_event('status_update', {'message': "Got it. I will revise the presentation based on your feedback."})
+
+        operations = self._request_plan_patch(conversation_history)
+        if operations is None:
             yield self._yield_event('status_update', {'message': "I'm sorry, I had trouble applying those changes. Could you try rephrasing?"})
             return
 
-        if new_plan == self.presentation_plan:
+        patch_result, feedback = self._try_patch(operations)
+        if feedback:
             yield self._yield_event('status_update', {'message': "It seems my first attempt didn't work. Let me try that again more directly..."})
-            retry_prompt = f"""
-            Your previous attempt to edit the presentation plan failed. You MUST apply the user's last request to the presentation plan.
-
-            **CRITICAL INSTRUCTIONS FOR CHANGING VISUALS:**
-            - **To change an image:** Delete `image_urls` and add `image_search_queries` with new terms.
-            - **To change a chart:** Delete `chart.data` and add a `chart.data_query`.
-            - **To change image shape/position:** Modify the `image_styles` list for the slide.
-
-            **Current Presentation Plan (JSON):** {json.dumps(self.presentation_plan, indent=2)}
-            **User's Last Request:** "{conversation_history[-1]['content']}"
-            **Updated Presentation Plan (JSON):**
-            """
-            retry_response = self._call_llm(retry_prompt)
-            try:
-                new_plan = json.loads(retry_response.text.strip().replace("```json", "").replace("```", ""))
-            except json.JSONDecodeError:
+            patch_result, feedback = self._try_patch(self._request_plan_patch(conversation_history, feedback=feedback))
+            if feedback:
                 yield self._yield_event('status_update', {'message': "I'm still having trouble with that request. Could you try a different wording?"})
                 return
 
-        changed_indices = [i for i, (new_s, old_s) in enumerate(zip(new_plan.get('slides', []), self.presentation_plan.get('slides', []))) if new_s != old_s]
-        
-        # Detect newly added slides
-        if len(new_plan.get('slides', [])) > len(self.presentation_plan.get('slides', [])):
-            new_indices = range(len(self.presentation_plan.get('slides', [])), len(new_plan.get('slides', [])))
-            changed_indices.extend(new_indices)
-
-        if new_plan.get('theme') != self.presentation_plan.get('theme'):
-            changed_indices = list(range(len(new_plan.get('slides', []))))
-
-        self.presentation_plan = new_plan
+        events, changed_indices = self._adopt_plan_edit(*patch_result)
+        yield from events
         if changed_indices:
-            unique_indices = sorted(list(set(changed_indices)))
-            yield self._yield_event('status_update', {'message': f"Revising slide(s): {', '.join(str(i+1) for i in unique_indices)}..."})
-            yield from self._process_and_generate_slides(unique_indices, is_update=True)
+            yield self._yield_event('status_update', {'message': f"Revising slide(s): {', '.join(str(i+1) for i in changed_indices)}..."})
+            yield from self._process_and_generate_slides(changed_indices, is_update=True)
         
         yield self._yield_event('status_update', {'message': "Revisions complete. What's next?"})
 
     def _process_and_generate_slides(self, indices_to_process, is_update=False):
-        """Shared logic for data/image sourcing and HTML generation for a list of slides."""
-        topic = self.presentation_plan.get('title', '')
-        style = "Professional" 
-        theme = self.presentation_plan.get('theme', {})
+        """
+        Shared logic for data/image sourcing and HTML generation for a list of slides.
+        With `max_concurrency` > 1 the slides are produced by a bounded worker pool and
+        their events are delivered as they complete; every slide-scoped event carries
+        its `slide_number` so clients can place out-of-order slides.
+        """
         total_slides_before_update = len(self.presentation_plan['slides'])
+        indices = [i for i in indices_to_process if i < total_slides_before_update] # Skip out of bounds indices
 
-        for i in indices_to_process:
-            if i >= len(self.presentation_plan['slides']): continue # Skip if index is out of bounds
-            slide_data = self.presentation_plan['slides'][i]
+        if self.max_concurrency <= 1 or len(indices) <= 1:
+            for i in indices:
+                yield from self._generate_single_slide(i, is_update, total_slides_before_update)
+                time.sleep(0.5)
+            return
 
-            # --- Handle Charts (Data Sourcing) ---
-            if "chart" in slide_data and "data_query" in slide_data["chart"] and "data" not in slide_data["chart"]:
-                chart_info = slide_data["chart"]
-                # Use a generator to get data and yield status updates
-                chart_data_generator = self._get_chart_data_from_search(chart_info["data_query"], chart_info["type"])
-                structured_data = None
-                try:
-                    while True:
-                        # Yield status updates from the chart data generator
-                        yield next(chart_data_generator)
-                except StopIteration as e:
-                    # The generator returns the final data via StopIteration's value
-                    structured_data = e.value
-                
-                if structured_data:
-                    slide_data["chart"]["data"] = structured_data
-                # Always remove the data_query to prevent re-fetching
-                if "data_query" in slide_data["chart"]:
-                    del slide_data["chart"]["data_query"]
-
-            # --- Handle Images (Sourcing) ---
-            if "image_search_queries" in slide_data:
-                slide_data["image_urls"] = []
-                for query in slide_data["image_search_queries"]:
-                    yield self._yield_event('status_update', {'message': f"Sourcing visual for slide {i+1}: '{query}'..."})
-                    
-                    image_url = None
-                    current_query = query
-                    for attempt in range(IMAGE_SEARCH_RETRIES):
-                        image_url = self._search_for_image(current_query)
-                        if image_url:
-                            break
-                        else:
-                            yield self._yield_event('status_update', {'message': f"Search for '{current_query}' failed. Trying a different query..."})
-                            current_query = self._regenerate_image_search_query(topic, slide_data.get('title', ''), current_query)
-                    
+        stream = ConcurrentEventStream(min(self.max_concurrency, len(indices)))
+        try:
+            for i in indices:
+                stream.submit(lambda i=i: self._generate_single_slide(i, is_update, total_slides_before_update))
+            yield from stream.drain()
+        finally:
+            stream.close()
+
+    # --- Slide generation steps (shared with AsyncPresentationAgent) ---
+    def _slide_context(self, i):
+        """Returns (topic, style, theme, slide data) for generating slide i."""
+        return self.presentation_plan.get('title', ''), "Professional", self.presentation_plan.get('theme', {}), self.presentation_plan['slides'][i]
+
+    @staticmethod
+    def _pending_chart(slide_data):
+        """Returns the slide's chart if its data still has to be sourced, else None."""
+        chart_info = slide_data.get("chart")
+        if chart_info and "data_query" in chart_info and "data" not in chart_info:
+            return chart_info
+        return None
+
+    @staticmethod
+    def _resolve_chart(chart_info, structured_data):
+        if structured_data:
+            chart_info["data"] = structured_data
+        # Always remove the data_query to prevent re-fetching
+        chart_info.pop("data_query", None)
+
+    def _sourcing_image_event(self, i, query):
+        return self._yield_event('status_update', {'message': f"Sourcing visual for slide {i+1}: '{query}'...", 'slide_number': i + 1})
+
+    def _image_retry_event(self, i, query):
+        return self._yield_event('status_update', {'message': f"Search for '{query}' failed. Trying a different query...", 'slide_number': i + 1})
+
+    def _designing_event(self, i, slide_data):
+        return self._yield_event('status_update', {'message': f"Designing slide {i+1}: '{slide_data.get('title')}'...", 'slide_number': i + 1})
+
+    def _slide_chunk_events(self, html_chunk, slide_number):
+        """The `slide_chunk` event for a piece of streamed HTML, if the fence stripper released any."""
+        if html_chunk:
+            yield self._yield_event('slide_chunk', {'html': html_chunk, 'slide_number': slide_number})
+
+    @staticmethod
+    def _clean_slide_html(text):
+        return text.strip().replace("```html", "").replace("```", "")
+
+    def _generate_single_slide(self, i, is_update, total_slides_before_update):
+        """Sources data and visuals for one slide, designs it, and yields its events."""
+        topic, style, theme, slide_data = self._slide_context(i)
+
+        # --- Handle Charts (Data Sourcing) ---
+        chart_info = self._pending_chart(slide_data)
+        if chart_info:
+            # The generator yields status updates and returns the data via StopIteration
+            structured_data = yield from self._get_chart_data_from_search(chart_info["data_query"], chart_info["type"])
+            self._resolve_chart(chart_info, structured_data)
+
+        # --- Handle Images (Sourcing) ---
+        if "image_search_queries" in slide_data:
+            slide_data["image_urls"] = []
+            for query in slide_data["image_search_queries"]:
+                yield self._sourcing_image_event(i, query)
+                image_url = None
+                current_query = query
+                for attempt in range(IMAGE_SEARCH_RETRIES):
+                    image_url = self._search_for_image(current_query)
                     if image_url:
-                        slide_data["image_urls"].append(image_url)
-                del slide_data["image_search_queries"]
-
-            # --- Get Color Palette from the first available image ---
-            palette = []
-            if slide_data.get("image_urls"):
-                # Use the first image to define the slide's palette
-                palette = self._get_palette_from_image_url(slide_data["image_urls"][0])
-
-            # --- Generate HTML ---
-            yield self._yield_event('status_update', {'message': f"Designing slide {i+1}: '{slide_data.get('title')}'..."})
-            html_content = self._generate_slide_html(slide_data, theme, style, palette)
-            event_type = 'slide_update' if is_update and i < total_slides_before_update else 'new_slide'
-            event_data = {
-                'html': html_content, 
-                'slide_number': i + 1, 
-                'total_slides': len(self.presentation_plan['slides']),
-                'animations': slide_data.get('animations', {})
-            }
-            if not is_update and i == 0:
-                event_data['theme'] = theme
-            elif is_update and theme != self.presentation_plan.get('theme'):
-                 event_data['theme'] = theme
-            yield self._yield_event(event_type, event_data)
-            time.sleep(0.5)
\ No newline at end of file
+                        break
+                    yield self._image_retry_event(i, current_query)
+                    current_query = self._regenerate_image_search_query(topic, slide_data.get('title', ''), current_query)
+                if image_url:
+                    slide_data["image_urls"].append(image_url)
+            del slide_data["image_search_queries"]
+
+        # --- Get Color Palette from the first available image ---
+        palette = []
+        if slide_data.get("image_urls"):
+            palette = self._get_palette_from_image_url(slide_data["image_urls"][0])
+
+        # --- Generate HTML ---
+        yield self._designing_event(i, slide_data)
+        with span('slide_design'):
+            if STREAM_SLIDE_HTML:
+                html_content = yield from self._stream_slide_html(slide_data, theme, style, palette, i + 1)
+            else:
+                html_content = self._generate_slide_html(slide_data, theme, style, palette)
+            html_content = self._finish_slide_html(i, html_content, slide_data, theme)
+        yield self._slide_event(i, is_update, total_slides_before_update, html_content, slide_data, theme)
+
+    def _finish_slide_html(self, i, html_content, slide_data, theme):
+        """Binds the theme, localizes images (and optionally CDN assets) and remembers the slide's HTML."""
+        html_content = apply_theme(html_content, theme)
+        # Serve the slide's images from the local asset store rather than third-party hosts.
+        html_content = self.asset_store.rewrite_html(html_content, slide_data.get('image_urls', []))
+        if LOCALIZE_SLIDE_HTML:
+            html_content = self.offline_bundle.localize_html(html_content)
+        self.slide_html[i] = html_content
+        return html_content
+
+    def _slide_event(self, i, is_update, total_slides_before_update, html_content, slide_data, theme):
+        event_type = 'slide_update' if is_update and i < total_slides_before_update else 'new_slide'
+        event_data = {
+            'html': html_content, 
+            'slide_number': i + 1, 
+            'total_slides': len(self.presentation_plan['slides']),
+            'animations': slide_data.get('animations', {})
+        }
+        if not is_update and i == 0:
+            event_data['theme'] = theme
+        elif is_update and theme != self.presentation_plan.get('theme'):
+             event_data['theme'] = theme
+        return self._yield_event(event_type, event_data)
@@ -0,0 +1,129 @@
+# render_cache.py
+
+import os
+import json
+import hashlib
+import threading
+from collections import OrderedDict
+
+# --- Constants ---
+RENDER_CACHE_DIR = os.getenv("RENDER_CACHE_DIR", os.path.join(".cache", "renders"))
+MEMORY_CACHE_ENTRIES = int(os.getenv("RENDER_CACHE_MEMORY_ENTRIES", 64))
+DISK_CACHE_MAX_BYTES = int(os.getenv("RENDER_CACHE_MAX_BYTES", 512 * 1024 * 1024))
+
+class RenderCache:
+    """
+    A content-addressed cache of rendered slide images.
+
+    Entries are keyed by a hash of the slide HTML plus every setting that affects
+    the pixels (viewport, scale, encoding...), so an unchanged slide is never sent
+    to the browser twice. Recently used images are kept in an in-memory LRU; all
+    images are also written to disk, where the least recently used files are
+    evicted once the directory grows past `disk_max_bytes`.
+    """
+    def __init__(self, directory=RENDER_CACHE_DIR, memory_entries=MEMORY_CACHE_ENTRIES, disk_max_bytes=DISK_CACHE_MAX_BYTES):
+        self.directory = directory
+        self.memory_entries = memory_entries
+        self.disk_max_bytes = disk_max_bytes
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._disk_bytes = None  # Computed lazily on first write
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(html, **render_settings):
+        """Builds the cache key for a slide's HTML rendered with the given settings."""
+        digest = hashlib.sha256()
+        digest.update(json.dumps(render_settings, sort_keys=True).encode('utf-8'))
+        digest.update(b'\0')
+        digest.update(html.encode('utf-8'))
+        return digest.hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], key)
+
+    def _remember(self, key, data):
+        self._memory[key] = data
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def get(self, key):
+        """Returns the cached image bytes for `key`, or None."""
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return self._memory[key]
+
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            os.utime(path)  # Mark as recently used for disk eviction
+        except OSError:
+            with self._lock:
+                self.misses += 1
+            return None
+
+        with self._lock:
+            self._remember(key, data)
+            self.hits += 1
+        return data
+
+    def put(self, key, data):
+        """Stores image bytes under `key` in both tiers."""
+        with self._lock:
+            self._remember(key, data)
+
+        path = self._path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            existed = os.path.exists(path)
+            tmp_path = f"{path}.{threading.get_ident()}.tmp"
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"RenderCache: Could not write {path}: {e}")
+            return
+
+        with self._lock:
+            if self._disk_bytes is None:
+                self._disk_bytes = self._scan_disk_usage()
+            elif not existed:
+                self._disk_bytes += len(data)
+            if self._disk_bytes > self.disk_max_bytes:
+                self._evict_disk()
+
+    def _cached_files(self):
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if not name.endswith('.tmp'):
+                    yield os.path.join(root, name)
+
+    def _scan_disk_usage(self):
+        return sum(os.path.getsize(path) for path in self._cached_files())
+
+    def _evict_disk(self):
+        """Deletes least recently used files until the disk tier is back under its cap."""
+        entries = []
+        for path in self._cached_files():
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        entries.sort()
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= self.disk_max_bytes:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass
+        self._disk_bytes = total
@@ -0,0 +1,185 @@
+# search_cache.py
+
+import os
+import json
+import time
+import sqlite3
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+
+# --- Constants ---
+SEARCH_CACHE_PATH = os.getenv("SEARCH_CACHE_PATH", os.path.join(".cache", "search_results.sqlite3"))
+MEMORY_CACHE_ENTRIES = 512
+CATEGORY_TTL_S = {
+    'images': 7 * 24 * 3600,  # Image results for a query barely change
+    'general': 24 * 3600,     # Facts and figures for charts should stay reasonably fresh
+}
+DEFAULT_TTL_S = 24 * 3600
+PURGE_EVERY_N_WRITES = 100
+
+class SearchCache:
+    """
+    A two-tier cache for SearXNG JSON responses, keyed by (query, category, language).
+
+    Lookups hit an in-process LRU first and a durable SQLite table second, so
+    results survive restarts and are shared by every worker on the host. Entries
+    expire after a per-category TTL. Hit and miss counters are kept per tier.
+
+    Both tiers hold the response as JSON text and every hit decodes its own
+    copy, so a caller that modifies the results cannot change what later
+    callers receive.
+    """
+    def __init__(self, path=SEARCH_CACHE_PATH, memory_entries=MEMORY_CACHE_ENTRIES, ttl_by_category=None):
+        self.path = path
+        self.memory_entries = memory_entries
+        self.ttl_by_category = dict(CATEGORY_TTL_S, **(ttl_by_category or {}))
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._writes = 0
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS search_results (
+                    query TEXT NOT NULL,
+                    category TEXT NOT NULL,
+                    language TEXT NOT NULL,
+                    payload TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    PRIMARY KEY (query, category, language)
+                )
+            """)
+
+    @contextmanager
+    def _connect(self):
+        """Yields a short-lived connection that commits on success and is always closed."""
+        conn = sqlite3.connect(self.path, timeout=5)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _key(query, category, language):
+        return (' '.join(query.lower().split()), category, language)
+
+    def _ttl(self, category):
+        return self.ttl_by_category.get(category, DEFAULT_TTL_S)
+
+    def _remember(self, key, payload_json, created_at):
+        self._memory[key] = (payload_json, created_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def get(self, query, category, language='en'):
+        """Returns the cached JSON response for the search, or None if absent or expired."""
+        key = self._key(query, category, language)
+        oldest_valid = time.time() - self._ttl(category)
+
+        payload_json = None
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                if entry[1] >= oldest_valid:
+                    self._memory.move_to_end(key)
+                    self.memory_hits += 1
+                    payload_json = entry[0]
+                else:
+                    del self._memory[key]
+        if payload_json is not None:
+            return json.loads(payload_json)  # Decoded outside the lock; each caller gets its own copy
+
+        try:
+            with self._connect() as conn:
+                row = conn.execute(
+                    "SELECT payload, created_at FROM search_results WHERE query = ? AND category = ? AND language = ?",
+                    key
+                ).fetchone()
+        except sqlite3.Error as e:
+            print(f"SearchCache: Could not read from {self.path}: {e}")
+            row = None
+
+        with self._lock:
+            if row is None or row[1] < oldest_valid:
+                self.misses += 1
+                return None
+            self._remember(key, row[0], row[1])
+            self.disk_hits += 1
+        return json.loads(row[0])
+
+    def put(self, query, category, language, payload):
+        """Stores a JSON response in both tiers."""
+        key = self._key(query, category, language)
+        created_at = time.time()
+        payload_json = json.dumps(payload)
+        with self._lock:
+            self._remember(key, payload_json, created_at)
+            self._writes += 1
+            purge = self._writes % PURGE_EVERY_N_WRITES == 0
+        try:
+            with self._connect() as conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO search_results (query, category, language, payload, created_at) VALUES (?, ?, ?, ?, ?)",
+                    key + (payload_json, created_at)
+                )
+                if purge:
+                    self._purge_expired(conn)
+        except sqlite3.Error as e:
+            print(f"SearchCache: Could not write to {self.path}: {e}")
+
+    def _purge_expired(self, conn):
+        now = time.time()
+        for category, ttl in self.ttl_by_category.items():
+            conn.execute("DELETE FROM search_results WHERE category = ? AND created_at < ?", (category, now - ttl))
+        placeholders = ','.join('?' * len(self.ttl_by_category))
+        conn.execute(
+            f"DELETE FROM search_results WHERE category NOT IN ({placeholders}) AND created_at < ?",
+            tuple(self.ttl_by_category) + (now - DEFAULT_TTL_S,)
+        )
+
+    def invalidate(self, query=None, category=None):
+        """Drops cached entries matching the given query and/or category (all entries if neither is given)."""
+        normalized = ' '.join(query.lower().split()) if query is not None else None
+        with self._lock:
+            for key in list(self._memory):
+                if (normalized is None or key[0] == normalized) and (category is None or key[1] == category):
+                    del self._memory[key]
+        clauses, params = [], []
+        if normalized is not None:
+            clauses.append("query = ?")
+            params.append(normalized)
+        if category is not None:
+            clauses.append("category = ?")
+            params.append(category)
+        where = f" WHERE {' AND '.join(clauses)}" if clauses else ""
+        try:
+            with self._connect() as conn:
+                conn.execute(f"DELETE FROM search_results{where}", params)
+        except sqlite3.Error as e:
+            print(f"SearchCache: Could not invalidate entries in {self.path}: {e}")
+
+    def stats(self):
+        with self._lock:
+            return {
+                'memory_hits': self.memory_hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'memory_entries': len(self._memory),
+            }
+
+_shared_cache = None
+_shared_cache_lock = threading.Lock()
+
+def get_search_cache():
+    """Returns the process-wide search cache, creating it on first use."""
+    global _shared_cache
+    with _shared_cache_lock:
+        if _shared_cache is None:
+            _shared_cache = SearchCache()
+        return _shared_cache
@@ -0,0 +1,258 @@
+# search_client.py
+
+import time
+import asyncio
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from metrics import span
+
+# --- Constants ---
+REQUEST_TIMEOUT = 25      # Read timeout for a search
+CONNECT_TIMEOUT = 3       # A dead instance should fail fast instead of costing a full REQUEST_TIMEOUT
+POOL_MAXSIZE = 16         # Keep-alive connections per instance
+FAILURE_THRESHOLD = 3     # Consecutive failures before an instance's breaker opens
+OPEN_COOLDOWN_S = 30      # How long an open breaker rejects traffic before a recovery probe
+PROBE_INTERVAL_S = 10
+LATENCY_SMOOTHING = 0.3   # Weight of the newest sample in the latency moving average
+
+class SearchUnavailableError(Exception):
+    """Raised when no SearXNG instance is able to serve a request."""
+
+class _InstanceHealth:
+    """Latency/error bookkeeping and circuit-breaker state for one SearXNG instance."""
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip('/')
+        self.latency_s = None
+        self.consecutive_failures = 0
+        self.requests = 0
+        self.errors = 0
+        self.opened_at = None  # Set while the breaker is open
+
+    @property
+    def is_open(self):
+        return self.opened_at is not None
+
+    def record_success(self, latency_s):
+        self.requests += 1
+        self.consecutive_failures = 0
+        self.opened_at = None
+        if self.latency_s is None:
+            self.latency_s = latency_s
+        else:
+            self.latency_s = LATENCY_SMOOTHING * latency_s + (1 - LATENCY_SMOOTHING) * self.latency_s
+
+    def record_failure(self):
+        """Counts a failure and returns True if this failure tripped the breaker."""
+        self.requests += 1
+        self.errors += 1
+        self.consecutive_failures += 1
+        if self.opened_at is None and self.consecutive_failures >= FAILURE_THRESHOLD:
+            self.opened_at = time.monotonic()
+            return True
+        return False
+
+    def as_dict(self):
+        return {
+            'url': self.base_url,
+            'state': 'open' if self.is_open else 'closed',
+            'latency_ms': round(self.latency_s * 1000, 1) if self.latency_s is not None else None,
+            'consecutive_failures': self.consecutive_failures,
+            'requests': self.requests,
+            'errors': self.errors,
+        }
+
+class SearxngClient:
+    """
+    A shared client for a set of SearXNG instances.
+
+    Requests go through one pooled `requests.Session`, so connections are kept
+    alive and reused. Each request is routed to the fastest healthy instance
+    (by moving-average latency) and fails over to the next one on error. An
+    instance that fails `FAILURE_THRESHOLD` times in a row has its breaker
+    opened and is skipped; a background thread probes it after
+    `OPEN_COOLDOWN_S` and closes the breaker once it answers again.
+
+    When given a `SearchCache`, JSON searches are answered from it where possible.
+    """
+    def __init__(self, instance_urls, headers=None, timeout=REQUEST_TIMEOUT, connect_timeout=CONNECT_TIMEOUT, cache=None):
+        self.instances = [_InstanceHealth(url) for url in instance_urls]
+        self.cache = cache
+        self.timeout = (connect_timeout, timeout)
+        self.session = requests.Session()
+        if headers:
+            self.session.headers.update(headers)
+        adapter = HTTPAdapter(pool_connections=max(1, len(self.instances)), pool_maxsize=POOL_MAXSIZE)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self._lock = threading.Lock()
+        self._prober = None
+        self.headers = dict(headers or {})
+        self._async_client = None
+        self._async_client_loop = None
+
+    def _candidates(self):
+        """Instances with a closed breaker, fastest first; never-measured instances are tried early."""
+        with self._lock:
+            healthy = [i for i in self.instances if not i.is_open]
+        return sorted(healthy, key=lambda i: i.latency_s if i.latency_s is not None else 0)
+
+    def request(self, params, method='GET', headers=None):
+        """
+        Sends a search request to the best available instance and returns the
+        `requests.Response`. GET requests send `params` as the query string,
+        POST requests as a form body.
+        """
+        candidates = self._candidates()
+        if not candidates:
+            raise SearchUnavailableError("All SearXNG instances are unhealthy; waiting for them to recover.")
+
+        last_error = None
+        for instance in candidates:
+            search_url = f"{instance.base_url}/search"
+            start = time.monotonic()
+            try:
+                if method == 'POST':
+                    response = self.session.post(search_url, data=params, headers=headers, timeout=self.timeout)
+                else:
+                    response = self.session.get(search_url, params=params, headers=headers, timeout=self.timeout)
+                response.raise_for_status()
+            except requests.RequestException as e:
+                last_error = e
+                self._record_failure(instance, e)
+                continue
+            self._record_success(instance, start)
+            return response
+
+        raise SearchUnavailableError(f"All SearXNG instances failed. Last error: {last_error}")
+
+    def _record_failure(self, instance, error):
+        with self._lock:
+            tripped = instance.record_failure()
+        print(f"SearXNG instance '{instance.base_url}' failed: {error}. Trying next instance...")
+        if tripped:
+            print(f"Circuit breaker opened for SearXNG instance '{instance.base_url}'.")
+            self._ensure_prober()
+
+    def _record_success(self, instance, start):
+        with self._lock:
+            instance.record_success(time.monotonic() - start)
+
+    def search(self, query, category='general', language='en', use_cache=True):
+        """
+        Runs a query through the SearXNG JSON API and returns the decoded response.
+        With `use_cache=False` the cache is bypassed and refreshed with the new result.
+        """
+        with span('search', category=category) as labels:
+            if self.cache is not None and use_cache:
+                cached = self.cache.get(query, category, language)
+                if cached is not None:
+                    print(f"Search cache hit for '{query}' ({category}).")
+                    labels['cached'] = 'true'
+                    return cached
+
+            params = {'q': query, 'categories': category, 'language': language, 'format': 'json'}
+            results = self.request(params).json()
+            if self.cache is not None and results.get('results'):
+                self.cache.put(query, category, language, results)  # Empty results are not worth remembering
+            return results
+
+    # --- Async API (used by the ASGI app) ---
+    def _get_async_client(self):
+        """Returns an httpx.AsyncClient bound to the running event loop, creating it on first use."""
+        import httpx  # Only needed by the ASGI app
+        loop = asyncio.get_running_loop()
+        if self._async_client is None or self._async_client_loop is not loop:
+            connect_timeout, read_timeout = self.timeout
+            self._async_client = httpx.AsyncClient(
+                headers=self.headers,
+                timeout=httpx.Timeout(read_timeout, connect=connect_timeout),
+                limits=httpx.Limits(max_keepalive_connections=POOL_MAXSIZE * max(1, len(self.instances)))
+            )
+            self._async_client_loop = loop
+        return self._async_client
+
+    async def request_async(self, params):
+        """Async counterpart of `request` (GET only); shares instance health and breakers with it."""
+        import httpx
+        candidates = self._candidates()
+        if not candidates:
+            raise SearchUnavailableError("All SearXNG instances are unhealthy; waiting for them to recover.")
+
+        client = self._get_async_client()
+        last_error = None
+        for instance in candidates:
+            start = time.monotonic()
+            try:
+                response = await client.get(f"{instance.base_url}/search", params=params)
+                response.raise_for_status()
+            except httpx.HTTPError as e:
+                last_error = e
+                self._record_failure(instance, e)
+                continue
+            self._record_success(instance, start)
+            return response
+
+        raise SearchUnavailableError(f"All SearXNG instances failed. Last error: {last_error}")
+
+    async def search_async(self, query, category='general', language='en', use_cache=True):
+        """Async counterpart of `search`, backed by the same cache."""
+        with span('search', category=category) as labels:
+            if self.cache is not None and use_cache:
+                # The cache's disk tier is SQLite; keep it off the event loop.
+                cached = await asyncio.to_thread(self.cache.get, query, category, language)
+                if cached is not None:
+                    print(f"Search cache hit for '{query}' ({category}).")
+                    labels['cached'] = 'true'
+                    return cached
+
+            params = {'q': query, 'categories': category, 'language': language, 'format': 'json'}
+            results = (await self.request_async(params)).json()
+            if self.cache is not None and results.get('results'):
+                await asyncio.to_thread(self.cache.put, query, category, language, results)
+            return results
+
+    def stats(self):
+        """Returns the health and latency figures of every instance."""
+        with self._lock:
+            return [i.as_dict() for i in self.instances]
+
+    # --- Recovery probing ---
+    def _ensure_prober(self):
+        with self._lock:
+            if self._prober is None or not self._prober.is_alive():
+                self._prober = threading.Thread(target=self._probe_loop, name="searxng-prober", daemon=True)
+                self._prober.start()
+
+    def _probe_loop(self):
+        """Probes instances with an open breaker until every breaker is closed again."""
+        while True:
+            time.sleep(PROBE_INTERVAL_S)
+            with self._lock:
+                due = [i for i in self.instances if i.is_open and time.monotonic() - i.opened_at >= OPEN_COOLDOWN_S]
+                any_open = any(i.is_open for i in self.instances)
+            if not any_open:
+                return
+            for instance in due:
+                start = time.monotonic()
+                try:
+                    response = self.session.get(f"{instance.base_url}/healthz", timeout=self.timeout)
+                    response.raise_for_status()
+                except requests.RequestException:
+                    with self._lock:
+                        instance.opened_at = time.monotonic()  # Stay open for another cooldown
+                    continue
+                with self._lock:
+                    instance.record_success(time.monotonic() - start)
+                print(f"SearXNG instance '{instance.base_url}' recovered; circuit breaker closed.")
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+def get_search_client(instance_urls, headers=None, timeout=REQUEST_TIMEOUT, cache=None):
+    """Returns the process-wide client for a set of instances, creating it on first use."""
+    key = tuple(instance_urls)
+    with _clients_lock:
+        if key not in _clients:
+            _clients[key] = SearxngClient(instance_urls, headers=headers, timeout=timeout, cache=cache)
+        return _clients[key]
@@ -2,6 +2,7 @@ import requests
 import argparse
 from bs4 import BeautifulSoup
 from urllib.parse import urljoin
+from search_client import get_search_client, SearchUnavailableError
 
 # --- CONFIGURATION ---
 SEARXNG_INSTANCE_URL = "http://127.0.0.1:8888"
@@ -12,7 +13,7 @@ def search_searxng(query: str, category: str = 'general'):
     """
     print(f"--- Querying SearXNG for '{query}' in category '{category}' ---")
     
-    search_url = f"{SEARXNG_INSTANCE_URL}/search"
+    client = get_search_client([SEARXNG_INSTANCE_URL], timeout=30)
     
     post_data = {
         'q': query,
@@ -30,8 +31,7 @@ def search_searxng(query: str, category: str = 'general'):
 
     try:
         # Increased client-side timeout to be more patient than the server
-        response = requests.post(search_url, data=post_data, headers=headers, timeout=30)
-        response.raise_for_status()
+        response = client.request(post_data, method='POST', headers=headers)
         
         print(f"--- Status Code: {response.status_code} ---")
         
@@ -86,7 +86,7 @@ def search_searxng(query: str, category: str = 'general'):
                 print("\n--- No general results found with selector 'article.result'. Inspect cli_debug_output.html. ---")
 
 
-    except requests.RequestException as e:
+    except (requests.RequestException, SearchUnavailableError) as e:
         print(f"\n--- ERROR ---")
         print(f"Failed to connect to SearXNG instance at {SEARXNG_INSTANCE_URL}")
         print(f"Error details: {e}")
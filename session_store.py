@@ -0,0 +1,194 @@
+# session_store.py
+
+import os
+import json
+import time
+import hashlib
+import sqlite3
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+
+# --- Constants ---
+SESSION_STORE_PATH = os.getenv("SESSION_STORE_PATH", os.path.join(".cache", "sessions.sqlite3"))
+MEMORY_SESSIONS = int(os.getenv("SESSION_MEMORY_ENTRIES", 64))
+SESSION_IDLE_TTL_S = int(os.getenv("SESSION_IDLE_TTL_S", 30 * 60))        # Dropped from memory (not disk) after this
+SESSION_MAX_AGE_S = int(os.getenv("SESSION_MAX_AGE_S", 14 * 24 * 3600))  # Deleted from disk after this long unused
+PURGE_EVERY_N_WRITES = 100
+
+def _int_keys(mapping):
+    """JSON turns int keys into strings; slide maps are keyed by int."""
+    return {int(key): value for key, value in (mapping or {}).items()}
+
+def track_slide_event(session, event):
+    """Keeps a session's `slides_html` in step with an agent event as it is streamed."""
+    if event['type'] in ('new_slide', 'slide_update'):
+        session['slides_html'][event['data']['slide_number']] = event['data']['html']
+    elif event['type'] == 'slide_order':
+        previous = session['slides_html']
+        session['slides_html'] = {
+            i + 1: previous[source + 1]
+            for i, source in enumerate(event['data']['sources'])
+            if source is not None and source + 1 in previous
+        }
+
+def slide_digest(html_content):
+    """The content hash clients send for a slide instead of its HTML: SHA-256 of its UTF-8 bytes, in hex."""
+    return hashlib.sha256(html_content.encode('utf-8')).hexdigest()
+
+def resolve_slide_hashes(session, slide_hashes, uploads):
+    """
+    Assembles a deck from slide hashes. Each slide comes from `uploads`
+    (slide index -> HTML), the HTML the chat stream last sent for the session,
+    or a slide uploaded for an earlier export. Returns (slides_html, missing
+    indices); uploaded slides are remembered in the session for next time.
+    """
+    streamed = {slide_digest(html): html for html in session['slides_html'].values()}
+    slides_html, missing = [], []
+    for i, digest in enumerate(slide_hashes):
+        html = uploads.get(i) or streamed.get(digest) or session['export_slides'].get(digest)
+        if html is None:
+            missing.append(i)
+        slides_html.append(html)
+    if not missing:
+        # Only the latest export's own slides are kept, so this stays the size of one deck.
+        session['export_slides'] = {
+            digest: html for digest, html in zip(slide_hashes, slides_html) if digest not in streamed
+        }
+    return slides_html, missing
+
+class SessionStore:
+    """
+    Holds conversation sessions: the agent (whose plan and slide HTML are its
+    state) and the client-facing `slides_html` map.
+
+    Live sessions are kept in an in-process LRU that also drops sessions idle
+    for longer than `idle_ttl_s`. Every save is written through to SQLite with
+    a version number, so a session survives restarts and any worker process can
+    serve it; a worker whose in-memory copy is older than the stored version
+    reloads it before use.
+
+    With an `asset_store`, each save marks the stored images the session's
+    slides reference as in use, so the store does not evict them.
+    """
+    def __init__(self, agent_factory, path=SESSION_STORE_PATH, memory_entries=MEMORY_SESSIONS,
+                 idle_ttl_s=SESSION_IDLE_TTL_S, max_age_s=SESSION_MAX_AGE_S, asset_store=None):
+        self.agent_factory = agent_factory
+        self.asset_store = asset_store
+        self.path = path
+        self.memory_entries = memory_entries
+        self.idle_ttl_s = idle_ttl_s
+        self.max_age_s = max_age_s
+        self._memory = OrderedDict()  # conv_id -> (session, last_used)
+        self._lock = threading.Lock()
+        self._writes = 0
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS sessions (
+                    conversation_id TEXT PRIMARY KEY,
+                    state TEXT NOT NULL,
+                    version INTEGER NOT NULL,
+                    updated_at REAL NOT NULL
+                )
+            """)
+
+    @contextmanager
+    def _connect(self):
+        """Yields a short-lived connection that commits on success and is always closed."""
+        conn = sqlite3.connect(self.path, timeout=5)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def _new_session(self, conv_id):
+        return {"id": conv_id, "agent": self.agent_factory(), "slides_html": {}, "export_slides": {}, "version": 0}
+
+    def _from_state(self, conv_id, state, version):
+        session = self._new_session(conv_id)
+        session["agent"].restore_state(state.get("agent", {}))
+        session["slides_html"] = _int_keys(state.get("slides_html"))
+        session["export_slides"] = state.get("export_slides", {})
+        session["version"] = version
+        return session
+
+    def _stored_version(self, conv_id):
+        try:
+            with self._connect() as conn:
+                row = conn.execute("SELECT version FROM sessions WHERE conversation_id = ?", (conv_id,)).fetchone()
+        except sqlite3.Error as e:
+            print(f"SessionStore: Could not read from {self.path}: {e}")
+            return None
+        return row[0] if row else None
+
+    def _load(self, conv_id):
+        try:
+            with self._connect() as conn:
+                row = conn.execute("SELECT state, version FROM sessions WHERE conversation_id = ?", (conv_id,)).fetchone()
+        except sqlite3.Error as e:
+            print(f"SessionStore: Could not read from {self.path}: {e}")
+            return None
+        if row is None:
+            return None
+        return self._from_state(conv_id, json.loads(row[0]), row[1])
+
+    def _evict_idle(self, now):
+        while self._memory:
+            oldest_id, (_, last_used) = next(iter(self._memory.items()))
+            if len(self._memory) <= self.memory_entries and now - last_used <= self.idle_ttl_s:
+                break
+            del self._memory[oldest_id]
+
+    def get(self, conv_id):
+        """Returns the session for a conversation, loading it from disk or creating it as needed."""
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(conv_id)
+        session = entry[0] if entry else None
+
+        stored_version = self._stored_version(conv_id)
+        if stored_version is not None and (session is None or session["version"] < stored_version):
+            # Unknown here, or another worker has saved a newer turn.
+            session = self._load(conv_id) or session
+        if session is None:
+            session = self._new_session(conv_id)
+
+        with self._lock:
+            self._memory[conv_id] = (session, now)
+            self._memory.move_to_end(conv_id)
+            self._evict_idle(now)
+        return session
+
+    def save(self, session):
+        """Writes a session through to disk, bumping its version."""
+        state = {"agent": session["agent"].export_state(), "slides_html": session["slides_html"],
+                 "export_slides": session["export_slides"]}
+        session["version"] += 1
+        now = time.time()
+        with self._lock:
+            self._writes += 1
+            purge = self._writes % PURGE_EVERY_N_WRITES == 0
+        try:
+            with self._connect() as conn:
+                stored = conn.execute("SELECT version FROM sessions WHERE conversation_id = ?", (session["id"],)).fetchone()
+                if stored and stored[0] >= session["version"]:
+                    # Two workers ran a turn of the same conversation concurrently; the last one wins.
+                    print(f"SessionStore: Overwriting newer version {stored[0]} of session {session['id']}.")
+                    session["version"] = stored[0] + 1
+                conn.execute(
+                    "INSERT OR REPLACE INTO sessions (conversation_id, state, version, updated_at) VALUES (?, ?, ?, ?)",
+                    (session["id"], json.dumps(state), session["version"], now)
+                )
+                if purge:
+                    conn.execute("DELETE FROM sessions WHERE updated_at < ?", (now - self.max_age_s,))
+        except sqlite3.Error as e:
+            print(f"SessionStore: Could not write to {self.path}: {e}")
+        if self.asset_store is not None:
+            self.asset_store.touch(list(session["slides_html"].values()) + list(session["export_slides"].values()))
+
+    def stats(self):
+        with self._lock:
+            return {'memory_sessions': len(self._memory)}
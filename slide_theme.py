@@ -0,0 +1,124 @@
+# slide_theme.py
+#
+# Binds a presentation theme to generated slides through CSS custom properties,
+# so a theme edit can re-skin existing slide HTML without another LLM call.
+
+import re
+import html
+from urllib.parse import quote
+
+THEME_VARIABLE_PREFIX = "--theme-"
+THEME_STYLE_ID = "theme-vars"
+THEME_FONTS_ID = "theme-fonts"
+GOOGLE_FONTS_CSS_URL = "https://fonts.googleapis.com/css2"
+GENERIC_FONT_FAMILIES = {'serif', 'sans-serif', 'monospace', 'cursive', 'fantasy', 'system-ui'}
+FONT_SECTION_WORDS = {'typeface', 'typography'}
+# Last words of font settings that are not a family name (fontSize, fonts.body.weight, ...).
+FONT_PROPERTY_WORDS = {'size', 'sizes', 'weight', 'weights', 'color', 'colour', 'style', 'height', 'spacing', 'scale', 'variant', 'url'}
+THEME_STYLE_BLOCK = re.compile(r'<style id="' + THEME_STYLE_ID + r'">.*?</style>', re.DOTALL)
+# Slides themed before per-family links carry the stylesheet under an id instead of a class.
+THEME_FONTS_LINK = re.compile(r'<link (?:id|class)="' + THEME_FONTS_ID + r'"[^>]*>')
+HEAD_OPEN = re.compile(r'<head[^>]*>', re.IGNORECASE)
+THEME_VARIABLE_REFERENCE = re.compile(r'var\(\s*(' + re.escape(THEME_VARIABLE_PREFIX) + r'[\w-]+)\s*[,)]')
+
+def _kebab(name):
+    name = re.sub(r'([a-z0-9])([A-Z])', r'\1-\2', str(name))
+    return re.sub(r'[^a-zA-Z0-9]+', '-', name).strip('-').lower()
+
+def _is_font_key(path):
+    """Whether a theme value names a font family, e.g. font_pairing.heading or headingFont, but not fontSize or fontColor."""
+    words = [word for part in path if not part.isdigit() for word in _kebab(part).split('-')]
+    if not any('font' in word or word in FONT_SECTION_WORDS for word in words):
+        return False
+    return words[-1] not in FONT_PROPERTY_WORDS
+
+def _font_value(value):
+    """Turns a font family name (or stack) into a valid font-family value."""
+    families = [family.strip().strip('"\'') for family in value.split(',') if family.strip()]
+    return ', '.join(family if family in GENERIC_FONT_FAMILIES else f"'{family}'" for family in families)
+
+def _leaves(node, path=()):
+    if isinstance(node, dict):
+        for key, value in node.items():
+            yield from _leaves(value, path + (str(key),))
+    elif isinstance(node, list):
+        for index, value in enumerate(node):
+            yield from _leaves(value, path + (str(index),))
+    elif isinstance(node, (str, int, float)) and not isinstance(node, bool):
+        yield path, node
+
+def theme_variables(theme):
+    """
+    Flattens a theme into CSS custom properties, e.g. theme.colors.primary
+    becomes --theme-colors-primary. Font values are quoted so they can be used
+    directly in `font-family`.
+    """
+    variables = {}
+    for path, value in _leaves(theme or {}):
+        value = str(value).strip()
+        if not value or any(c in value for c in '{};<>'):
+            continue  # Not a safe declaration value
+        if _is_font_key(path):
+            value = _font_value(value)
+        variables[THEME_VARIABLE_PREFIX + '-'.join(_kebab(part) for part in path)] = value
+    return variables
+
+def theme_font_families(theme):
+    """Returns the Google Fonts families named by the theme's font values."""
+    families = []
+    for path, value in _leaves(theme or {}):
+        if isinstance(value, str) and _is_font_key(path):
+            for family in value.split(','):
+                family = family.strip().strip('"\'')
+                if family and family not in GENERIC_FONT_FAMILIES and family not in families:
+                    families.append(family)
+    return families
+
+def theme_head_markup(theme):
+    """The `<link>` and `<style>` elements that carry the theme into a slide's `<head>`."""
+    declarations = ''.join(f"{name}: {value};" for name, value in theme_variables(theme).items())
+    markup = f'<style id="{THEME_STYLE_ID}">:root {{{declarations}}}</style>'
+    links = []
+    for family in theme_font_families(theme):
+        # Google Fonts rejects a whole css2 request if any family lacks a listed
+        # weight, and many display faces have only 400. Each family therefore
+        # gets its own links: the default weight, which always exists, and bold,
+        # which fails on its own where there is none.
+        name = quote(family).replace('%20', '+')
+        for axes in ('', ':wght@700'):
+            href = html.escape(f"{GOOGLE_FONTS_CSS_URL}?family={name}{axes}&display=swap", quote=True)
+            links.append(f'<link class="{THEME_FONTS_ID}" rel="stylesheet" href="{href}">')
+    return ''.join(links) + markup
+
+def apply_theme(html_content, theme):
+    """
+    Writes the theme's custom properties (and font stylesheet) into a slide,
+    replacing the ones from a previous theme if present.
+    """
+    html_content = THEME_FONTS_LINK.sub('', html_content)
+    markup = theme_head_markup(theme)
+    if THEME_STYLE_BLOCK.search(html_content):
+        return THEME_STYLE_BLOCK.sub(lambda _: markup, html_content, count=1)
+    head = HEAD_OPEN.search(html_content)
+    if head:
+        return html_content[:head.end()] + markup + html_content[head.end():]
+    return markup + html_content
+
+def _bound_variables(html_content):
+    return set(THEME_VARIABLE_REFERENCE.findall(html_content))
+
+def theme_variable_changes(old_theme, new_theme):
+    """Returns (variables a theme edit changed or added, variables it removed)."""
+    old, new = theme_variables(old_theme), theme_variables(new_theme)
+    changed = {name for name, value in new.items() if old.get(name) != value}
+    return changed, set(old) - set(new)
+
+def can_reskin(html_content, changed, removed):
+    """
+    True if swapping the theme variables is enough to show a theme edit on the
+    slide: it binds every variable that changed and none that was removed. A
+    slide that hard-codes, say, its font while the edit changed the font has to
+    be redesigned instead.
+    """
+    bound = _bound_variables(html_content)
+    return changed <= bound and not (removed & bound)
@@ -0,0 +1,68 @@
+# sse.py
+#
+# The transport edge for agent events. The agent yields plain
+# {"type": ..., "data": ...} dicts; they are encoded to server-sent events
+# exactly once, here, optionally replacing a `slide_update`'s HTML with a
+# compact diff against the HTML the client already has for that slide.
+
+import re
+import json
+import difflib
+
+# A delta is only sent when it is at most this fraction of the full HTML.
+DELTA_MAX_RATIO = 0.5
+DELTA_OP_OVERHEAD = 16  # Approximate JSON bytes per operation besides its text
+# Diffs are computed over tags and text runs rather than characters: far
+# fewer items to compare, and edits rarely split a tag.
+HTML_TOKEN_BOUNDARY = re.compile(r'(?<=>)|(?=<)')
+
+def format_sse(event):
+    """Encodes an event as one server-sent event."""
+    return f"data: {json.dumps(event, separators=(',', ':'))}\n\n"
+
+def format_comment(text):
+    """An SSE comment line, e.g. a keep-alive; clients ignore it."""
+    return f": {text}\n\n"
+
+def _utf16_length(text):
+    # Offsets are consumed by JavaScript, whose strings index UTF-16 code units.
+    return len(text.encode('utf-16-le')) // 2
+
+def html_delta(base, html):
+    """
+    Returns the edit operations that turn `base` into `html`, as
+    [start, end, replacement] triples: replace base[start:end] (UTF-16
+    offsets into the unmodified base) with `replacement`. Operations are in
+    ascending order and do not overlap.
+    """
+    base_tokens = [token for token in HTML_TOKEN_BOUNDARY.split(base) if token]
+    new_tokens = [token for token in HTML_TOKEN_BOUNDARY.split(html) if token]
+    offsets = [0]
+    for token in base_tokens:
+        offsets.append(offsets[-1] + _utf16_length(token))
+
+    matcher = difflib.SequenceMatcher(None, base_tokens, new_tokens, autojunk=False)
+    return [
+        [offsets[i1], offsets[i2], ''.join(new_tokens[j1:j2])]
+        for tag, i1, i2, j1, j2 in matcher.get_opcodes()
+        if tag != 'equal'
+    ]
+
+def delta_event(event, previous_html):
+    """
+    Returns the event to put on the wire in delta mode. A `slide_update`
+    whose slide the client already has is sent as a diff when that is much
+    smaller than the HTML; every other event is returned unchanged.
+    """
+    if event['type'] != 'slide_update' or not previous_html:
+        return event
+    html = event['data']['html']
+    operations = html_delta(previous_html, html)
+    delta_size = sum(len(replacement) + DELTA_OP_OVERHEAD for _, _, replacement in operations)
+    if delta_size > len(html) * DELTA_MAX_RATIO:
+        return event
+    data = {key: value for key, value in event['data'].items() if key != 'html'}
+    data['delta'] = operations
+    data['base_length'] = _utf16_length(previous_html)  # Lets the client detect a stale base
+    data['length'] = _utf16_length(html)
+    return {'type': 'slide_update', 'data': data}
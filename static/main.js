@@ -5,6 +5,15 @@ document.addEventListener('DOMContentLoaded', () => {
     let conversationId = `conv_${Date.now()}`;
     let selectedElementInfo = { id: null, type: null };
     let lockedElementId = null;
+    let streamingSlides = {};
+    // The HTML the server last sent for each slide (0-based), before local edits:
+    // the base that `slide_update` deltas apply to.
+    let serverSlides = [];
+    // Slide numbers whose delta could not be resolved; reloaded once the turn ends.
+    let unresolvedSlides = new Set();
+    let streamingPreviewIndex = null;
+    let streamingPreviewTimer = null;
+    const STREAMING_PREVIEW_INTERVAL_MS = 250;
 
     const slideSorterBody = document.getElementById('slide-sorter-body');
     const chatLog = document.getElementById('chat-log');
@@ -15,6 +24,7 @@ document.addEventListener('DOMContentLoaded', () => {
     const nextBtn = document.getElementById('next-btn');
     const slideCounter = document.getElementById('slide-counter');
     const exportBtn = document.getElementById('export-btn');
+    const exportProfileSelect = document.getElementById('export-profile');
     const layersList = document.getElementById('layers-list');
     const canvasWrapper = document.getElementById('canvas-wrapper');
     const slideIframeContainer = document.getElementById('slide-iframe-container');
@@ -228,7 +238,7 @@ document.addEventListener('DOMContentLoaded', () => {
             const response = await fetch('/api/chat', {
                 method: 'POST',
                 headers: { 'Content-Type': 'application/json' },
-                body: JSON.stringify({ conversation_id: conversationId, history: conversationHistory })
+                body: JSON.stringify({ conversation_id: conversationId, history: conversationHistory, delta: true })
             });
             if (!response.ok) { throw new Error(`Server error: ${response.statusText}`); }
             const reader = response.body.getReader();
@@ -250,11 +260,14 @@ document.addEventListener('DOMContentLoaded', () => {
                     }
                 }
             }
+            await reloadUnresolvedSlides();
         } catch (error) {
             console.error("Failed to send message:", error);
             addMessageToLog('agent', "Sorry, I encountered an error. Please try again.");
         } finally {
             sendBtn.disabled = false;
+            streamingSlides = {};
+            streamingPreviewIndex = null;
         }
     }
     
@@ -271,13 +284,97 @@ document.addEventListener('DOMContentLoaded', () => {
         if (event.type === 'status_update') {
             addMessageToLog('agent', data.message);
             conversationHistory.push({ role: 'agent', content: data.message });
+        } else if (event.type === 'slide_chunk') {
+            const slideIndex = data.slide_number - 1;
+            streamingSlides[slideIndex] = (streamingSlides[slideIndex] || '') + data.html;
+            // Slides are designed concurrently; preview one of them at a time.
+            if (streamingPreviewIndex === null) { streamingPreviewIndex = slideIndex; }
+            if (slideIndex === streamingPreviewIndex) { scheduleStreamingPreview(); }
+        } else if (event.type === 'slide_order') {
+            // sources[i] is the old position of the slide now at i, or null for a slide still to come.
+            saveCurrentSlideEdits();
+            finalSlides = data.sources.map(source => (source === null ? undefined : finalSlides[source]));
+            serverSlides = data.sources.map(source => (source === null ? undefined : serverSlides[source]));
+            currentSlideIndex = Math.min(currentSlideIndex, Math.max(finalSlides.length - 1, 0));
+            renderCurrentSlide();
+            renderSlideSorter();
         } else if (event.type === 'new_slide' || event.type === 'slide_update') {
             const slideIndex = data.slide_number - 1;
-            finalSlides[slideIndex] = data.html;
+            delete streamingSlides[slideIndex];
+            if (slideIndex === streamingPreviewIndex) { streamingPreviewIndex = null; }
+            const html = data.delta ? await resolveSlideDelta(slideIndex, data) : data.html;
+            if (html === null) {
+                // Keep showing the old slide; the turn's result is fetched when it ends.
+                serverSlides[slideIndex] = undefined;
+                unresolvedSlides.add(data.slide_number);
+                return;
+            }
+            serverSlides[slideIndex] = html;
+            finalSlides[slideIndex] = html;
             currentSlideIndex = slideIndex;
             renderCurrentSlide();
             renderSlideSorter();
+        } else if (event.type === 'timing') {
+            // Sent when the server runs with TIMING_EVENTS=1 (or the request asks for it).
+            console.info('Turn timing (ms):', data);
+        }
+    }
+
+    // A delta `slide_update` lists [start, end, replacement] edits against the
+    // HTML last sent for the slide. If our copy is not that base (e.g. after a
+    // reload), the full slide is fetched instead; null if that fails too.
+    async function resolveSlideDelta(slideIndex, data) {
+        const base = serverSlides[slideIndex];
+        if (typeof base === 'string' && base.length === data.base_length) {
+            let html = base;
+            for (let i = data.delta.length - 1; i >= 0; i--) {
+                const [start, end, replacement] = data.delta[i];
+                html = html.slice(0, start) + replacement + html.slice(end);
+            }
+            if (html.length === data.length) return html;
         }
+        return fetchServerSlide(data.slide_number);
+    }
+
+    async function fetchServerSlide(slideNumber) {
+        const params = new URLSearchParams({ conversation_id: conversationId, slide_number: slideNumber });
+        try {
+            const response = await fetch(`/api/chat/slide?${params}`);
+            if (response.ok) return (await response.json()).html;
+            console.warn(`Could not load slide ${slideNumber}: ${response.statusText}`);
+        } catch (e) { console.warn(`Could not load slide ${slideNumber}:`, e); }
+        return null;
+    }
+
+    // The server saves the conversation when a turn ends, so any worker can
+    // then serve the slides whose deltas could not be applied mid-stream.
+    async function reloadUnresolvedSlides() {
+        const slideNumbers = [...unresolvedSlides];
+        unresolvedSlides.clear();
+        for (const slideNumber of slideNumbers) {
+            const html = await fetchServerSlide(slideNumber);
+            if (html === null) continue;
+            serverSlides[slideNumber - 1] = html;
+            finalSlides[slideNumber - 1] = html;
+        }
+        if (slideNumbers.length) {
+            renderCurrentSlide();
+            renderSlideSorter();
+        }
+    }
+
+    // Partial slide HTML from `slide_chunk` events is rendered at most every
+    // STREAMING_PREVIEW_INTERVAL_MS, without the editor, until the slide is complete.
+    function scheduleStreamingPreview() {
+        if (streamingPreviewTimer) return;
+        streamingPreviewTimer = setTimeout(() => {
+            streamingPreviewTimer = null;
+            const html = streamingSlides[streamingPreviewIndex];
+            if (streamingPreviewIndex === null || !html) return;
+            slideIframe.onload = null;
+            slideIframe.srcdoc = html;
+            slideCounter.textContent = `Designing slide ${streamingPreviewIndex + 1}...`;
+        }, STREAMING_PREVIEW_INTERVAL_MS);
     }
 
     function renderCurrentSlide() {
@@ -652,16 +749,18 @@ document.addEventListener('DOMContentLoaded', () => {
                 body: JSON.stringify({ query, conversation_id: conversationId })
             });
             const data = await response.json();
-            if (!response.ok || !data.image_urls || data.image_urls.length === 0) {
+            if (!response.ok || !data.images || data.images.length === 0) {
                 resultsContainer.innerHTML = 'No results found.';
                 return;
             }
             resultsContainer.innerHTML = '';
-            data.image_urls.forEach(url => {
+            data.images.forEach(image => {
                 const img = document.createElement('img');
-                img.src = url;
+                img.src = image.thumbnail_url || image.url;
+                img.loading = 'lazy';
+                img.title = image.title || '';
                 img.addEventListener('click', () => {
-                    insertImage(url);
+                    insertImage(image.url);
                     imageSearchModal.style.display = 'none';
                 });
                 resultsContainer.appendChild(img);
@@ -774,6 +873,57 @@ document.addEventListener('DOMContentLoaded', () => {
         videoModal.style.display = 'none';
     }
     
+    // SHA-256 of the slide's UTF-8 bytes, as session_store.slide_digest computes it.
+    async function slideDigest(html) {
+        const digest = await crypto.subtle.digest('SHA-256', new TextEncoder().encode(html));
+        return Array.from(new Uint8Array(digest), byte => byte.toString(16).padStart(2, '0')).join('');
+    }
+
+    // Sends slide hashes first; the server builds the deck from the HTML it
+    // already holds and answers 409 with the indices it is `missing` (slides
+    // edited here), which are then uploaded. Without Web Crypto (insecure
+    // origins) every slide is sent in full.
+    async function submitExportJob() {
+        const post = (body) => fetch('/api/export/jobs', {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ conversation_id: conversationId, profile: exportProfileSelect.value, ...body })
+        });
+        if (!window.crypto || !crypto.subtle) { return post({ slides_html: finalSlides }); }
+        const slideHashes = await Promise.all(finalSlides.map(slideDigest));
+        const response = await post({ slide_hashes: slideHashes });
+        if (response.status !== 409) { return response; }
+        const { missing = [] } = await response.json();
+        const slides = Object.fromEntries(missing.map(i => [i, finalSlides[i]]));
+        return post({ slide_hashes: slideHashes, slides });
+    }
+
+    function waitForExportJob(jobId) {
+        // Resolves once the job finishes, showing per-slide progress on the button meanwhile.
+        return new Promise((resolve, reject) => {
+            const events = new EventSource(`/api/export/jobs/${jobId}/events`);
+            events.onmessage = (message) => {
+                const event = JSON.parse(message.data);
+                if (event.type === 'progress') {
+                    const { stage, completed, total } = event.data;
+                    const label = stage === 'capturing' ? `Rendering ${completed}/${total}` : `${stage.charAt(0).toUpperCase()}${stage.slice(1)}...`;
+                    exportBtn.innerHTML = `<i class="fa fa-spinner fa-spin"></i> ${label}`;
+                } else if (event.type === 'status' && event.data.status === 'done') {
+                    events.close();
+                    if (event.data.size_report) { console.info('Export size:', event.data.size_report); }
+                    resolve();
+                } else if (event.type === 'status' && event.data.status === 'failed') {
+                    events.close();
+                    reject(new Error(event.data.error || 'Export failed'));
+                }
+            };
+            events.onerror = () => {
+                events.close();
+                reject(new Error('Lost connection to the export job'));
+            };
+        });
+    }
+
     async function handleExport() {
         if (finalSlides.length === 0) {
             alert("Please generate a presentation before exporting.");
@@ -783,24 +933,16 @@ document.addEventListener('DOMContentLoaded', () => {
         exportBtn.innerHTML = '<i class="fa fa-spinner fa-spin"></i> Exporting...';
         try {
             saveCurrentSlideEdits();
-            const response = await fetch('/api/export', {
-                method: 'POST',
-                headers: { 'Content-Type': 'application/json' },
-                body: JSON.stringify({
-                    conversation_id: conversationId,
-                    slides_html: finalSlides
-                })
-            });
+            const response = await submitExportJob();
             if (!response.ok) { throw new Error((await response.json()).error || 'Export failed'); }
-            const blob = await response.blob();
-            const url = window.URL.createObjectURL(blob);
+            const job = await response.json();
+            if (job.status !== 'done') { await waitForExportJob(job.job_id); }
             const a = document.createElement('a');
             a.style.display = 'none';
-            a.href = url;
+            a.href = `/api/export/jobs/${job.job_id}/result`;
             a.download = 'presentation.pptx';
             document.body.appendChild(a);
             a.click();
-            window.URL.revokeObjectURL(url);
             a.remove();
         } catch (e) {
             console.error("Export error:", e);
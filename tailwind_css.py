@@ -0,0 +1,163 @@
+# tailwind_css.py
+#
+# Resolves the Tailwind (v3) utility classes that generated slides use for
+# layout and color into plain CSS declarations. The native PPTX exporter reads
+# styles without a browser, so it needs `absolute top-10 left-16 w-[800px]`
+# or `bg-slate-900` spelled out as `top: 40px` or `background-color: #0f172a`.
+# Only utilities that map onto native shapes are covered: offsets, width and
+# height, background and text colors, font size and weight, text alignment
+# and rounded corners. Anything else is ignored.
+
+import re
+
+SPACING_UNIT_PX = 4  # Tailwind's spacing scale: `4` is 1rem
+# Variants that hold on the 1280px slide viewport; any other variant (2xl:,
+# hover:, dark:, ...) makes a class inapplicable. Later breakpoints win.
+VARIANT_RANK = {'': 0, 'sm': 1, 'md': 2, 'lg': 3, 'xl': 4}
+SCREEN_PX = {'w': 1280, 'h': 720}
+
+OFFSET_PROPERTIES = {
+    'top': ('top',), 'right': ('right',), 'bottom': ('bottom',), 'left': ('left',),
+    'inset': ('top', 'right', 'bottom', 'left'), 'inset-x': ('left', 'right'), 'inset-y': ('top', 'bottom'),
+}
+SIZE_PROPERTIES = {'w': ('width',), 'h': ('height',), 'size': ('width', 'height')}
+
+FONT_SIZES_PX = {
+    'xs': 12, 'sm': 14, 'base': 16, 'lg': 18, 'xl': 20, '2xl': 24, '3xl': 30, '4xl': 36,
+    '5xl': 48, '6xl': 60, '7xl': 72, '8xl': 96, '9xl': 128,
+}
+FONT_WEIGHTS = {
+    'thin': 100, 'extralight': 200, 'light': 300, 'normal': 400, 'medium': 500,
+    'semibold': 600, 'bold': 700, 'extrabold': 800, 'black': 900,
+}
+TEXT_ALIGNMENTS = {'left', 'center', 'right', 'justify'}
+RADII_PX = {'none': 0, 'sm': 2, '': 4, 'md': 6, 'lg': 8, 'xl': 12, '2xl': 16, '3xl': 24, 'full': 9999}
+
+COLOR_SHADES = (50, 100, 200, 300, 400, 500, 600, 700, 800, 900, 950)
+COLOR_PALETTE = {
+    'slate': 'f8fafc f1f5f9 e2e8f0 cbd5e1 94a3b8 64748b 475569 334155 1e293b 0f172a 020617',
+    'gray': 'f9fafb f3f4f6 e5e7eb d1d5db 9ca3af 6b7280 4b5563 374151 1f2937 111827 030712',
+    'zinc': 'fafafa f4f4f5 e4e4e7 d4d4d8 a1a1aa 71717a 52525b 3f3f46 27272a 18181b 09090b',
+    'neutral': 'fafafa f5f5f5 e5e5e5 d4d4d4 a3a3a3 737373 525252 404040 262626 171717 0a0a0a',
+    'stone': 'fafaf9 f5f5f4 e7e5e4 d6d3d1 a8a29e 78716c 57534e 44403c 292524 1c1917 0c0a09',
+    'red': 'fef2f2 fee2e2 fecaca fca5a5 f87171 ef4444 dc2626 b91c1c 991b1b 7f1d1d 450a0a',
+    'orange': 'fff7ed ffedd5 fed7aa fdba74 fb923c f97316 ea580c c2410c 9a3412 7c2d12 431407',
+    'amber': 'fffbeb fef3c7 fde68a fcd34d fbbf24 f59e0b d97706 b45309 92400e 78350f 451a03',
+    'yellow': 'fefce8 fef9c3 fef08a fde047 facc15 eab308 ca8a04 a16207 854d0e 713f12 422006',
+    'lime': 'f7fee7 ecfccb d9f99d bef264 a3e635 84cc16 65a30d 4d7c0f 3f6212 365314 1a2e05',
+    'green': 'f0fdf4 dcfce7 bbf7d0 86efac 4ade80 22c55e 16a34a 15803d 166534 14532d 052e16',
+    'emerald': 'ecfdf5 d1fae5 a7f3d0 6ee7b7 34d399 10b981 059669 047857 065f46 064e3b 022c22',
+    'teal': 'f0fdfa ccfbf1 99f6e4 5eead4 2dd4bf 14b8a6 0d9488 0f766e 115e59 134e4a 042f2e',
+    'cyan': 'ecfeff cffafe a5f3fc 67e8f9 22d3ee 06b6d4 0891b2 0e7490 155e75 164e63 083344',
+    'sky': 'f0f9ff e0f2fe bae6fd 7dd3fc 38bdf8 0ea5e9 0284c7 0369a1 075985 0c4a6e 082f49',
+    'blue': 'eff6ff dbeafe bfdbfe 93c5fd 60a5fa 3b82f6 2563eb 1d4ed8 1e40af 1e3a8a 172554',
+    'indigo': 'eef2ff e0e7ff c7d2fe a5b4fc 818cf8 6366f1 4f46e5 4338ca 3730a3 312e81 1e1b4b',
+    'violet': 'f5f3ff ede9fe ddd6fe c4b5fd a78bfa 8b5cf6 7c3aed 6d28d9 5b21b6 4c1d95 2e1065',
+    'purple': 'faf5ff f3e8ff e9d5ff d8b4fe c084fc a855f7 9333ea 7e22ce 6b21a8 581c87 3b0764',
+    'fuchsia': 'fdf4ff fae8ff f5d0fe f0abfc e879f9 d946ef c026d3 a21caf 86198f 701a75 4a044e',
+    'pink': 'fdf2f8 fce7f3 fbcfe8 f9a8d4 f472b6 ec4899 db2777 be185d 9d174d 831843 500724',
+    'rose': 'fff1f2 ffe4e6 fecdd3 fda4af fb7185 f43f5e e11d48 be123c 9f1239 881337 4c0519',
+}
+COLORS = {
+    f"{name}-{shade}": f"#{value}"
+    for name, values in COLOR_PALETTE.items()
+    for shade, value in zip(COLOR_SHADES, values.split())
+}
+COLORS.update({'white': '#ffffff', 'black': '#000000', 'transparent': 'transparent'})
+
+UTILITY = re.compile(r'(-?)([a-z0-9-]+?)-(\[[^\]]+\]|[a-z0-9./-]+)')
+
+def _arbitrary(value):
+    """The CSS value inside an arbitrary-value class such as `w-[calc(100%_-_2rem)]`."""
+    return value[1:-1].replace('_', ' ')
+
+def _length(value, negative, axis=None):
+    """A spacing or sizing value (`16`, `1/2`, `px`, `full`, `screen`, `[800px]`) as CSS, or None."""
+    if value.startswith('['):
+        css = _arbitrary(value)
+    elif value == 'px':
+        css = '1px'
+    elif value == 'full':
+        css = '100%'
+    elif value == 'screen' and axis:
+        css = f"{SCREEN_PX[axis]}px"
+    elif re.fullmatch(r'\d+/\d+', value):
+        numerator, denominator = value.split('/')
+        css = f"{int(numerator) / int(denominator) * 100:g}%"
+    elif re.fullmatch(r'\d+(\.\d+)?', value):
+        css = f"{float(value) * SPACING_UNIT_PX:g}px"
+    else:
+        return None
+    return f"-{css}" if negative and not css.startswith('-') else css
+
+def _color(value):
+    """A color utility value (`slate-900`, `white`, `blue-500/50`, `[#1e293b]`) as CSS, or None."""
+    if value.startswith('['):
+        return _arbitrary(value)
+    name, _, opacity = value.partition('/')
+    color = COLORS.get(name)
+    if color and opacity in ('0', '[0]'):
+        return 'transparent'
+    return color  # Partial opacity is approximated by the opaque color
+
+def _declarations(utility):
+    """CSS declarations for one class without variants, or an empty dict if it is not covered."""
+    match = UTILITY.fullmatch(utility)
+    if match is None:
+        return {}
+    negative, prefix, value = match.groups()
+    if prefix in OFFSET_PROPERTIES:
+        css = _length(value, negative)
+        return {name: css for name in OFFSET_PROPERTIES[prefix]} if css else {}
+    if prefix in SIZE_PROPERTIES and not negative:
+        declarations = {}
+        for name in SIZE_PROPERTIES[prefix]:
+            css = _length(value, False, axis=name[0])
+            if css:
+                declarations[name] = css
+        return declarations
+    if negative:
+        return {}
+    if prefix == 'bg':
+        color = _color(value)
+        return {'background-color': color} if color else {}
+    if prefix == 'text':
+        if value in FONT_SIZES_PX:
+            return {'font-size': f"{FONT_SIZES_PX[value]}px"}
+        if value in TEXT_ALIGNMENTS:
+            return {'text-align': value}
+        if value.startswith('[') and re.match(r'\[-?[\d.]+(px|rem|em)\]$', value):
+            return {'font-size': _arbitrary(value)}
+        color = _color(value)
+        return {'color': color} if color else {}
+    if prefix == 'font':
+        if value in FONT_WEIGHTS:
+            return {'font-weight': str(FONT_WEIGHTS[value])}
+        if value.startswith('['):
+            return {'font-family': _arbitrary(value)}
+    return {}
+
+def tailwind_style(classes):
+    """
+    Returns the CSS declarations (lowercase property -> value) that the given
+    Tailwind classes set on a 1280x720 slide, in the form of _parse_style.
+    """
+    if isinstance(classes, str):
+        classes = classes.split()
+    ranked = []
+    for position, class_name in enumerate(classes):
+        *variants, utility = class_name.split(':')
+        if any(variant not in VARIANT_RANK for variant in variants):
+            continue
+        utility = utility.lstrip('!')
+        if utility == 'rounded' or utility.startswith('rounded-'):
+            radius = RADII_PX.get(utility[len('rounded-'):] if '-' in utility else '')
+            declarations = {'border-radius': f"{radius}px"} if radius is not None else {}
+        else:
+            declarations = _declarations(utility)
+        rank = max((VARIANT_RANK[variant] for variant in variants), default=0)
+        ranked.append((rank, position, declarations))
+    style = {}
+    for _, _, declarations in sorted(ranked, key=lambda item: item[:2]):
+        style.update(declarations)
+    return style